@@ -0,0 +1,171 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# One entry point for all the tools
+#
+#   python cli.py COMMAND [ARGS...]   same as the script of COMMAND
+#   python cli.py batch < jobs.txt    one "COMMAND ARGS..." per line, in this process
+#   python cli.py bench               startup time of the scripts and of this entry point
+#
+# The module of a command is imported only when it runs, so the startup cost
+# is the interpreter and the modules the command needs. The batch mode pays
+# it once for all the jobs.
+
+import os
+import sys
+
+# name -> (module, description)
+COMMANDS = [
+    ('reconstruct', 'reconstruct', 'reconstruct the links of a plot'),
+    ('export', 'export', 'convert a plot into the output formats'),
+    ('evaluate', 'evaluate', 'evaluate methods and parameters over many plots'),
+    ('validate', 'validate', 'check (and repair) the graph of an input file'),
+    ('lod', 'lod', 'export levels of detail'),
+    ('overlap', 'overlap', 'overlap and contacts of the roots of two trees'),
+    ('montecarlo', 'montecarlo', 'stability of the reconstruction under noise'),
+    ('cache', 'result_cache', 'list, purge and show the result cache'),
+    ('serve', 'server', 'reconstruction server'),
+    ('dat2vtk', 'common.dat2vtk', 'dat/csv to VTK'),
+    ('dat2swc', 'common.dat2swc', 'dat/csv to SWC'),
+    ('swc2vtk', 'common.swc2vtk', 'SWC (or a directory of them) to VTK'),
+    ('pov2swc', 'common.pov_swc', 'POV-Ray scene to SWC files'),
+    ('pov2vtk', 'common.pov_vtk', 'POV-Ray scene to VTK'),
+]
+MODULES = dict((name, module) for name, module, _ in COMMANDS)
+
+
+def usage():
+    lines = ['usage: cli.py COMMAND [ARGS...]', '       cli.py batch [--stop-on-error] < jobs',
+             '       cli.py bench [--repeat N] [COMMAND...]', '', 'commands:']
+    lines.extend('  {:<12} {}'.format(name, description) for name, _, description in COMMANDS)
+    return '\n'.join(lines)
+
+
+def run(name, argv):
+    """
+    Run the main of the command
+
+    Returns
+    -------
+    status : int
+        The exit status (0 on success)
+    """
+    if name not in MODULES:
+        print("[Error] Unknown command : {}".format(name))
+        return 2
+    __import__(MODULES[name])
+    module = sys.modules[MODULES[name]]
+    try:
+        module.main(argv)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    return 0
+
+
+def batch(lines, keep_going=True):
+    """
+    Run the jobs one by one in this process
+
+    Parameters
+    ----------
+    lines : iterable of string
+        "COMMAND ARGS..." (shell quoting). Blank lines and # comments are skipped.
+    keep_going : bool
+        Run the rest after a failed job
+
+    Returns
+    -------
+    failed : int
+    """
+    import shlex
+    import traceback
+    failed = 0
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if len(line) == 0 or line[0] == '#': continue
+        # shlex of python 2 does not accept unicode
+        argv = [a.decode('utf_8') for a in shlex.split(line.encode('utf_8'))]
+        try:
+            status = run(argv[0], argv[1:])
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        if status != 0:
+            failed += 1
+            print("[Error] Job {} failed ({}) : {}".format(lineno, status, line))
+            if not keep_going:
+                break
+    return failed
+
+
+def benchmark(names, repeat=5):
+    """
+    Wall time to start a command and print its help
+
+    Returns
+    -------
+    rows : [(string, float, float, float)]
+        (command, standalone script, cli.py, per job of cli.py batch) in seconds,
+        the median of repeat runs for the first two
+    """
+    import subprocess
+    import time
+    base = os.path.dirname(os.path.abspath(__file__))
+    cli = os.path.join(base, 'cli.py')
+    devnull = open(os.devnull, 'w')
+
+    def timed(args, stdin=None):
+        start = time.time()
+        p = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=devnull, stderr=devnull, cwd=base)
+        p.communicate(stdin)
+        return time.time() - start
+
+    def median(values):
+        return sorted(values)[len(values) // 2]
+
+    rows = []
+    try:
+        for name in names:
+            script = os.path.join(base, MODULES[name].replace('.', os.sep) + '.py')
+            t_script = median([timed([sys.executable, script, '--help']) for _ in xrange(repeat)])
+            t_cli = median([timed([sys.executable, cli, name, '--help']) for _ in xrange(repeat)])
+            jobs = '{} --help\n'.format(name) * repeat
+            t_batch = timed([sys.executable, cli, 'batch'], jobs.encode('utf_8')) / repeat
+            rows.append((name, t_script, t_cli, t_batch))
+    finally:
+        devnull.close()
+    return rows
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) == 0 or argv[0] in ('-h', '--help'):
+        print(usage())
+        sys.exit(0 if len(argv) > 0 else 2)
+
+    name, rest = argv[0], argv[1:]
+    if name == 'batch':
+        failed = batch(sys.stdin, keep_going='--stop-on-error' not in rest)
+        sys.exit(1 if failed > 0 else 0)
+    elif name == 'bench':
+        repeat = 5
+        if '--repeat' in rest:
+            k = rest.index('--repeat')
+            repeat = int(rest[k + 1])
+            rest = rest[:k] + rest[k + 2:]
+        names = rest or [n for n, _, _ in COMMANDS if n != 'serve']
+        print("{:<12} {:>10} {:>10} {:>10}   (ms)".format('command', 'script', 'cli', 'batch/job'))
+        for row in benchmark(names, repeat):
+            print("{:<12} {:>10.1f} {:>10.1f} {:>10.1f}".format(row[0], *[t * 1000 for t in row[1:]]))
+        sys.exit(0)
+    sys.exit(run(name, rest))
+
+
+if __name__ == "__main__":
+    # Wrap the standard streams once for every job
+    from common import util
+    util.set_terminal_encoding()
+    main()
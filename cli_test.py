@@ -0,0 +1,63 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import cli
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        # A space in the path checks the shell quoting of the batch lines
+        self.directory = tempfile.mkdtemp(suffix=' cli')
+        self.input = os.path.join(self.directory, 'a plot.dat')
+        with io.open(self.input, 'w') as f:
+            f.write('0.0 0.0 0.0 4.0 0 0\n1.0 0.0 -1.0 2.0 1 0\n1.0 1.0 -2.0 1.0 2 1\n')
+        self.stdout = sys.stdout
+        sys.stdout = io.StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        shutil.rmtree(self.directory)
+
+    def output(self, name):
+        return os.path.join(self.directory, name)
+
+    def job(self, input_dat, name):
+        return 'dat2vtk "{}" "{}"'.format(input_dat, self.output(name))
+
+    def test_run(self):
+        self.assertEqual(cli.run('dat2vtk', ['--help']), 0)
+        self.assertEqual(cli.run('no-such-command', []), 2)
+        self.assertEqual(cli.run('dat2vtk', [self.output('missing.dat'), self.output('a.vtk')]), 1)
+        self.assertEqual(cli.run('dat2vtk', [self.input, self.output('a.vtk')]), 0)
+        self.assertTrue(os.path.exists(self.output('a.vtk')))
+
+    def test_batch(self):
+        lines = ['# comment', '', self.job(self.input, 'a.vtk'),
+                 self.job(self.output('missing.dat'), 'b.vtk'), self.job(self.input, 'c.vtk')]
+        self.assertEqual(cli.batch(lines), 1)
+        self.assertTrue(os.path.exists(self.output('a.vtk')))
+        self.assertTrue(os.path.exists(self.output('c.vtk')))
+        self.assertIn('Job 4 failed (1)', sys.stdout.getvalue())
+
+    def test_stop_on_error(self):
+        lines = [self.job(self.output('missing.dat'), 'a.vtk'), self.job(self.input, 'b.vtk')]
+        self.assertEqual(cli.batch(lines, keep_going=False), 1)
+        self.assertFalse(os.path.exists(self.output('b.vtk')))
+
+        stdin = sys.stdin
+        sys.stdin = io.StringIO('\n'.join(lines) + '\n')
+        try:
+            with self.assertRaises(SystemExit) as cm:
+                cli.main(['batch', '--stop-on-error'])
+        finally:
+            sys.stdin = stdin
+        self.assertEqual(cm.exception.code, 1)
+        self.assertFalse(os.path.exists(self.output('b.vtk')))
+
+if __name__ == '__main__':
+    unittest.main()
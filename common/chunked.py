@@ -0,0 +1,225 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# Parallel loader of large dat/csv files
+#
+# The file is split at newline-aligned byte offsets and every chunk is parsed
+# by a worker process into typed column arrays. The chunks are concatenated
+# in order, so the result is the same as Parser.load followed by
+# convert_to_simple_format_graph.
+#
+# A compressed file cannot be split at byte offsets. Its decompressed blocks
+# (see compressed.BackgroundReader) are sent to the workers instead.
+
+import array
+import itertools
+import os
+from collections import deque
+
+from dat2vtk import FileFormatError, FileSyntaxError, MissingStumpError, convert_to_simple_format_graph
+import compressed
+
+COLUMN_CODES = [('x', 'd'), ('y', 'd'), ('z', 'd'), ('diameter', 'd'), ('label', 'l'), ('parent_label', 'l')]
+
+
+def delimiter(fname):
+    if not compressed.supported(fname): raise FileFormatError
+    fformat = compressed.file_format(fname)
+    if fformat == "dat": return " "
+    elif fformat == "csv": return ","
+    else: raise FileFormatError
+
+
+def split_offsets(fname, chunks):
+    """
+    Split the file into about the given number of ranges which end at a newline
+
+    Returns
+    -------
+    ranges : [(int, int)]
+        (start, end) byte offsets
+    """
+    size = os.path.getsize(fname)
+    if size == 0:
+        return []
+    step = max(1, size // max(1, chunks))
+    ranges = []
+    with open(fname, 'rb') as f:
+        start = 0
+        while start < size:
+            end = start + step
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                f.readline()
+                end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_chunk(task):
+    """
+    Parameters
+    ----------
+    task : (string, int, int, string, dat2vtk.Region or None, [int])
+        (file name, start, end, delimiter, region, labels kept outside the region)
+
+    Returns
+    -------
+    columns : [array.array]
+        x, y, z, diameter, label, parent_label
+    lines : int
+        The number of lines in the chunk
+    error : (int, string) or None
+        (line number in the chunk starting at 1, the line) of the first syntax error
+    """
+    fname, start, end, delim, region, keep_labels = task
+    with open(fname, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode('utf_8')
+    return parse_text((data, delim, region, keep_labels))
+
+
+def parse_text(task):
+    """
+    Same as parse_chunk for the text of whole lines
+
+    Parameters
+    ----------
+    task : (string, string, dat2vtk.Region or None, [int])
+        (text, delimiter, region, labels kept outside the region)
+    """
+    data, delim, region, keep_labels = task
+    columns = [array.array(str(code)) for _, code in COLUMN_CODES]
+    xs, ys, zs, ds, labels, parents = columns
+    lines = data.split('\n')
+    if len(lines) > 0 and lines[-1] == '':
+        lines.pop()
+    contains = region.contains if region is not None else None
+    for k, line in enumerate(lines):
+        # An empty line is a syntax error as in Parser.load
+        if len(line) > 0 and line[0] == "#": continue
+        s = line.split(delim)
+        try:
+            if len(s) != 6: raise ValueError
+            x, y, z = float(s[0]), float(s[1]), float(s[2])
+            label = int(s[4])
+            if contains is not None and not contains(x, y, z) and label not in keep_labels: continue
+            d, parent = float(s[3]), int(s[5])
+        except ValueError:
+            return columns, len(lines), (k + 1, line.rstrip())
+        xs.append(x)
+        ys.append(y)
+        zs.append(z)
+        ds.append(d)
+        labels.append(label)
+        parents.append(parent)
+    return columns, len(lines), None
+
+
+def load_columns(fname, jobs=1, region=None, keep_labels=(), chunks_per_job=4):
+    """
+    Parse the file in parallel
+
+    Returns
+    -------
+    xs, ys, zs, diameters : array.array('d')
+    labels, parent_labels : array.array('l')
+
+    Raises
+    ------
+    FileSyntaxError
+        With the line number in the whole file
+    """
+    delim = delimiter(fname)
+    if compressed.is_compressed(fname):
+        return _load_compressed(fname, jobs, delim, region, keep_labels)
+    ranges = split_offsets(fname, max(1, jobs) * chunks_per_job)
+    tasks = [(fname, start, end, delim, region, tuple(keep_labels)) for start, end in ranges]
+    if jobs <= 1 or len(tasks) <= 1:
+        results = map(parse_chunk, tasks)
+    else:
+        from multiprocessing import Pool
+        pool = Pool(jobs)
+        try:
+            results = pool.map(parse_chunk, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    return _concatenate(results)
+
+
+def _load_compressed(fname, jobs, delim, region, keep_labels):
+    if jobs <= 1:
+        with compressed.BackgroundReader(fname) as reader:
+            tasks = ((text, delim, region, tuple(keep_labels)) for text in reader.text_blocks())
+            return _concatenate(itertools.imap(parse_text, tasks))
+
+    # The pool is forked before the reader thread starts
+    from multiprocessing import Pool
+    pool = Pool(jobs)
+    try:
+        with compressed.BackgroundReader(fname) as reader:
+            return _concatenate(_bounded_imap(pool, reader, 2 * jobs, (delim, region, tuple(keep_labels))))
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _bounded_imap(pool, reader, window, options):
+    # Pool.imap would read the whole file ahead; keep window blocks in flight
+    pending = deque()
+    for text in reader.text_blocks():
+        pending.append(pool.apply_async(parse_text, ((text,) + options,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while len(pending) > 0:
+        yield pending.popleft().get()
+
+
+def _concatenate(results):
+    columns = [array.array(str(code)) for _, code in COLUMN_CODES]
+    line_offset = 0
+    for chunk, lines, error in results:
+        if error is not None:
+            raise FileSyntaxError("line {}: {}".format(line_offset + error[0], error[1]))
+        for column, values in zip(columns, chunk):
+            column.extend(values)
+        line_offset += lines
+    return columns
+
+
+def convert_columns(columns, stump_label=0):
+    """
+    Same as dat2vtk.convert_to_simple_format_graph for the columns of load_columns
+
+    The stump becomes the index 0 and the other rows keep their order.
+    The coordinates stay array.array.
+
+    Returns
+    -------
+    links, xs, ys, zs, radii, labels, label_to_index :
+        See dat2vtk.convert_to_simple_format_graph
+    """
+    xs, ys, zs, ds, labels, parents = columns
+    n = len(labels)
+    if stump_label not in labels:
+        raise MissingStumpError("Point {} must exists.".format(stump_label))
+    label_to_index = {stump_label: 0}
+    others = [l for l in labels if l != stump_label]
+    label_to_index.update(zip(others, xrange(1, n)))
+    if len(label_to_index) != n:
+        # Duplicated labels are rare, leave them to the row by row conversion
+        rows = [{"x": x, "y": y, "z": z, "diameter": d, "label": label, "parent_label": parent}
+                for x, y, z, d, label, parent in zip(*columns)]
+        return convert_to_simple_format_graph(rows, stump_label)
+
+    stump_row = labels.index(stump_label)
+    order = [stump_row] + range(stump_row) + range(stump_row + 1, n)
+    new_xs, new_ys, new_zs, radii, new_labels = [
+        array.array(c.typecode, [c[row] for row in order]) for c in (xs, ys, zs, ds, labels)]
+    links = [(label_to_index[label], label_to_index[parent]) for label, parent in zip(labels, parents)
+             if parent in label_to_index]
+    return links, new_xs, new_ys, new_zs, radii, new_labels, label_to_index
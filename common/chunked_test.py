@@ -0,0 +1,49 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+import chunked
+import dat2vtk
+
+class TestChunked(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, lines):
+        fname = os.path.join(self.directory, name)
+        with open(fname, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return fname
+
+    def test_same_as_parser(self):
+        lines = ['# comment']
+        lines += ['{} {} {} 1.5 {} {}'.format(i, -i, i * 0.5, i + 10, i + 9) for i in xrange(1, 40)]
+        lines += ['0 0 0 3.0 7 -1', '1 1 1 1.0 10 7']
+        fname = self.write('a.dat', lines)
+        expected = dat2vtk.convert_to_simple_format_graph(dat2vtk.Parser.load(fname), 7)
+        for chunks in (1, 3, 100):
+            self.assertTrue(len(chunked.split_offsets(fname, chunks)) >= 1)
+            columns = chunked.load_columns(fname, 1, chunks_per_job=chunks)
+            self.assertEqual([list(v) if not isinstance(v, (list, dict)) else v
+                              for v in chunked.convert_columns(columns, 7)], list(expected))
+
+    def test_line_number(self):
+        lines = ['{} 0 0 1.0 {} -1'.format(i, i) for i in xrange(50)]
+        lines[37] = '1 2 3'
+        fname = self.write('b.csv', [l.replace(' ', ',') for l in lines])
+        for chunks in (1, 7):
+            with self.assertRaises(dat2vtk.FileSyntaxError) as cm:
+                chunked.load_columns(fname, 1, chunks_per_job=chunks)
+            self.assertEqual(cm.exception.args[0], 'line 38: 1,2,3')
+        with self.assertRaises(dat2vtk.FileSyntaxError) as cm:
+            dat2vtk.Parser.load(fname)
+        self.assertEqual(cm.exception.args[0], 'line 38: 1,2,3')
+
+if __name__ == '__main__':
+    unittest.main()
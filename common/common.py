@@ -0,0 +1,6 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# The tools in this directory do `import common` both as scripts and as
+# members of the package, so re-export the helpers under that name.
+from util import set_terminal_encoding, assert_same_size
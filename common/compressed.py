@@ -0,0 +1,168 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# Transparent gzip / xz files
+#
+# A file name ending with .gz or .xz is read and written compressed, and its
+# format is told by the name without that suffix (a.dat.gz is a dat file).
+# The input is decompressed by a background thread into a bounded queue of
+# blocks, so that the decompression overlaps the parsing.
+#
+# xz needs the lzma module (python 3, or backports.lzma on python 2).
+# gzip and the thread modules are imported when a compressed file is opened,
+# so the plain files do not pay for them.
+
+import codecs
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+SUFFIXES = ['.gz', '.xz']
+
+
+def split_suffix(fname):
+    """
+    'a.dat.gz' -> ('a.dat', '.gz'), 'a.dat' -> ('a.dat', None)
+    """
+    for suffix in SUFFIXES:
+        if fname.endswith(suffix):
+            return fname[:-len(suffix)], suffix
+    return fname, None
+
+
+def file_format(fname):
+    """
+    Extension without the compression suffix, e.g. 'dat' for a.dat.xz
+    """
+    return split_suffix(fname)[0][-3:]
+
+
+def is_compressed(fname):
+    return split_suffix(fname)[1] is not None
+
+
+def supported(fname):
+    """
+    False for the xz files without the lzma module
+    """
+    return split_suffix(fname)[1] != '.xz' or lzma is not None
+
+
+def open_binary(fname, mode='rb'):
+    """
+    Open the file, through the decompressor of its suffix
+    """
+    suffix = split_suffix(fname)[1]
+    if suffix == '.gz':
+        import gzip
+        # The default level 9 is several times slower for little gain
+        return gzip.open(fname, mode, 6)
+    elif suffix == '.xz':
+        if lzma is None:
+            raise ValueError('xz needs the lzma module : {}'.format(fname))
+        return lzma.open(fname, mode)
+    return open(fname, mode)
+
+
+class BackgroundReader(object):
+    """
+    Lines of a (compressed) text file, decompressed by another thread
+
+    Parameters
+    ----------
+    fname : string
+    block : int
+        Bytes decompressed at once
+    buffers : int
+        The number of blocks the thread may decompress ahead
+    """
+    def __init__(self, fname, block=1 << 20, buffers=8):
+        import threading
+        import Queue
+        self._full = Queue.Full
+        self._file = open_binary(fname)
+        self._block = block
+        self._queue = Queue.Queue(buffers)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._closed:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except self._full:
+                pass
+        return False
+
+    def _run(self):
+        try:
+            while True:
+                data = self._file.read(self._block)
+                if not self._put(data) or len(data) == 0:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def blocks(self):
+        """
+        Iterate over the decompressed blocks (str)
+        """
+        while True:
+            data = self._queue.get()
+            if isinstance(data, Exception):
+                raise data
+            if len(data) == 0:
+                return
+            yield data
+
+    def text_blocks(self):
+        """
+        Iterate over the decoded text, cut after a newline
+        """
+        rest = b''
+        for data in self.blocks():
+            data = rest + data
+            end = data.rfind(b'\n') + 1
+            rest = data[end:]
+            if end > 0:
+                yield data[:end].decode('utf_8')
+        if len(rest) > 0:
+            yield rest.decode('utf_8')
+
+    def __iter__(self):
+        for text in self.text_blocks():
+            for line in text.splitlines(True):
+                yield line
+
+    def close(self):
+        self._closed = True
+        self._thread.join()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_text(fname, mode='r'):
+    """
+    codecs.open(fname, mode, 'utf_8') which handles the compressed files
+
+    A compressed input is read by a BackgroundReader (iteration by lines).
+    A compressed output is compressed while it is written.
+    """
+    if not is_compressed(fname):
+        return codecs.open(fname, mode, 'utf_8')
+    if mode[0] == 'r':
+        return BackgroundReader(fname)
+    return codecs.getwriter('utf_8')(open_binary(fname, 'wb'))
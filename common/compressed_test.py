@@ -0,0 +1,61 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+import chunked
+import compressed
+import dat2vtk
+
+class TestCompressed(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, lines):
+        fname = os.path.join(self.directory, name)
+        with compressed.open_text(fname, 'w') as f:
+            for line in lines:
+                print(line, file=f)
+        return fname
+
+    def test_names(self):
+        self.assertEqual(compressed.split_suffix('a.dat.gz'), ('a.dat', '.gz'))
+        self.assertEqual(compressed.file_format('a.csv.xz'), 'csv')
+        self.assertEqual(compressed.file_format('a.dat'), 'dat')
+
+    def check_format(self, suffix):
+        lines = ['# comment']
+        lines += ['{} {} {} 1.5 {} {}'.format(i, -i, i * 0.25, i, i - 1) for i in xrange(1, 3000)]
+        lines += ['0 0 0 3.0 0 0']
+        plain = self.write('a.dat', lines)
+        packed = self.write('a.dat' + suffix, lines)
+        with open(packed, 'rb') as f:
+            self.assertNotEqual(f.read(2), b'# ')
+
+        with compressed.BackgroundReader(packed, block=1000, buffers=2) as reader:
+            self.assertEqual([line.rstrip('\n') for line in reader], lines)
+        self.assertEqual(dat2vtk.Parser.load(packed), dat2vtk.Parser.load(plain))
+        for jobs in (1, 2):
+            self.assertEqual(chunked.load_columns(packed, jobs), chunked.load_columns(plain))
+
+        lines[2500] = '1 2 3'
+        packed = self.write('b.csv' + suffix, [l.replace(' ', ',') for l in lines])
+        for jobs in (1, 2):
+            with self.assertRaises(dat2vtk.FileSyntaxError) as cm:
+                chunked.load_columns(packed, jobs)
+            self.assertEqual(cm.exception.args[0], 'line 2501: 1,2,3')
+
+    def test_gzip(self):
+        self.check_format('.gz')
+
+    @unittest.skipIf(compressed.lzma is None, 'no lzma module')
+    def test_xz(self):
+        self.check_format('.xz')
+
+if __name__ == '__main__':
+    unittest.main()
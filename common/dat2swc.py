@@ -2,13 +2,14 @@
 from __future__ import division, print_function, unicode_literals
 
 import argparse
-import codecs
 import logging
-from collections import deque, namedtuple
+import os
 
 import swc2vtk
 import common
 import dat2vtk
+import topology
+import compressed
 
 import sys
 
@@ -18,32 +19,78 @@ def cast_and_join(delim, l):
     return delim.join(l)
 
 
-def generate_swc(dat_name, label_to_index, node_filter, center_height, center_radius):
-    fformat = dat_name[-3:]
+def iter_rows(dat_name):
+    """
+    Iterate over the tokens of the data lines of a dat/csv/rrb file
+    """
+    fformat = compressed.file_format(dat_name)
     if fformat == "dat": delim = " "
     elif fformat == "csv": delim = ","
+    elif fformat == "rrb" and not compressed.is_compressed(dat_name):
+        import rrb
+        for x, y, z, d, label, parent_label in rrb.iter_rows(dat_name):
+            yield [repr(x), repr(y), repr(z), repr(d), str(label), str(parent_label)]
+        return
+
+    else: raise dat2vtk.FileFormatError
 
-    for line in open(dat_name, 'r'):
-        s = line.rstrip().split(delim)
+    with compressed.open_text(dat_name) as f:
+        for line in f:
+            if len(line.strip()) == 0 or line[0] == "#": continue
+            yield line.rstrip().split(delim)
 
-        if len(node_filter) != 0 and label_to_index[int(s[4])] not in node_filter: continue
 
-        if s[4] == "0" and s[5] == "0":
-            # the root point
-            yield cast_and_join(" ", [0, 0, s[0], s[1], float(s[2])-center_height, center_radius, -1])
-            yield cast_and_join(" ", [1, 0, s[0], s[1], s[2], center_radius, 0])
-        else:
-            yield cast_and_join(" ", [int(s[4])+1, 0, s[0], s[1], s[2], float(s[3]) * 0.5, int(s[5])+1])
+def format_swc(s, center_height, center_radius):
+    """
+    Convert the tokens of one dat row into swc lines
+    """
+    if s[4] == "0" and s[5] == "0":
+        # the root point
+        return [cast_and_join(" ", [0, 0, s[0], s[1], float(s[2])-center_height, center_radius, -1]),
+                cast_and_join(" ", [1, 0, s[0], s[1], s[2], center_radius, 0])]
+    else:
+        return [cast_and_join(" ", [int(s[4])+1, 0, s[0], s[1], s[2], float(s[3]) * 0.5, int(s[5])+1])]
 
 
-def main():
+def generate_swc(dat_name, label_to_index, node_filter, center_height, center_radius):
+    """
+    Parameters
+    ----------
+    dat_name : string
+    label_to_index : {int: int}
+    node_filter : function (int -> bool) or None
+        Output only the nodes (internal index) for which node_filter returns True
+    center_height : float
+    center_radius : float
+    """
+    for s in iter_rows(dat_name):
+        if node_filter is not None and not node_filter(label_to_index[int(s[4])]): continue
+
+        for line in format_swc(s, center_height, center_radius):
+            yield line
+
+
+def output_names(output_swc, starts):
+    """
+    One output file per start label: out.swc -> out_<label>.swc
+    """
+    if len(starts) <= 1:
+        return [output_swc]
+    name, suffix = compressed.split_suffix(output_swc)
+    root, ext = os.path.splitext(name)
+    return ['{}_{}{}{}'.format(root, start, ext or '.swc', suffix or '') for start in starts]
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('input_dat', type=str)
     parser.add_argument('output_swc', type=str)
-    parser.add_argument('--start', type=int, default=-1);
+    parser.add_argument('--start', type=int, nargs='+', default=[],
+            help='Output only the subtree under this label. '
+                 'With several labels, each subtree is written to output_<label>.swc')
     parser.add_argument('--center_radius', type=float, default=0)
     parser.add_argument('--center_height', type=float, default=0)
-    args = parser.parse_args() 
+    args = parser.parse_args(argv)
 
     try:
         tree_data = dat2vtk.Parser.load(args.input_dat)
@@ -57,41 +104,38 @@ def main():
         print("[Error] Syntax error.")
         sys.exit(1)
 
-    links, xs, ys, zs, rs, labels, label_to_index = dat2vtk.convert_to_simple_format_graph(tree_data)
+    try:
+        links, xs, ys, zs, rs, labels, label_to_index = dat2vtk.convert_to_simple_format_graph(tree_data)
+    except dat2vtk.MissingStumpError as e:
+        print("[Error] {}".format(e))
+        sys.exit(1)
     n = len(xs)
 
-    # Make a set of nodes that can reach to the selected node
-    dist = []
-    if args.start != -1:
-        tree = [[] for i in xrange(0, n)]
-        for l in links:
-            tree[l[0]].append(l[1])
-            tree[l[1]].append(l[0])
-
-        found = False
-        Q = deque()
-        vis = [False for i in xrange(n)]
-        Q.append([0, -1, False])
-        vis[0] = True
-
-        while len(Q):
-            s = Q.popleft()
-
-            # print("{} {} {}".format(s[0], s[1], s[2]))
-            if s[0] == label_to_index[args.start] or s[2]:
-                dist.append(s[0])
-                
-            for u in tree[s[0]]:
-                if u == s[1] or vis[u]: continue
-                Q.append([u, s[0], (s[2] or s[0] == label_to_index[args.start])])
-                vis[u] = True
-
-    # Output as swc file format
-    iterator = generate_swc(args.input_dat, label_to_index, dist, args.center_height, args.center_radius) 
-    with codecs.open(args.output_swc, 'w', 'utf_8') as f_out:
-        for line in iterator:
-            print(line, file=f_out)
-    
+    for start in args.start:
+        if start not in label_to_index:
+            print("[Error] No such label : {}".format(start))
+            sys.exit(1)
+
+    # Subtree membership is an interval check on the Euler tour
+    index = topology.TopologyIndex(n, links)
+    starts = [label_to_index[start] for start in args.start] or [None]
+    outputs = [compressed.open_text(fname, 'w') for fname in output_names(args.output_swc, args.start)]
+
+    # Output as swc file format (all the files in one pass)
+    try:
+        for s in iter_rows(args.input_dat):
+            v = label_to_index[int(s[4])]
+            lines = None
+            for start, f_out in zip(starts, outputs):
+                if start is not None and not index.contains(start, v): continue
+                if lines is None:
+                    lines = format_swc(s, args.center_height, args.center_radius)
+                for line in lines:
+                    print(line, file=f_out)
+    finally:
+        for f_out in outputs:
+            f_out.close()
+
 
 if __name__ == "__main__":
     common.set_terminal_encoding()
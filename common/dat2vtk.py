@@ -3,25 +3,68 @@
 from __future__ import division, print_function, unicode_literals
 
 import argparse
-import codecs
 import logging
 import math
 from collections import deque, namedtuple
 
-import swc2vtk
 import common
+import topology
+import compressed
 import sys
 
 class FileFormatError(Exception):
     """
     Raise this error if unsupported foramt file is given.
-    Support only 'dat' or 'csv'.
+    Support only 'dat', 'csv' or 'rrb' (binary).
     """
     pass
 
 class FileSyntaxError(Exception):
     pass
 
+class MissingStumpError(FileFormatError):
+    """
+    Raise this error if the point of the stump is not found
+    """
+    pass
+
+class Region(object):
+    """
+    Axis aligned box used to load only a part of a plot
+
+    A bound given as None is open, so a depth band is a region bounded
+    only in z.
+    """
+    def __init__(self, lo=(None, None, None), hi=(None, None, None)):
+        inf = float('inf')
+        self.lo = tuple(-inf if v is None else v for v in lo)
+        self.hi = tuple(inf if v is None else v for v in hi)
+
+    @classmethod
+    def z_band(cls, z_min, z_max):
+        return cls((None, None, z_min), (None, None, z_max))
+
+    def contains(self, x, y, z):
+        lo, hi = self.lo, self.hi
+        return lo[0] <= x <= hi[0] and lo[1] <= y <= hi[1] and lo[2] <= z <= hi[2]
+
+    @classmethod
+    def from_args(cls, bbox=None, z_range=None):
+        """
+        Region of the command line options --bbox XMIN YMIN ZMIN XMAX YMAX ZMAX
+        and --z-range ZMIN ZMAX (None if neither is given)
+        """
+        if bbox is None and z_range is None:
+            return None
+        lo, hi = [None]*3, [None]*3
+        if bbox is not None:
+            lo, hi = list(bbox[:3]), list(bbox[3:])
+        if z_range is not None:
+            lo[2] = z_range[0] if lo[2] is None else max(lo[2], z_range[0])
+            hi[2] = z_range[1] if hi[2] is None else min(hi[2], z_range[1])
+        return cls(lo, hi)
+
+
 class Parser(object):
     @classmethod
     def parse_line(cls, line_str, delim):
@@ -48,11 +91,16 @@ class Parser(object):
                 "parent_label": int(s[5])}
 
     @classmethod
-    def load(cls, fname):
+    def load(cls, fname, region=None, keep_labels=()):
         """
         Parameters
         ----------
         fname : string
+            dat, csv or rrb. dat and csv may be compressed (.gz, .xz).
+        region : Region or None
+            Only the rows inside are loaded
+        keep_labels : [int]
+            Rows loaded even outside region (e.g. the stump)
 
         Returns
         -------
@@ -61,19 +109,55 @@ class Parser(object):
 
         """
 
-        fformat = fname[-3:]
+        # a.dat.gz and a.dat.xz are dat files
+        fformat = compressed.file_format(fname)
+        if not compressed.supported(fname): raise FileFormatError
         if fformat == "dat": delim = " "
         elif fformat == "csv": delim = ","
+        elif fformat == "rrb" and not compressed.is_compressed(fname): return cls.load_rrb(fname, region, keep_labels)
         else: raise FileFormatError
 
         ret = []
-        with codecs.open(fname, 'r', 'utf_8') as f:
-            for line in f:
-                if len(line) == 0 or line[0] == "#": continue
-                ret.append(cls.parse_line(line, delim))
+        lineno = 0
+        with compressed.open_text(fname) as f:
+            try:
+                if region is None:
+                    for lineno, line in enumerate(f, 1):
+                        if len(line) == 0 or line[0] == "#": continue
+                        ret.append(cls.parse_line(line, delim))
+                    return ret
+
+                # Test the coordinates before building the row
+                contains = region.contains
+                for lineno, line in enumerate(f, 1):
+                    if len(line) == 0 or line[0] == "#": continue
+                    s = line.split(delim)
+                    if len(s) != 6: raise FileSyntaxError
+                    x, y, z = float(s[0]), float(s[1]), float(s[2])
+                    if not contains(x, y, z) and int(s[4]) not in keep_labels: continue
+                    ret.append({"x": x, "y": y, "z": z,
+                                "diameter": float(s[3]), "label": int(s[4]),
+                                "parent_label": int(s[5])})
+            except (FileSyntaxError, ValueError):
+                raise FileSyntaxError("line {}: {}".format(lineno, line.rstrip()))
         return ret
 
 
+    @classmethod
+    def load_rrb(cls, fname, region=None, keep_labels=()):
+        """
+        Same as load, but for the binary format (see rrb.py)
+        """
+        import rrb
+        try:
+            rows = rrb.iter_rows(fname)
+            return [{"x": x, "y": y, "z": z, "diameter": d, "label": label, "parent_label": parent_label}
+                    for x, y, z, d, label, parent_label in rows
+                    if region is None or region.contains(x, y, z) or label in keep_labels]
+        except rrb.FileFormatError:
+            raise FileFormatError
+
+
 def generate_sphere(xs, ys, zs, radii, data={}):
     common.assert_same_size(xs=xs, ys=ys, zs=zs, radii=radii, **data)
     n = len(radii)
@@ -109,7 +193,7 @@ def generate_sphere(xs, ys, zs, radii, data={}):
             yield '{:.7}'.format(value)
 
 
-def convert_to_simple_format_graph(tree_data):
+def convert_to_simple_format_graph(tree_data, stump_label=0):
     """
     Convert the data parsed by Parser.load(fname) into simple format
 
@@ -117,6 +201,8 @@ def convert_to_simple_format_graph(tree_data):
     ----------
     tree_data : [{"x": float, "y": float, "z": float,
                   "diameter": float, "label": int, "parent_label": int}]
+    stump_label : int
+        The label of the point which becomes the index 0
 
     Returns
     -------
@@ -133,18 +219,17 @@ def convert_to_simple_format_graph(tree_data):
     # Because of this, convert to internal id
     # Point 0 is represents the root point.
     label_to_index = {}
-    label_to_index[0] = 0
+    label_to_index[stump_label] = 0
     
     zero = False
     for datum in tree_data:
         label = datum["label"]
-        if label == 0: zero=True
+        if label == stump_label: zero=True
         if label not in label_to_index:
             label_to_index[label] = len(label_to_index)
 
     if not zero:
-        print("Point 0 must exists.")
-        sys.exit(1)
+        raise MissingStumpError("Point {} must exists.".format(stump_label))
 
     # Assign the array (fastest way)
     # See Also : http://stackoverflow.com/questions/537086/reserve-memory-for-list-in-python
@@ -205,13 +290,11 @@ def compute_distance(root_nodes, links, xs, ys, zs, radii):
         distance[index] = 0.0
         que.append(index)
 
+    start, neighbors = topology.adjacency(n, links)
     while len(que) > 0:
-        index = que.popleft()
-        for src, dst in links:
-            if dst == index:
-                src, dst = dst, src
-            if src != index:
-                continue
+        src = que.popleft()
+        for k in xrange(start[src], start[src + 1]):
+            dst = neighbors[k]
             if distance[dst] is not None:
                 continue
             l2norm = (xs[src] - xs[dst])**2 + (ys[src] - ys[dst])**2 + (zs[src] - zs[dst])**2
@@ -251,7 +334,7 @@ def check_link_distance(linedata, thresh):
                 "The distance between label={} and label={} is {} (> thresh={}) です".format(label, p.parent_label, d, thresh))
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('input_dat', type=str,
             help="File name of input dat file.")
@@ -265,7 +348,11 @@ def main():
             help="Adjust the radius of shpere")
     parser.add_argument('--thresh', type=float,
             help="Show warning message when the distance between two points is greater than thresh")
-    args = parser.parse_args()
+    parser.add_argument(
+            '--metrics', action='store_true',
+            help="Add topology metrics (path length, Strahler order, ...) as scalars")
+    args = parser.parse_args(argv)
+    import swc2vtk
 
     try:
         tree_data = Parser.load(args.input_dat)
@@ -282,7 +369,11 @@ def main():
     if args.thresh is not None:
         check_link_distance(tree_data, args.thresh)
 
-    links, xs, ys, zs, radii, _, label_to_index = convert_to_simple_format_graph(tree_data)
+    try:
+        links, xs, ys, zs, radii, _, label_to_index = convert_to_simple_format_graph(tree_data)
+    except MissingStumpError as e:
+        print("[Error] {}".format(e))
+        sys.exit(1)
     radii = map(lambda r: r * args.coef_radius, radii)
 
     root_nodes = []
@@ -294,15 +385,20 @@ def main():
             root_nodes.append(index)
 
     distance = compute_distance(root_nodes, links, xs, ys, zs, radii)
+    data = {'distance': distance}
+    if args.metrics:
+        index = topology.TopologyIndex(len(xs), links)
+        data.update(topology.compute_metrics(index, xs, ys, zs, radii))
 
     # write vtk
     if args.sphere:
         # POINT mode
         iterator = generate_sphere(xs, ys, zs, radii)
     else:
-        # LINE mode
-        iterator = swc2vtk.generate_vtk(0, links, xs, ys, zs, radii, {'distance': distance})
-    with codecs.open(args.output_vtk, 'w', 'utf_8') as f:
+        # LINE mode, one polyline cell per chain of links
+        polylines = topology.chains(len(xs), links, stops=[0])
+        iterator = swc2vtk.generate_vtk(0, links, xs, ys, zs, radii, data, polylines)
+    with compressed.open_text(args.output_vtk, 'w') as f:
         for line in iterator:
             print(line, file=f)
 
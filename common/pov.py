@@ -2,11 +2,18 @@
 from __future__ import division, print_function, unicode_literals
 
 import codecs
+import math
+from collections import deque
 
 
-def read_pov(fname):
-    spheres = []
-    cones = []
+def iter_pov(fname):
+    """
+    Iterate over the parts of a pov file one by one
+
+    Yields
+    ------
+    ('sphere', [x, y, z, r]) or ('cone', [x1, y1, z1, r1, x2, y2, z2, r2, ...])
+    """
     with codecs.open(fname, 'r', 'utf_8') as f:
         for line in f:
             if line.startswith('object{parts('):
@@ -14,15 +21,175 @@ def read_pov(fname):
                 s = line.strip()[len('object{parts('):-2]
                 a = map(float, s.split(','))
                 if len(a) == 4:
-                    spheres.append(a)
+                    yield 'sphere', a
                 elif len(a) == 11:
-                    cones.append(a)
+                    yield 'cone', a
                 else:
                     raise RuntimeError('unknown format: ' + line)
 
+
+def read_pov(fname):
+    spheres = []
+    cones = []
+    for kind, a in iter_pov(fname):
+        if kind == 'sphere':
+            spheres.append(a)
+        else:
+            cones.append(a)
     return spheres, cones
 
 
+class PovGraph(object):
+    """
+    Graph of the points of a pov scene
+
+    The points are kept in array-backed tables and looked up by their
+    coordinates, which match if they are closer than tol on every axis
+    (exact match if tol is 0).
+    """
+    def __init__(self, tol=0.0):
+        self.tol = tol
+        self.xs = []
+        self.ys = []
+        self.zs = []
+        self.radii = []
+        self.adjacency = []
+        self._cells = {}
+        self._edges = set()
+
+    def _key(self, x, y, z):
+        if self.tol == 0.0:
+            return (x, y, z)
+        t = self.tol
+        return (int(math.floor(x / t)), int(math.floor(y / t)), int(math.floor(z / t)))
+
+    def find(self, x, y, z):
+        """
+        Returns
+        -------
+        index : int or None
+        """
+        if self.tol == 0.0:
+            return self._cells.get((x, y, z))
+
+        t = self.tol
+        kx, ky, kz = self._key(x, y, z)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    for i in self._cells.get((kx + dx, ky + dy, kz + dz), ()):
+                        if abs(self.xs[i] - x) <= t and abs(self.ys[i] - y) <= t and abs(self.zs[i] - z) <= t:
+                            return i
+        return None
+
+    def add_point(self, x, y, z, radius):
+        index = self.find(x, y, z)
+        if index is not None:
+            return index
+
+        index = len(self.xs)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.zs.append(z)
+        self.radii.append(radius)
+        self.adjacency.append([])
+        if self.tol == 0.0:
+            self._cells[(x, y, z)] = index
+        else:
+            self._cells.setdefault(self._key(x, y, z), []).append(index)
+        return index
+
+    def add_sphere(self, a):
+        index = self.add_point(a[0], a[1], a[2], a[3])
+        # The radius of a sphere wins over that of a cone end
+        self.radii[index] = a[3]
+
+    def add_cone(self, a):
+        src = self.add_point(a[0], a[1], a[2], a[3])
+        dst = self.add_point(a[4], a[5], a[6], a[7])
+
+        # Keeping simple graph
+        if src == dst:
+            return
+        edge = (min(src, dst), max(src, dst))
+        if edge in self._edges:
+            return
+        self._edges.add(edge)
+        self.adjacency[src].append(dst)
+        self.adjacency[dst].append(src)
+
+    @classmethod
+    def load(cls, fname, tol=0.0):
+        graph = cls(tol)
+        for kind, a in iter_pov(fname):
+            if kind == 'sphere':
+                graph.add_sphere(a)
+            else:
+                graph.add_cone(a)
+        return graph
+
+    def node_count(self):
+        return len(self.xs)
+
+    def component_count(self):
+        seen = [False]*self.node_count()
+        count = 0
+        for r in xrange(self.node_count()):
+            if seen[r]: continue
+            count += 1
+            seen[r] = True
+            que = deque([r])
+            while len(que) > 0:
+                for next_ in self.adjacency[que.popleft()]:
+                    if not seen[next_]:
+                        seen[next_] = True
+                        que.append(next_)
+        return count
+
+    def components(self):
+        """
+        Yield the connected components one by one as SWC rows
+
+        Every neighbor except the BFS parent is output, so a node on a cycle
+        appears again as a leaf.
+
+        Yields
+        ------
+        rows : [(index, type, x, y, z, radius, parent)]
+        """
+        merged = [False]*self.node_count()
+        for r in xrange(self.node_count()):
+            if merged[r]: continue
+
+            index = 1
+            rows = [(index, 3, self.xs[r], self.ys[r], self.zs[r], self.radii[r], -1)]
+            merged[r] = True
+            # (index of graph, BFS parent, index of SWC)
+            que = deque([(r, -1, index)])
+            index += 1
+
+            while len(que) > 0:
+                cur, came_from, parent_index = que.popleft()
+                for next_ in self.adjacency[cur]:
+                    if next_ == came_from: continue
+                    rows.append((index, 3, self.xs[next_], self.ys[next_], self.zs[next_],
+                                 self.radii[next_] / 20, # 20 is a magic number defined in pov file format
+                                 parent_index))
+                    if not merged[next_]:
+                        merged[next_] = True
+                        que.append((next_, cur, index))
+                    index += 1
+
+            yield rows
+
+
+def convert_to_swc(rows):
+    '''convert_to_swc([(index, type, x, y, z, radius, parent)]) -> iterator
+    '''
+    for row in rows:
+        yield '{} {} {:.7} {:.7} {:.7} {:.7} {}'.format(*row)
+
+
 def omit_print(seq):
     '''
     Print the list only 10 elements
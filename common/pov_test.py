@@ -0,0 +1,112 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import codecs
+import os
+import shutil
+import tempfile
+import unittest
+import pov
+import pov_swc
+import pov_vtk
+
+def sphere(x, y, z, r):
+    return 'object{{parts({},{},{},{})}}'.format(x, y, z, r)
+
+def cone(p, q, r1=1.0, r2=1.0):
+    return 'object{{parts({},{},{},{},{},{},{},{},0,0,0)}}'.format(p[0], p[1], p[2], r1, q[0], q[1], q[2], r2)
+
+class TestPov(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, lines):
+        fname = os.path.join(self.directory, 'a.pov')
+        with codecs.open(fname, 'w', 'utf_8') as f:
+            f.write('\n'.join(['#include "parts.inc"'] + lines) + '\n')
+        return fname
+
+    def test_iter_pov(self):
+        fname = self.write([sphere(1, 2, 3, 4), cone((0, 0, 0), (1, 0, 0), 2.0, 3.0)])
+        self.assertEqual(list(pov.iter_pov(fname)),
+                         [('sphere', [1.0, 2.0, 3.0, 4.0]), ('cone', [0.0, 0.0, 0.0, 2.0, 1.0, 0.0, 0.0, 3.0, 0.0, 0.0, 0.0])])
+        self.assertEqual(pov.read_pov(fname), ([[1.0, 2.0, 3.0, 4.0]], [[0.0, 0.0, 0.0, 2.0, 1.0, 0.0, 0.0, 3.0, 0.0, 0.0, 0.0]]))
+        self.assertRaises(RuntimeError, list, pov.iter_pov(self.write(['object{parts(1,2)}'])))
+
+    def test_exact(self):
+        graph = pov.PovGraph()
+        graph.add_sphere([0.0, 0.0, 0.0, 20.0])
+        # A cone end without a sphere becomes a point with the radius of the cone
+        graph.add_cone([0.0, 0.0, 0.0, 9.0, 1.0, 0.0, 0.0, 5.0, 0, 0, 0])
+        self.assertEqual((graph.node_count(), graph.radii), (2, [20.0, 5.0]))
+        self.assertEqual(graph.find(1.0, 0.0, 0.0), 1)
+        self.assertEqual(graph.find(1.0, 0.0, 1e-9), None)
+        # The sphere wins, the duplicated cone and the loop are dropped
+        graph.add_sphere([1.0, 0.0, 0.0, 8.0])
+        graph.add_cone([1.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0, 0, 0])
+        graph.add_cone([1.0, 0.0, 0.0, 1.0, 1.0, 0.0, 0.0, 1.0, 0, 0, 0])
+        self.assertEqual((graph.radii, graph.adjacency), ([20.0, 8.0], [[1], [0]]))
+
+    def test_tolerance(self):
+        graph = pov.PovGraph(0.1)
+        a = graph.add_point(0.099, 0.0, 0.0, 1.0)
+        # In the neighbouring cells on every axis
+        self.assertEqual(graph.add_point(0.101, -0.001, 0.05, 1.0), a)
+        self.assertEqual(graph.find(0.0, 0.09, -0.001), a)
+        self.assertEqual(graph.find(0.2, 0.0, 0.0), None)
+        self.assertEqual(graph.find(0.099, 0.0, 0.2), None)
+        self.assertEqual(graph.add_point(0.3, 0.0, 0.0, 1.0), 1)
+        # The first point within tol keeps its coordinates
+        self.assertEqual((graph.xs, graph.ys), ([0.099, 0.3], [0.0, 0.0]))
+
+        fname = self.write([cone((0, 0, 0), (1, 0, 0)), cone((1.05, 0, 0), (2, 0, 0))])
+        self.assertEqual(pov.PovGraph.load(fname).component_count(), 2)
+        graph = pov.PovGraph.load(fname, 0.1)
+        self.assertEqual((graph.node_count(), graph.component_count()), (3, 1))
+
+    def test_components(self):
+        # The first point in the file is the root of the first component,
+        # even if it is the end of a cone
+        fname = self.write([cone((5, 5, 5), (6, 5, 5)),
+                            sphere(0, 0, 0, 20), sphere(1, 0, 0, 20), sphere(0, 1, 0, 20),
+                            cone((0, 0, 0), (1, 0, 0)), cone((0, 0, 0), (0, 1, 0)), cone((1, 0, 0), (0, 1, 0))])
+        graph = pov.PovGraph.load(fname)
+        components = list(graph.components())
+        self.assertEqual(graph.component_count(), 2)
+        self.assertEqual(components[0], [(1, 3, 5.0, 5.0, 5.0, 1.0, -1), (2, 3, 6.0, 5.0, 5.0, 0.05, 1)])
+        # The cycle 0-1-2: each of 1 and 2 is written again as a leaf of the other
+        self.assertEqual([(row[0], row[2:5], row[6]) for row in components[1]],
+                         [(1, (0.0, 0.0, 0.0), -1), (2, (1.0, 0.0, 0.0), 1), (3, (0.0, 1.0, 0.0), 1),
+                          (4, (0.0, 1.0, 0.0), 2), (5, (1.0, 0.0, 0.0), 3)])
+        # The radius of the root is not divided by 20
+        self.assertEqual([row[5] for row in components[1]], [20.0, 1.0, 1.0, 1.0, 1.0])
+        self.assertEqual(list(pov.convert_to_swc(components[0])),
+                         ['1 3 5.0 5.0 5.0 1.0 -1', '2 3 6.0 5.0 5.0 0.05 1'])
+
+    def test_merge_components(self):
+        components = [[(1, 3, 0.0, 0.0, 0.0, 1.0, -1), (2, 3, 1.0, 0.0, 0.0, 1.0, 1), (3, 3, 2.0, 0.0, 0.0, 1.0, 2)],
+                      [(1, 3, 9.0, 0.0, 0.0, 1.0, -1), (2, 3, 8.0, 0.0, 0.0, 1.0, 1)]]
+        links, xs, ys, zs, radii = pov_vtk.merge_components(components)
+        self.assertEqual(links, [(1, 0), (2, 1), (4, 3)])
+        self.assertEqual(xs, [0.0, 1.0, 2.0, 9.0, 8.0])
+
+    def test_main(self):
+        fname = self.write([cone((0, 0, 0), (1, 0, 0)), cone((1, 0, 0), (2, 0, 0))] +
+                           [cone((10 * k, 9, 0), (10 * k, 9, 1)) for k in xrange(10)])
+        output = os.path.join(self.directory, 'out')
+        pov_swc.main([fname, output])
+        self.assertEqual(sorted(os.listdir(output)), ['{:0>2}.swc'.format(k) for k in xrange(11)])
+
+        output = os.path.join(self.directory, 'out.vtk')
+        pov_vtk.main([fname, output])
+        with codecs.open(output, 'r', 'utf_8') as f:
+            lines = f.read().splitlines()
+        self.assertIn('POINTS 23 float', lines)
+        self.assertIn('LINES 12 36', lines)
+        self.assertIn('2 22 21', lines)
+
+if __name__ == '__main__':
+    unittest.main()
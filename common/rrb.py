@@ -0,0 +1,141 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# Binary container of a root tree (*.rrb)
+#
+# Layout (little endian)
+#   header   : magic (4 bytes) version (uint16) reserved (uint16) n (uint64)
+#   sections : x, y, z, diameter (float64 * n), label, parent (int64 * n)
+#
+# parent is the index (not the label) of the parent row, or -1.
+# The diameter column holds the same value as the 4th column of a dat file.
+
+import array
+import mmap
+import struct
+import sys
+
+MAGIC = b'RRB\x00'
+VERSION = 1
+HEADER = struct.Struct(str('<4sHHQ'))
+COLUMNS = [('x', 'd'), ('y', 'd'), ('z', 'd'), ('diameter', 'd'), ('label', 'l'), ('parent', 'l')]
+
+
+class FileFormatError(Exception):
+    pass
+
+
+def _array(code, values=()):
+    a = array.array(str(code), values)
+    assert a.itemsize == 8, 'rrb needs 8 byte C long'
+    return a
+
+
+def write(fname, xs, ys, zs, diameters, labels, parents):
+    """
+    Write the columns in bulk
+
+    Parameters
+    ----------
+    fname : string
+    xs, ys, zs, diameters : [float]
+    labels, parents : [int]
+    """
+    n = len(xs)
+    columns = [xs, ys, zs, diameters, labels, parents]
+    with open(fname, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, n))
+        for (name, code), values in zip(COLUMNS, columns):
+            assert len(values) == n, 'len({}) should eq {}'.format(name, n)
+            a = _array(code, values)
+            if sys.byteorder != 'little':
+                a.byteswap()
+            a.tofile(f)
+
+
+def write_tree(fname, tree_root, parent=None):
+    """
+    Write a TreeRoot with the diameters of its input file (see
+    TreeRoot.input_diameters)
+    """
+    if parent is None:
+        parent = tree_root.parent_indices()
+    write(fname, tree_root.xs, tree_root.ys, tree_root.zs, tree_root.input_diameters(), tree_root.labels, parent)
+
+
+class RRBFile(object):
+    """
+    Memory mapped *.rrb file
+
+    The columns are read lazily, each with a single memory copy (no parsing).
+    """
+    def __init__(self, fname):
+        self._f = open(fname, 'rb')
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            self._f.close()
+            raise FileFormatError
+        if len(self._mm) < HEADER.size:
+            self.close()
+            raise FileFormatError
+        magic, version, _, n = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or len(self._mm) != HEADER.size + 8 * n * len(COLUMNS):
+            self.close()
+            raise FileFormatError
+        self.n = n
+        self._columns = {}
+
+    def column(self, name):
+        """
+        Returns
+        -------
+        values : array.array
+        """
+        if name not in self._columns:
+            k = [c[0] for c in COLUMNS].index(name)
+            a = _array(COLUMNS[k][1])
+            offset = HEADER.size + 8 * self.n * k
+            a.fromstring(buffer(self._mm, offset, 8 * self.n))
+            if sys.byteorder != 'little':
+                a.byteswap()
+            self._columns[name] = a
+        return self._columns[name]
+
+    def columns(self):
+        return [self.column(name) for name, _ in COLUMNS]
+
+    def close(self):
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_columns(fname):
+    """
+    Returns
+    -------
+    xs, ys, zs, diameters, labels, parents : array.array
+    """
+    with RRBFile(fname) as f:
+        return f.columns()
+
+
+def iter_rows(fname):
+    """
+    Iterate over the rows like the lines of a dat file
+
+    Yields
+    ------
+    (x, y, z, diameter, label, parent_label)
+    """
+    xs, ys, zs, diameters, labels, parents = load_columns(fname)
+    for i in xrange(len(xs)):
+        p = parents[i]
+        yield xs[i], ys[i], zs[i], diameters[i], labels[i], labels[p] if p != -1 else -1
@@ -0,0 +1,54 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+import dat2vtk
+import rrb
+
+class TestRRB(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_columns(self):
+        fname = os.path.join(self.directory, 'a.rrb')
+        columns = [[0.0, 1.5, -2.25], [0.0, 0.1, 1e10], [0.0, -3.0, -4.5], [40.0, 12.3, 8.7],
+                   [7, 3, 12], [-1, 0, 1]]
+        rrb.write(fname, *columns)
+        self.assertEqual([list(c) for c in rrb.load_columns(fname)], columns)
+        self.assertEqual(list(rrb.iter_rows(fname)),
+                         [(0.0, 0.0, 0.0, 40.0, 7, -1), (1.5, 0.1, -3.0, 12.3, 3, 7),
+                          (-2.25, 1e10, -4.5, 8.7, 12, 3)])
+
+    def test_same_as_dat(self):
+        lines = ['0.0 0.0 0.0 40.0 0 0', '6.8 -14.0 -3.7 34.8 15 0', '30.7 -39.2 -14.8 29.5 20 15']
+        dat = os.path.join(self.directory, 'a.dat')
+        with open(dat, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        rows = dat2vtk.Parser.load(dat)
+        fname = os.path.join(self.directory, 'a.rrb')
+        labels = [row['label'] for row in rows]
+        parents = [labels.index(row['parent_label']) if row['label'] != 0 else -1 for row in rows]
+        rrb.write(fname, *([[row[name] for row in rows] for name in ('x', 'y', 'z', 'diameter')] + [labels, parents]))
+        loaded = dat2vtk.Parser.load(fname)
+        self.assertEqual(loaded[1:], rows[1:])
+        self.assertEqual(loaded[0]['parent_label'], -1)
+
+    def test_broken(self):
+        fname = os.path.join(self.directory, 'a.rrb')
+        for data in [b'', b'RRB\x00', b'XXXX' + b'\x00' * 12]:
+            with open(fname, 'wb') as f:
+                f.write(data)
+            self.assertRaises(rrb.FileFormatError, rrb.load_columns, fname)
+        rrb.write(fname, [0.0], [0.0], [0.0], [1.0], [0], [-1])
+        with open(fname, 'ab') as f:
+            f.write(b'\x00')
+        self.assertRaises(rrb.FileFormatError, rrb.load_columns, fname)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,12 +2,15 @@
 from __future__ import division, print_function, unicode_literals
 
 import argparse
-import codecs
+import array
+import os
 import sys
 
 import common
+import compressed
+import topology
 
-def generate_vtk(root, links, xs, ys, zs, radii, data={}):
+def generate_vtk(root, links, xs, ys, zs, radii, data={}, polylines=None):
     '''
     Parameters
     ----------
@@ -18,6 +21,8 @@ def generate_vtk(root, links, xs, ys, zs, radii, data={}):
     zs : [float]
     radii : [float]
     data : {string, [float]}
+    polylines : [[int]] or None
+        Written as the LINES cells instead of links (see topology.chains)
 
     Returns
     -------
@@ -45,9 +50,14 @@ def generate_vtk(root, links, xs, ys, zs, radii, data={}):
         yield '{:.7} {:.7} {:.7}'.format(xs[i], ys[i], zs[i])
 
     # LINE Data
-    yield 'LINES {} {}'.format(len(links), 3*len(links))
-    for link in links:
-        yield '2 {} {}'.format(link[0], link[1])
+    if polylines is None:
+        yield 'LINES {} {}'.format(len(links), 3*len(links))
+        for link in links:
+            yield '2 {} {}'.format(link[0], link[1])
+    else:
+        yield 'LINES {} {}'.format(len(polylines), sum(len(p) + 1 for p in polylines))
+        for p in polylines:
+            yield '{} {}'.format(len(p), ' '.join(map(str, p)))
 
     # Data
     yield 'POINT_DATA {}'.format(n)
@@ -66,6 +76,74 @@ def generate_vtk(root, links, xs, ys, zs, radii, data={}):
             yield '{:.7}'.format(value)
 
 
+class SwcFormatError(Exception):
+    pass
+
+
+def parse_swc_columns(fname):
+    """
+    Read a SWC file into typed columns
+
+    Blank lines and comments (#) are skipped. Every node whose parent is -1
+    is a root.
+
+    Returns
+    -------
+    columns : {string: array.array}
+        "id", "type", "x", "y", "z", "radius", "parent" in the order of the file
+
+    Raises
+    ------
+    SwcFormatError
+        With the line of the first row which has not 7 fields
+    """
+    with compressed.open_text(fname) as f:
+        lines = [line.rstrip('\r\n') for line in f
+                 if len(line.strip()) > 0 and line.lstrip()[0] != '#']
+
+    # Tokenize the whole file at once, and look for the bad line only if
+    # the fields are not a multiple of 7
+    tokens = ' '.join(lines).split()
+    if len(tokens) != 7 * len(lines):
+        for line in lines:
+            if len(line.split()) != 7:
+                raise SwcFormatError('Expected 7 fields : {}'.format(line))
+    try:
+        return {
+            "id": array.array(str('l'), map(int, tokens[0::7])),
+            "type": array.array(str('l'), map(int, tokens[1::7])),
+            "x": array.array(str('d'), map(float, tokens[2::7])),
+            "y": array.array(str('d'), map(float, tokens[3::7])),
+            "z": array.array(str('d'), map(float, tokens[4::7])),
+            "radius": array.array(str('d'), map(float, tokens[5::7])),
+            "parent": array.array(str('l'), map(int, tokens[6::7])),
+        }
+    except ValueError as e:
+        raise SwcFormatError(unicode(e))
+
+
+def columns_to_graph(columns):
+    """
+    Returns
+    -------
+    roots : [int]
+    links : [(int, int)]
+        (index, parent index)
+    """
+    ids, parents = columns["id"], columns["parent"]
+    label_to_index = dict(zip(ids, xrange(len(ids))))
+    roots = []
+    links = []
+    for index, parent in enumerate(parents):
+        if parent == -1:
+            roots.append(index)
+        elif parent in label_to_index:
+            links.append((index, label_to_index[parent]))
+        else:
+            raise SwcFormatError('Cannot find parent node {} of {}'.format(parent, ids[index]))
+    return roots, links
+
+
 def parse_swc(fname):
     """
     Parameters
@@ -75,61 +153,159 @@ def parse_swc(fname):
     Returns
     -------
     root : int
+        The first root
     links : [(int, int)]
     xs : [float]
     ys : [float]
     zs : [float]
     radii : [float]
     """
+    columns = parse_swc_columns(fname)
+    roots, links = columns_to_graph(columns)
+    if len(roots) == 0:
+        raise SwcFormatError('No root in {}'.format(fname))
+    return roots[0], links, columns["x"], columns["y"], columns["z"], columns["radius"]
+
+
+def find_swc(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if compressed.split_suffix(name)[0].endswith('.swc'))
+
+
+def convert_file(task):
+    """
+    Parameters
+    ----------
+    task : (string, string or None)
+        (SWC file, VTK file). Without a VTK file the parsed SWC is returned.
+
+    Returns
+    -------
+    result : int or (root, links, xs, ys, zs, radii)
+        The number of points written, or the output of parse_swc
+    error : string or None
+    """
+    input_swc, output_vtk = task
+    try:
+        ret = parse_swc(input_swc)
+    except IOError:
+        return None, 'No such file : {}'.format(input_swc)
+    except SwcFormatError as e:
+        return None, '{} : {}'.format(e, input_swc)
+    if output_vtk is None:
+        return ret, None
+    root, links, xs = ret[0], ret[1], ret[2]
+    # One polyline cell per chain of links instead of one cell per link
+    polylines = topology.chains(len(xs), links, stops=[root])
+    with compressed.open_text(output_vtk, 'w') as f:
+        for line in generate_vtk(*ret, polylines=polylines):
+            print(line, file=f)
+    return len(ret[2]), None
+
+
+def map_files(tasks, jobs):
+    if jobs <= 1:
+        return map(convert_file, tasks)
+    from multiprocessing import Pool
+    pool = Pool(jobs)
+    try:
+        return pool.map(convert_file, tasks, chunksize=max(1, len(tasks) // (4 * jobs)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def merge(parsed):
+    """
+    Concatenate the trees into one
 
-    # Convert to internal id
-    data = []
-    label_to_index = {}
-    with codecs.open(fname, encoding='utf_8') as f:
-        for line in f:
-            id_, type_, x, y, z, r, parent = line.split()
-            id_    = int(id_)
-            type_  = int(type_)
-            x      = float(x)
-            y      = float(y)
-            z      = float(z)
-            r      = float(r)
-            parent = int(parent)
-            data.append((id_, type_, x, y, z, r, parent))
-            label_to_index[id_] = len(label_to_index)
-
-    xs = [None]*len(label_to_index)
-    ys = [None]*len(label_to_index)
-    zs = [None]*len(label_to_index)
-    radii = [None]*len(label_to_index)
+    Parameters
+    ----------
+    parsed : [(root, links, xs, ys, zs, radii)]
+
+    Returns
+    -------
+    links, xs, ys, zs, radii : see parse_swc
+    component : [float]
+        The index of the tree of every point
+    """
     links = []
-    for d in data:
-        index = label_to_index[d[0]]
-        xs[index] = d[2]
-        ys[index] = d[3]
-        zs[index] = d[4]
-        radii[index] = d[5]
-        if d[6] == -1:
-            root = index
-        else:
-            assert d[6] in label_to_index, 'Cannot find parent node {}'.format(repr(d))
-            parent_index = label_to_index[d[6]]
-            links.append((index, parent_index))
+    xs, ys, zs, radii = [array.array(str('d')) for _ in xrange(4)]
+    component = []
+    for k, (_, ls, x, y, z, r) in enumerate(parsed):
+        offset = len(xs)
+        links.extend((a + offset, b + offset) for a, b in ls)
+        xs.extend(x)
+        ys.extend(y)
+        zs.extend(z)
+        radii.extend(r)
+        component.extend([float(k)]*len(x))
+    return links, xs, ys, zs, radii, component
+
+
+def convert_directory(input_dir, output, jobs=1, merged=False):
+    """
+    Convert every SWC file of the directory in a process pool
+
+    Parameters
+    ----------
+    output : string
+        The output directory (one VTK per SWC), or the VTK file if merged
+    merged : bool
+        Write all the trees into one VTK file with the scalar 'component'
 
-    return root, links, xs, ys, zs, radii
+    Returns
+    -------
+    files : int
+        The number of SWC files converted
+    errors : [string]
+    """
+    inputs = find_swc(input_dir)
+    if merged:
+        results = map_files([(fname, None) for fname in inputs], jobs)
+    else:
+        if not os.path.isdir(output):
+            os.makedirs(output)
+        results = map_files([(fname, os.path.join(output, os.path.basename(compressed.split_suffix(fname)[0])[:-4] + '.vtk'))
+                             for fname in inputs], jobs)
+    errors = [error for _, error in results if error is not None]
+    if merged:
+        parsed = [r for r, error in results if error is None]
+        links, xs, ys, zs, radii, component = merge(parsed)
+        roots, offset = [], 0
+        for r in parsed:
+            roots.append(r[0] + offset)
+            offset += len(r[2])
+        polylines = topology.chains(len(xs), links, stops=roots)
+        with compressed.open_text(output, 'w') as f:
+            for line in generate_vtk(0, links, xs, ys, zs, radii, {'component': component}, polylines):
+                print(line, file=f)
+    return len(results) - len(errors), errors
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument('input_swc')
-    parser.add_argument('output_vtk')
-    args = parser.parse_args()
+    parser.add_argument('input_swc',
+            help='SWC file, or a directory of them')
+    parser.add_argument('output_vtk',
+            help='VTK file, or a directory with a directory input (unless --merge)')
+    parser.add_argument('--jobs', type=int, default=1,
+            help='the number of processes for a directory')
+    parser.add_argument('--merge', action='store_true',
+            help='write all the SWC files of the directory into one VTK file')
+    args = parser.parse_args(argv)
 
-    ret = parse_swc(args.input_swc)
+    if os.path.isdir(args.input_swc):
+        files, errors = convert_directory(args.input_swc, args.output_vtk, args.jobs, args.merge)
+        for error in errors:
+            print("[Error] {}".format(error))
+        print("Converted {} files : {}".format(files, args.output_vtk))
+        return
+
+    _, error = convert_file((args.input_swc, args.output_vtk))
+    if error is not None:
+        print("[Error] {}".format(error))
+        sys.exit(1)
 
-    with codecs.open(args.output_vtk, mode='w', encoding='utf_8') as f:
-        for line in generate_vtk(*ret):
-            print(line, file=f)
 
 if __name__ == '__main__':
     common.set_terminal_encoding()
@@ -0,0 +1,64 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import codecs
+import os
+import shutil
+import tempfile
+import unittest
+import swc2vtk
+
+class TestSwc(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, lines):
+        fname = os.path.join(self.directory, name)
+        with open(fname, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return fname
+
+    def test_parse(self):
+        fname = self.write('a.swc', [
+            '# comment', '',
+            '1 1 0.0 0.0 0.0 2.0 -1',
+            '2 3 1.0 0.0 0.0 1.0 1',
+            '  # indented comment',
+            '5 3 9.0 9.0 9.0 1.0 -1',
+            '6 3 9.0 8.0 9.0 0.5 5'])
+        root, links, xs, ys, zs, radii = swc2vtk.parse_swc(fname)
+        self.assertEqual(root, 0)
+        self.assertEqual(links, [(1, 0), (3, 2)])
+        self.assertEqual(list(ys), [0.0, 0.0, 9.0, 8.0])
+        self.assertEqual(swc2vtk.columns_to_graph(swc2vtk.parse_swc_columns(fname))[0], [0, 2])
+
+        bad = self.write('b.swc', ['1 1 0.0 0.0 0.0 2.0 -1', '2 3 1.0 0.0 1.0 1'])
+        self.assertRaises(swc2vtk.SwcFormatError, swc2vtk.parse_swc, bad)
+        orphan = self.write('c.swc', ['1 1 0.0 0.0 0.0 2.0 -1', '2 3 1.0 0.0 0.0 1.0 7'])
+        self.assertRaises(swc2vtk.SwcFormatError, swc2vtk.parse_swc, orphan)
+
+    def test_directory(self):
+        for k in xrange(3):
+            self.write('{}.swc'.format(k), ['1 1 {} 0.0 0.0 2.0 -1'.format(k), '2 3 {} 1.0 0.0 1.0 1'.format(k)])
+        self.write('bad.swc', ['1 1 0.0'])
+        output = os.path.join(self.directory, 'vtk')
+        files, errors = swc2vtk.convert_directory(self.directory, output, jobs=2)
+        self.assertEqual((files, len(errors)), (3, 1))
+        self.assertEqual(sorted(os.listdir(output)), ['0.vtk', '1.vtk', '2.vtk'])
+
+        merged = os.path.join(self.directory, 'merged.vtk')
+        swc2vtk.convert_directory(self.directory, merged, merged=True)
+        with codecs.open(merged, encoding='utf_8') as f:
+            lines = f.read().splitlines()
+        self.assertIn('POINTS 6 float', lines)
+        # One polyline per tree, each starting at its root
+        k = lines.index('LINES 3 9')
+        self.assertEqual(lines[k + 1:k + 4], ['2 0 1', '2 2 3', '2 4 5'])
+        k = lines.index('SCALARS component float')
+        self.assertEqual(lines[k + 2:k + 8], ['0.0', '0.0', '1.0', '1.0', '2.0', '2.0'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,309 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import math
+from collections import deque
+
+
+def adjacency(n, links):
+    """
+    Build an undirected adjacency list in CSR layout
+
+    Parameters
+    ----------
+    n : int
+    links : [(int, int)]
+
+    Returns
+    -------
+    start : [int]
+        The neighbors of v are neighbors[start[v]:start[v+1]]
+    neighbors : [int]
+    """
+    degree = [0]*(n + 1)
+    for a, b in links:
+        if a == b: continue
+        degree[a] += 1
+        degree[b] += 1
+
+    start = [0]*(n + 1)
+    for v in xrange(n):
+        start[v + 1] = start[v] + degree[v]
+
+    fill = start[:]
+    neighbors = [None]*start[n]
+    for a, b in links:
+        if a == b: continue
+        neighbors[fill[a]] = b
+        fill[a] += 1
+        neighbors[fill[b]] = a
+        fill[b] += 1
+    return start, neighbors
+
+
+def chains(n, links, stops=()):
+    """
+    Split the links into maximal chains through the nodes of degree 2
+
+    Parameters
+    ----------
+    n : int
+    links : [(int, int)]
+        Duplicated links and self-loops are ignored
+    stops : [int]
+        Nodes which end the chains whatever their degree (e.g. the root)
+
+    Returns
+    -------
+    chains : [[int]]
+        Every link is in exactly one chain. Both ends of a chain are branch
+        points, leaves or stops, except for cycles which start and end at
+        the same node.
+    """
+    edges = set((min(a, b), max(a, b)) for a, b in links if a != b)
+    start, neighbors = adjacency(n, edges)
+    is_end = [start[v + 1] - start[v] != 2 for v in xrange(n)]
+    for v in stops:
+        is_end[v] = True
+
+    visited = set()
+    def walk(u, v):
+        chain = [u, v]
+        visited.add((min(u, v), max(u, v)))
+        while not is_end[v]:
+            a, b = neighbors[start[v]], neighbors[start[v] + 1]
+            w = b if (min(v, a), max(v, a)) in visited else a
+            e = (min(v, w), max(v, w))
+            if e in visited: break
+            visited.add(e)
+            chain.append(w)
+            v = w
+        return chain
+
+    ret = []
+    for u in xrange(n):
+        if not is_end[u]: continue
+        for k in xrange(start[u], start[u + 1]):
+            v = neighbors[k]
+            if (min(u, v), max(u, v)) not in visited:
+                ret.append(walk(u, v))
+
+    # The rest are cycles of nodes of degree 2
+    for u in xrange(n):
+        for k in xrange(start[u], start[u + 1]):
+            v = neighbors[k]
+            if (min(u, v), max(u, v)) not in visited:
+                ret.append(walk(u, v))
+    return ret
+
+
+class TopologyIndex(object):
+    """
+    Array index of a tree oriented from the root
+
+    order : [int]
+        Reachable nodes in BFS order (a parent always comes before its children)
+    parent : [int]
+        -1 for the root and the unreachable nodes
+    child_start, children : [int]
+        The children of v are children[child_start[v]:child_start[v+1]]
+    tin, size : [int]
+        Euler tour (preorder) position and subtree size.
+        The subtree of u is the interval [tin[u], tin[u] + size[u]).
+        tin is -1 for the unreachable nodes.
+    """
+    def __init__(self, n, links, root=0):
+        self.n = n
+        self.root = root
+        start, neighbors = adjacency(n, links)
+
+        parent = [-1]*n
+        visited = [False]*n
+        order = [root]
+        visited[root] = True
+        que = deque([root])
+        while len(que) > 0:
+            v = que.popleft()
+            for k in xrange(start[v], start[v + 1]):
+                u = neighbors[k]
+                if visited[u]: continue
+                visited[u] = True
+                parent[u] = v
+                order.append(u)
+                que.append(u)
+
+        # Children are contiguous and in BFS order
+        child_start = [0]*(n + 1)
+        for v in order[1:]:
+            child_start[parent[v] + 1] += 1
+        for v in xrange(n):
+            child_start[v + 1] += child_start[v]
+        fill = child_start[:]
+        children = [None]*(len(order) - 1)
+        for v in order[1:]:
+            p = parent[v]
+            children[fill[p]] = v
+            fill[p] += 1
+
+        # Lay the subtrees out side by side without recursion
+        size = [1]*n
+        for v in reversed(order[1:]):
+            size[parent[v]] += size[v]
+        tin = [-1]*n
+        tin[root] = 0
+        for v in order:
+            pos = tin[v] + 1
+            for k in xrange(child_start[v], child_start[v + 1]):
+                c = children[k]
+                tin[c] = pos
+                pos += size[c]
+
+        self.order = order
+        self.parent = parent
+        self.child_start = child_start
+        self.children = children
+        self.tin = tin
+        self.size = size
+
+    def children_of(self, v):
+        return self.children[self.child_start[v]:self.child_start[v + 1]]
+
+    def child_count(self, v):
+        return self.child_start[v + 1] - self.child_start[v]
+
+    def is_reachable(self, v):
+        return v == self.root or self.parent[v] != -1
+
+    def contains(self, u, v):
+        """
+        True if v is in the subtree of u (including u itself) in O(1)
+        """
+        t = self.tin[v]
+        return self.tin[u] <= t < self.tin[u] + self.size[u] and t != -1
+
+
+def edge_lengths(index, xs, ys, zs):
+    """
+    Length of the edge from each node to its parent (0.0 for the root)
+    """
+    ret = [0.0]*index.n
+    parent = index.parent
+    for v in index.order[1:]:
+        p = parent[v]
+        ret[v] = math.sqrt((xs[v] - xs[p])**2 + (ys[v] - ys[p])**2 + (zs[v] - zs[p])**2)
+    return ret
+
+
+def edge_volumes(index, xs, ys, zs, radii, lengths=None):
+    """
+    Volume of the frustum from each node to its parent
+
+    Like TreeRoot.edge_volume_sum, the edges touching the root (stump) are 0.0.
+    """
+    if lengths is None:
+        lengths = edge_lengths(index, xs, ys, zs)
+    ret = [0.0]*index.n
+    parent = index.parent
+    root = index.root
+    for v in index.order[1:]:
+        p = parent[v]
+        if p == root: continue
+        r1, r2 = radii[v], radii[p]
+        ret[v] = math.pi * (r1*r1 + r1*r2 + r2*r2) * lengths[v] / 3.0
+    return ret
+
+
+def path_lengths(index, lengths):
+    """
+    Path length from the root
+    """
+    ret = [0.0]*index.n
+    parent = index.parent
+    for v in index.order[1:]:
+        ret[v] = ret[parent[v]] + lengths[v]
+    return ret
+
+
+def topological_orders(index):
+    """
+    The number of edges from the root (0 for the root)
+    """
+    ret = [0]*index.n
+    parent = index.parent
+    for v in index.order[1:]:
+        ret[v] = ret[parent[v]] + 1
+    return ret
+
+
+def strahler_orders(index):
+    """
+    Strahler number: 1 for the tips, and the order increases by one
+    where two branches of the same (highest) order join
+    """
+    ret = [1]*index.n
+    # The number of children which have the highest order
+    count = [0]*index.n
+    parent = index.parent
+    for v in reversed(index.order):
+        if count[v] >= 2:
+            ret[v] += 1
+        if v == index.root: continue
+        p = parent[v]
+        if count[p] == 0 or ret[v] > ret[p]:
+            ret[p] = ret[v]
+            count[p] = 1
+        elif ret[v] == ret[p]:
+            count[p] += 1
+    return ret
+
+
+def subtree_sums(index, values):
+    """
+    Sum of values over the edges below each node
+
+    values[v] belongs to the edge from v to its parent.
+    """
+    ret = [0.0]*index.n
+    parent = index.parent
+    for v in reversed(index.order[1:]):
+        ret[parent[v]] += ret[v] + values[v]
+    return ret
+
+
+def branch_counts(index):
+    """
+    The number of branching nodes (two or more children) in each subtree
+    """
+    ret = [0]*index.n
+    parent = index.parent
+    for v in reversed(index.order):
+        if index.child_count(v) >= 2:
+            ret[v] += 1
+        if v != index.root:
+            ret[parent[v]] += ret[v]
+    return ret
+
+
+def compute_metrics(index, xs, ys, zs, radii):
+    """
+    Compute every metric in linear time
+
+    Returns
+    -------
+    metrics : {string: [float]}
+        Can be passed to swc2vtk.generate_vtk as data.
+    """
+    lengths = edge_lengths(index, xs, ys, zs)
+    volumes = edge_volumes(index, xs, ys, zs, radii, lengths)
+    metrics = {
+        "path_length": path_lengths(index, lengths),
+        "strahler_order": strahler_orders(index),
+        "topological_order": topological_orders(index),
+        "subtree_volume": subtree_sums(index, volumes),
+        "subtree_length": subtree_sums(index, lengths),
+        "branch_count": branch_counts(index),
+    }
+    # The VTK writer formats every value as float
+    for key in metrics:
+        metrics[key] = map(float, metrics[key])
+    return metrics
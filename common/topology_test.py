@@ -0,0 +1,68 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+from topology import TopologyIndex
+import topology
+
+class TestTopologyIndex(unittest.TestCase):
+    #     0
+    #    / \
+    #   1   4
+    #  / \
+    # 2   3
+    links = [(1, 0), (2, 1), (3, 1), (4, 0)]
+    xs = [0.0, 0.0, -3.0, 3.0, 5.0]
+    ys = [0.0, 0.0, 0.0, 0.0, 0.0]
+    zs = [0.0, -1.0, -5.0, -5.0, 0.0]
+    radii = [1.0, 1.0, 1.0, 1.0, 1.0]
+
+    def test_index(self):
+        index = TopologyIndex(5, self.links + [(0, 0)])
+        self.assertEqual(index.order, [0, 1, 4, 2, 3])
+        self.assertEqual(index.parent, [-1, 0, 1, 1, 0])
+        self.assertEqual(index.children_of(0), [1, 4])
+        self.assertEqual(index.children_of(1), [2, 3])
+        self.assertEqual(index.children_of(2), [])
+
+    def test_contains(self):
+        index = TopologyIndex(5, self.links)
+        self.assertEqual(index.size, [5, 3, 1, 1, 1])
+        self.assertTrue(index.contains(0, 3))
+        self.assertTrue(index.contains(1, 1))
+        self.assertTrue(index.contains(1, 2))
+        self.assertTrue(index.contains(1, 3))
+        self.assertFalse(index.contains(1, 4))
+        self.assertFalse(index.contains(2, 3))
+        self.assertFalse(index.contains(4, 1))
+
+    def test_unreachable(self):
+        index = TopologyIndex(4, [(1, 0), (3, 2)])
+        self.assertEqual(index.order, [0, 1])
+        self.assertTrue(index.is_reachable(1))
+        self.assertFalse(index.is_reachable(2))
+        self.assertFalse(index.contains(2, 3))
+        self.assertFalse(index.contains(0, 3))
+
+    def test_metrics(self):
+        index = TopologyIndex(5, self.links)
+        m = topology.compute_metrics(index, self.xs, self.ys, self.zs, self.radii)
+        self.assertEqual(m["path_length"], [0.0, 1.0, 6.0, 6.0, 5.0])
+        self.assertEqual(m["topological_order"], [0.0, 1.0, 2.0, 2.0, 1.0])
+        self.assertEqual(m["strahler_order"], [2.0, 2.0, 1.0, 1.0, 1.0])
+        self.assertEqual(m["subtree_length"], [16.0, 10.0, 0.0, 0.0, 0.0])
+        self.assertEqual(m["branch_count"], [2.0, 1.0, 0.0, 0.0, 0.0])
+        # The edges touching the stump have no volume
+        self.assertAlmostEqual(m["subtree_volume"][0], m["subtree_volume"][1])
+        self.assertAlmostEqual(m["subtree_volume"][1], 10.0 * 3.14159265358979)
+
+    def test_chains(self):
+        # 0 - 1 - 2 - 3, 3 - 4 - 5 - 3 (loop at 3), 6 - 7 - 8 - 6 (cycle)
+        links = [(1, 0), (2, 1), (3, 2), (4, 3), (5, 3), (5, 4), (7, 6), (8, 7), (6, 8), (2, 1), (6, 6)]
+        chains = topology.chains(10, links, stops=[0])
+        self.assertEqual(sorted(map(tuple, chains)), [(0, 1, 2, 3), (3, 4, 5, 3), (6, 7, 8, 6)])
+        chains = topology.chains(5, self.links)
+        self.assertEqual(sorted(map(tuple, chains)), [(1, 0, 4), (1, 2), (1, 3)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,354 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# Float32 storage of the coordinates and the radii
+#
+# The field data have a few decimal places, so the float64 value of a column
+# is recovered from its float32 value by decimal rounding. The values which
+# are not (more decimals, too large) are kept in an exception table.
+#
+# The reconstruction engines compute the cost of every candidate from the
+# float32 coordinates together with a bound of its error. Only the decisions
+# which the error could change (near-ties, and the edges the minimum spanning
+# tree reaches) are recomputed with the float64 values, so the links are the
+# same as with float64 storage. The kernels have
+# to be non-increasing in cos(theta) and non-decreasing in the distance, like
+# all the kernels of cost_kernel.
+
+import array
+import heapq
+import math
+import sys
+from itertools import izip
+
+from disjoint_set import DisjointSet
+
+# Unit roundoff of float32
+UNIT_ROUNDOFF = 2.0 ** -24
+# The largest finite float32
+FLOAT32_MAX = 3.4028234663852886e38
+
+
+class CompactColumn(object):
+    """
+    float32 column which reads back the original float64 values
+
+    Parameters
+    ----------
+    values : [float]
+    decimals : int
+        The number of decimal places of the data
+    scale : float
+        The values are the data times scale (e.g. the radii, which are the
+        diameters of the input times coef_radius). The unscaled data are
+        stored, so that they keep their decimal places.
+    """
+    def __init__(self, values, decimals=1, scale=1.0):
+        self.decimals = decimals
+        self.scale = scale
+        self.exceptions = {}
+        data = [round(v / scale, decimals) for v in values] if scale != 1.0 else values
+        self.values = array.array(str('f'), data)
+        for i, (v, f) in enumerate(zip(values, self.values)):
+            if round(f, decimals) * scale != v:
+                self.exceptions[i] = v
+        self.max_abs = max(abs(v) for v in values) if len(self.values) > 0 else 0.0
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in xrange(*i.indices(len(self.values)))]
+        if i in self.exceptions:
+            return self.exceptions[i]
+        return round(self.values[i], self.decimals) * self.scale
+
+    def __iter__(self):
+        return iter(self.decode())
+
+    def decode(self):
+        """
+        All the float64 values, read from the float32 array in one pass
+        """
+        decimals, scale = self.decimals, self.scale
+        if scale == 1.0:
+            values = [round(f, decimals) for f in self.values]
+        else:
+            values = [round(f, decimals) * scale for f in self.values]
+        for i, v in self.exceptions.iteritems():
+            values[i] = v
+        return values
+
+    def nbytes(self):
+        entries = sum(sys.getsizeof(i) + sys.getsizeof(v) for i, v in self.exceptions.iteritems())
+        return self.values.itemsize * len(self.values) + sys.getsizeof(self.exceptions) + entries
+
+
+def is_compact(tree_root):
+    return isinstance(tree_root.xs, CompactColumn)
+
+
+def coordinate_error(tree_root):
+    """
+    Bound of the error of a vector between two points computed from the
+    float32 coordinates
+    """
+    delta = UNIT_ROUNDOFF * max(tree_root.xs.max_abs, tree_root.ys.max_abs, tree_root.zs.max_abs)
+    return 2.0 * math.sqrt(3.0) * delta * (1.0 + 1e-6)
+
+
+def approx_row(tree_root, i, candidates, error):
+    """
+    Intervals of cos(theta) and the distance from point i to the candidates
+    (see reconstructor.row_geometry) from the float32 coordinates
+
+    Returns
+    -------
+    cos_lo, cos_hi, dist_lo, dist_hi : [float]
+    """
+    xs, ys, zs = tree_root.xs.values, tree_root.ys.values, tree_root.zs.values
+    sx, sy, sz = xs[i], ys[i], zs[i]
+    vcx, vcy, vcz = xs[0] - sx, ys[0] - sy, zs[0] - sz
+    abs_center = math.sqrt(vcx*vcx + vcy*vcy + vcz*vcz)
+
+    sqrt = math.sqrt
+    vecs = [(xs[j] - sx, ys[j] - sy, zs[j] - sz) for j in candidates]
+    dists = [sqrt(vx*vx + vy*vy + vz*vz) for vx, vy, vz in vecs]
+    dist_lo = [max(0.0, d - error - 1e-12 * d) for d in dists]
+    dist_hi = [d + error + 1e-12 * d for d in dists]
+
+    if abs_center <= error:
+        # The center may be the point itself: every cos is 1 or anything
+        return [-1.0]*len(candidates), [1.0]*len(candidates), dist_lo, dist_hi
+
+    # |u - u'| <= 2 |v - v'| / |v'| for the unit vectors u, u' of v, v'
+    center_error = 2.0 * error / abs_center + 1e-12
+    cos_lo, cos_hi = [], []
+    for (vx, vy, vz), d in zip(vecs, dists):
+        if d <= error:
+            cos_lo.append(-1.0)
+            cos_hi.append(1.0)
+            continue
+        c = (vx*vcx + vy*vcy + vz*vcz) / (d * abs_center)
+        e = 2.0 * error / d + center_error
+        cos_lo.append(max(-1.0, min(c - e, 1.0)))
+        cos_hi.append(max(-1.0, min(c + e, 1.0)))
+    return cos_lo, cos_hi, dist_lo, dist_hi
+
+
+def exact_row(tree_root, i, candidates):
+    """
+    Same arithmetic as reconstructor.row_geometry with the float64 values
+    """
+    xs, ys, zs = tree_root.xs, tree_root.ys, tree_root.zs
+    sx, sy, sz = xs[i], ys[i], zs[i]
+    vcx, vcy, vcz = xs[0] - sx, ys[0] - sy, zs[0] - sz
+    abs_center = math.sqrt(vcx**2 + vcy**2 + vcz**2)
+
+    sqrt = math.sqrt
+    vecs = [(xs[j] - sx, ys[j] - sy, zs[j] - sz) for j in candidates]
+    dists = [sqrt(vx*vx + vy*vy + vz*vz) for vx, vy, vz in vecs]
+
+    if abs_center == 0.0:
+        return [1.0]*len(candidates), dists
+
+    dots = [vx*vcx + vy*vcy + vz*vcz for vx, vy, vz in vecs]
+    cos_thetas = [max(-1.0, min(dot / (abs_dst * abs_center), 1.0)) if abs_dst != 0.0 else 1.0
+                  for dot, abs_dst in zip(dots, dists)]
+    return cos_thetas, dists
+
+
+def max_distance(tree_root):
+    """
+    Same as TreeRoot.max_distance. Only the pairs which can be the farthest
+    with the error of float32 are measured again with the float64 values.
+    """
+    xs, ys, zs = tree_root.xs.values, tree_root.ys.values, tree_root.zs.values
+    n = len(xs)
+    error = coordinate_error(tree_root)
+    sqrt = math.sqrt
+    best_lo = 0.0
+    pairs = []
+    for i in xrange(n - 1):
+        xi, yi, zi = xs[i], ys[i], zs[i]
+        row = [sqrt((xi - xs[j])**2 + (yi - ys[j])**2 + (zi - zs[j])**2) for j in xrange(i+1, n)]
+        m = max(row)
+        best_lo = max(best_lo, m - error - 1e-12 * m)
+        pairs.extend((d, i, i + 1 + k) for k, d in enumerate(row) if d + error + 1e-12 * d >= best_lo)
+        if len(pairs) > 4 * n:
+            pairs = [p for p in pairs if p[0] + error + 1e-12 * p[0] >= best_lo]
+
+    xs, ys, zs = tree_root.xs, tree_root.ys, tree_root.zs
+    max_sq = 0.0
+    for d, i, j in pairs:
+        if d + error + 1e-12 * d < best_lo: continue
+        sq = (xs[i] - xs[j])**2 + (ys[i] - ys[j])**2 + (zs[i] - zs[j])**2
+        if sq > max_sq: max_sq = sq
+    return math.sqrt(math.sqrt(max_sq))
+
+
+def center_sq_distances(tree_root):
+    """
+    Same as the cached geometry of TreeRoot, without caching the other values
+    """
+    xs, ys, zs = tree_root.xs.decode(), tree_root.ys.decode(), tree_root.zs.decode()
+    cx, cy, cz = xs[0], ys[0], zs[0]
+    return [(cx - x)**2 + (cy - y)**2 + (cz - z)**2 for x, y, z in zip(xs, ys, zs)]
+
+
+def _decode(column):
+    if isinstance(column, CompactColumn):
+        return column.decode()
+    return list(column)
+
+
+def _bounds(kernel, tree_root, i, candidates, radii, param, max_d, error):
+    cos_lo, cos_hi, dist_lo, dist_hi = approx_row(tree_root, i, candidates, error)
+    if kernel.distance_only:
+        cos_lo = cos_hi = None
+    radii_j = [radii[j] for j in candidates]
+    lo = kernel(cos_hi, dist_lo, radii[i], radii_j, param, max_d)
+    hi = kernel(cos_lo, dist_hi, radii[i], radii_j, param, max_d)
+    return lo, hi
+
+
+def _exact_costs(kernel, tree_root, i, candidates, radii, param, max_d):
+    cos_thetas, dists = exact_row(tree_root, i, candidates)
+    if kernel.distance_only:
+        cos_thetas = None
+    return kernel(cos_thetas, dists, radii[i], [radii[j] for j in candidates], param, max_d)
+
+
+def _lower_bounds(kernel, tree_root, i, candidates, radii, param, max_d, error):
+    cos_lo, cos_hi, dist_lo, dist_hi = approx_row(tree_root, i, candidates, error)
+    if kernel.distance_only:
+        cos_hi = None
+    return kernel(cos_hi, dist_lo, radii[i], [radii[j] for j in candidates], param, max_d)
+
+
+def _float32_below(v):
+    """
+    A value not above v which float32 keeps as is or rounds down
+    """
+    if v > FLOAT32_MAX:
+        return FLOAT32_MAX
+    if v < -FLOAT32_MAX:
+        return -float('inf')
+    # The rounding to float32 is less than abs(v) * 2**-24, or 2**-150
+    # for the subnormal values
+    return v - abs(v) * 2.0 ** -23 - 2.0 ** -149
+
+
+def _row_edges(i, bounds, dsts):
+    for lo, j in izip(bounds, dsts):
+        yield lo, i, j
+
+
+def minimum_spanning_tree(tree_root, kernel, param, stats=None, on_link=None):
+    """
+    Same links as reconstructor.MinimumSpanningTree
+
+    Only a float32 lower bound of the cost is kept for every edge (with the
+    index of its other end), each row sorted by it. The rows are merged
+    lazily, and every edge taken out which could still make a link gets its
+    float64 cost. An edge is linked once its float64 cost is below the lower
+    bound of every edge not taken out yet, in the order of the float64 cost
+    (and of generation for the ties), as in the float64 engine.
+    """
+    n = tree_root.node_count()
+    max_d = None if kernel.distance_only else tree_root.max_distance()
+    radii = _decode(tree_root.radii)
+    error = coordinate_error(tree_root)
+    index_code = 'H' if n <= 1 << 16 else 'i'
+    rows = []
+    for i in xrange(n - 1):
+        candidates = range(i + 1, n)
+        lo = _lower_bounds(kernel, tree_root, i, candidates, radii, param, max_d, error)
+        order = sorted(xrange(len(lo)), key=lo.__getitem__)
+        bounds = array.array('f', [_float32_below(lo[k]) for k in order])
+        dsts = array.array(index_code, [i + 1 + k for k in order])
+        rows.append(_row_edges(i, bounds, dsts))
+    edges = heapq.merge(*rows)
+
+    disjoint_set = DisjointSet(n)
+    links = []
+    # (float64 cost, src, dst) of the edges taken out
+    exact = []
+    taken, recomputed = 0, 0
+    edge = next(edges, None)
+    while len(links) < n - 1:
+        if len(exact) > 0 and (edge is None or exact[0][0] < edge[0]):
+            _, src, dst = heapq.heappop(exact)
+            if not disjoint_set.same(src, dst):
+                disjoint_set.merge(src, dst)
+                links.append((src, dst))
+                if on_link is not None: on_link(src, dst)
+            continue
+        if edge is None:
+            break
+        _, src, dst = edge
+        edge = next(edges, None)
+        taken += 1
+        # The edges already in a component are skipped in any order
+        if disjoint_set.same(src, dst): continue
+        recomputed += 1
+        cost = _exact_costs(kernel, tree_root, src, [dst], radii, param, max_d)[0]
+        heapq.heappush(exact, (cost, src, dst))
+
+    if stats is not None:
+        stats["decisions"] = taken
+        stats["recomputed"] = recomputed
+    return links
+
+
+def sekihara(tree_root, kernel, param, stats=None, on_link=None):
+    """
+    Same links as reconstructor.SekiharaMethod
+
+    A row is recomputed with the float64 values only for the candidates whose
+    lower bound of the cost is not above the smallest upper bound.
+    """
+    links = []
+
+    n = tree_root.node_count()
+    max_d = None if kernel.distance_only else tree_root.max_distance()
+    UF = DisjointSet(n)
+    order_by_dist = tree_root.order_by_dist(reverse=True)
+    radii = _decode(tree_root.radii)
+    error = coordinate_error(tree_root)
+    inf = float('inf')
+    decisions, recomputed = 0, 0
+
+    for t in xrange(0, n-1):
+        i = order_by_dist[t][0]
+        radius_i = radii[i]
+
+        # Avoid making a cycle
+        candidates = [j for j in xrange(0, n)
+                      if j != i and (j == 0 or radius_i <= 1.3 * radii[j]) and not UF.same(i, j)]
+        if len(candidates) == 0: continue
+
+        decisions += 1
+        lo, hi = _bounds(kernel, tree_root, i, candidates, radii, param, max_d, error)
+        best_hi = min(hi)
+        near = [k for k in xrange(len(lo)) if lo[k] <= best_hi]
+        if len(near) == 1 and hi[near[0]] < inf:
+            k, cost = near[0], hi[near[0]]
+        else:
+            recomputed += 1
+            costs = _exact_costs(kernel, tree_root, i, [candidates[k] for k in near], radii, param, max_d)
+            # The first one wins a tie
+            m = min(xrange(len(costs)), key=costs.__getitem__)
+            k, cost = near[m], costs[m]
+
+        if cost < inf:
+            next_index = candidates[k]
+            links.append((i, next_index))
+            UF.merge(i, next_index)
+            if on_link is not None: on_link(i, next_index)
+
+    if stats is not None:
+        stats["decisions"] = decisions
+        stats["recomputed"] = recomputed
+    return links
@@ -0,0 +1,68 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import array
+import random
+import unittest
+from compact import CompactColumn
+import compact
+from treeroot import TreeRoot
+import reconstructor
+
+class TestCompact(unittest.TestCase):
+    def test_column(self):
+        values = [0.1, -123.4, 98765.4, 1.23456789, 1e10 + 0.5]
+        column = CompactColumn(values, decimals=1)
+        self.assertEqual(list(column), values)
+        self.assertEqual(column[1:3], values[1:3])
+        self.assertEqual(sorted(column.exceptions), [3, 4])
+
+    def test_scaled_radii(self):
+        # Diameters of the field data times coef_radius lose the decimal places
+        rnd = random.Random(0)
+        diameters = [rnd.randint(5, 400) / 10.0 for _ in xrange(10000)]
+        for coef_radius in (0.05, 0.5):
+            radii = [d * coef_radius for d in diameters]
+            column = CompactColumn(radii, 1, coef_radius)
+            self.assertEqual(list(column), radii)
+            self.assertEqual(column[:5], radii[:5])
+            self.assertEqual(len(column.exceptions), 0)
+            self.assertLess(column.nbytes(), 8 * len(radii) // 2 + 1000)
+
+    def test_same_links(self):
+        # Points on a grid give many exact ties
+        rnd = random.Random(0)
+        n = 120
+        xs = [0.0] + [rnd.randint(-4, 4) * 0.5 for _ in xrange(n - 1)]
+        ys = [0.0] + [rnd.randint(-4, 4) * 0.5 for _ in xrange(n - 1)]
+        zs = [0.0] + [-rnd.randint(1, 6) * 0.5 for _ in xrange(n - 1)]
+        radii = [rnd.choice([1.0, 1.5, 2.0, 2.3, 4.7]) * 0.05 for _ in xrange(n)]
+        tree_root = TreeRoot(links=[], xs=xs, ys=ys, zs=zs, radii=radii,
+                             labels=range(n), label_to_index=dict((i, i) for i in xrange(n)), coef_radius=0.05)
+        for compact_tree_root in (tree_root.to_compact(), tree_root.to_compact(coef_radius=0)):
+            self.assertEqual(list(compact_tree_root.radii), radii)
+            self.assertEqual(compact_tree_root.max_distance(), tree_root.max_distance())
+            for method in ['dist', 'ip', 'an', 'ip-radius']:
+                expected = reconstructor.create(method).reconstruct(tree_root)
+                self.assertEqual(reconstructor.create(method).reconstruct(compact_tree_root), expected)
+        self.assertEqual(len(tree_root.to_compact().radii.exceptions), 0)
+
+        # The minimum spanning tree with a kernel which uses the angles
+        compact_tree_root = tree_root.to_compact()
+        for kernel in ['ip', 'ip-radius']:
+            r = reconstructor.MinimumSpanningTree(kernel, 1.1)
+            self.assertEqual(r.reconstruct(compact_tree_root),
+                             reconstructor.MinimumSpanningTree(kernel, 1.1).reconstruct(tree_root))
+            # It stops at the last link, before the most of the n(n-1)/2 edges
+            self.assertLess(r.guard_stats["decisions"], n * (n - 1) // 2)
+            self.assertLessEqual(r.guard_stats["recomputed"], r.guard_stats["decisions"])
+
+    def test_float32_below(self):
+        rnd = random.Random(0)
+        values = [rnd.uniform(-1, 1) * 10 ** rnd.randint(-50, 50) for _ in xrange(10000)]
+        values += [0.0, 1.0, -1.0, 1e39, -1e39, float('inf'), 3.4028234663852886e38, 1e-46]
+        for v in values:
+            self.assertLessEqual(array.array('f', [compact._float32_below(v)])[0], v)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import math
+
+# name -> kernel
+KERNELS = {}
+
+
+def register_kernel(name, distance_only=False):
+    """
+    Register a cost kernel under the given name
+
+    A kernel evaluates the connection cost from one source point to a whole
+    row of candidate points at once. A kernel registered with
+    distance_only=True is given None for cos_thetas and max_d, so that the
+    reconstructors skip the angles and max_distance.
+
+    Parameters of the kernel
+    ------------------------
+    cos_thetas : [float]  cosine between (src -> dst) and (src -> center)
+    dists : [float]       distance between src and dst
+    radius_i : float      radius of the source point
+    radii_j : [float]     radii of the candidate points
+    param : float         method parameter (alpha or w)
+    max_d : float         normalization factor of the distance
+
+    Returns
+    -------
+    costs : [float]
+
+    Examples
+    --------
+    >>> @register_kernel('dist2')
+    ... def squared_distance(cos_thetas, dists, radius_i, radii_j, param, max_d):
+    ...     return [d * d for d in dists]
+    """
+    def _register(func):
+        func.distance_only = distance_only
+        KERNELS[name] = func
+        return func
+    return _register
+
+
+def get_kernel(name):
+    if name not in KERNELS:
+        raise ValueError('Unknown cost kernel : {} (choose from {})'.format(name, ', '.join(kernel_names())))
+    return KERNELS[name]
+
+
+def kernel_names():
+    return sorted(KERNELS.keys())
+
+
+@register_kernel('dist', distance_only=True)
+def distance_cost(cos_thetas, dists, radius_i, radii_j, param, max_d):
+    """
+    Distance only (used by the minimum spanning tree)
+    """
+    return list(dists)
+
+
+@register_kernel('ip')
+def inner_product_cost(cos_thetas, dists, radius_i, radii_j, param, max_d):
+    """
+    w * (1 - cos(theta)) + d / max_d
+    """
+    return [param * (1.0 - c) + d / max_d for c, d in zip(cos_thetas, dists)]
+
+
+@register_kernel('an')
+def angle_cost(cos_thetas, dists, radius_i, radii_j, param, max_d):
+    """
+    theta + alpha * d / max_d
+    """
+    acos = math.acos
+    return [acos(c) + param * d / max_d for c, d in zip(cos_thetas, dists)]
+
+
+@register_kernel('ip-radius')
+def radius_weighted_cost(cos_thetas, dists, radius_i, radii_j, param, max_d):
+    """
+    Inner product cost multiplied by (1 + relative radius difference),
+    so that a point prefers a parent of similar thickness
+    """
+    costs = []
+    for c, d, r_j in zip(cos_thetas, dists, radii_j):
+        s = radius_i + r_j
+        diff = abs(r_j - radius_i) / s if s > 0.0 else 0.0
+        costs.append((param * (1.0 - c) + d / max_d) * (1.0 + diff))
+    return costs
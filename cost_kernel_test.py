@@ -0,0 +1,122 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import copy
+import math
+import random
+import unittest
+from disjoint_set import DisjointSet
+from testing import random_tree
+import cost_kernel
+import reconstructor
+
+# The cost functions of SekiharaMethod before the kernels
+BASELINE = {
+    'ip': lambda param: lambda cos_theta, abs_dst, max_d: param * (1.0 - cos_theta) + abs_dst / max_d,
+    'an': lambda param: lambda cos_theta, abs_dst, max_d: math.acos(cos_theta) + param * abs_dst / max_d,
+}
+
+def baseline_mst(tree_root):
+    n = tree_root.node_count()
+    es = sorted(((math.sqrt(tree_root.distance(i, j)), i, j) for i in xrange(n) for j in xrange(i + 1, n)),
+                key=lambda tup: tup[0])
+    disjoint_set = DisjointSet(n)
+    links = []
+    for _, src, dst in es:
+        if not disjoint_set.same(src, dst):
+            disjoint_set.merge(src, dst)
+            links.append((src, dst))
+    return links
+
+def baseline_sekihara(tree_root, cost_func):
+    """
+    SekiharaMethod with one cost per pair
+    """
+    n = tree_root.node_count()
+    max_d = tree_root.max_distance()
+    xs, ys, zs, radii = tree_root.xs, tree_root.ys, tree_root.zs, tree_root.radii
+    UF = DisjointSet(n)
+    links = []
+    for i, _ in tree_root.order_by_dist(reverse=True)[:n - 1]:
+        cost, next_index = float('inf'), -1
+        vc = (xs[0] - xs[i], ys[0] - ys[i], zs[0] - zs[i])
+        abs_center = math.sqrt(sum(v * v for v in vc))
+        for j in xrange(n):
+            if i == j or (j != 0 and radii[i] > 1.3 * radii[j]) or UF.same(i, j): continue
+            vd = (xs[j] - xs[i], ys[j] - ys[i], zs[j] - zs[i])
+            abs_dst = math.sqrt(sum(v * v for v in vd))
+            if abs_dst == 0.0 or abs_center == 0.0:
+                cos_theta = 1.0
+            else:
+                cos_theta = max(-1.0, min(sum(a * b for a, b in zip(vd, vc)) / (abs_dst * abs_center), 1.0))
+            c = cost_func(cos_theta, abs_dst, max_d)
+            if cost > c:
+                cost, next_index = c, j
+        if next_index != -1:
+            links.append((i, next_index))
+            UF.merge(i, next_index)
+    return links
+
+class TestCostKernel(unittest.TestCase):
+    def tearDown(self):
+        cost_kernel.KERNELS.pop('test-dist2', None)
+
+    def test_registry(self):
+        self.assertEqual(cost_kernel.kernel_names(), ['an', 'dist', 'ip', 'ip-radius'])
+        self.assertRaises(ValueError, cost_kernel.get_kernel, 'unknown')
+        self.assertTrue(cost_kernel.get_kernel('dist').distance_only)
+        self.assertFalse(cost_kernel.get_kernel('ip').distance_only)
+
+        @cost_kernel.register_kernel('test-dist2', distance_only=True)
+        def squared_distance(cos_thetas, dists, radius_i, radii_j, param, max_d):
+            self.assertEqual((cos_thetas, max_d), (None, None))
+            return [d * d for d in dists]
+        self.assertIs(cost_kernel.get_kernel('test-dist2'), squared_distance)
+        self.assertIn('test-dist2', cost_kernel.kernel_names())
+        # The same order of the costs as the distance
+        tree_root = random_tree(40, 3)
+        # Not called for a distance-only kernel
+        tree_root.max_distance = None
+        self.assertEqual(reconstructor.MinimumSpanningTree('test-dist2').reconstruct(tree_root),
+                         reconstructor.MinimumSpanningTree().reconstruct(random_tree(40, 3)))
+
+    def test_baseline_costs(self):
+        rnd = random.Random(0)
+        cos_thetas = [rnd.uniform(-1, 1) for _ in xrange(50)] + [-1.0, 0.0, 1.0]
+        dists = [rnd.uniform(0, 30) for _ in cos_thetas]
+        radii_j = [rnd.uniform(0.1, 2) for _ in cos_thetas]
+        for name, cost_func in BASELINE.iteritems():
+            for param in (0.5, 1.1, 3.0):
+                expected = [cost_func(param)(c, d, 42.0) for c, d in zip(cos_thetas, dists)]
+                self.assertEqual(cost_kernel.get_kernel(name)(cos_thetas, dists, 1.0, radii_j, param, 42.0), expected)
+        self.assertEqual(cost_kernel.get_kernel('dist')(None, dists, 1.0, radii_j, 0.0, None), dists)
+
+        # ip-radius is ip when the radii are the same, and more otherwise
+        ip = cost_kernel.get_kernel('ip')(cos_thetas, dists, 1.0, radii_j, 1.1, 42.0)
+        ip_radius = cost_kernel.get_kernel('ip-radius')
+        self.assertEqual(ip_radius(cos_thetas, dists, 1.0, [1.0] * len(dists), 1.1, 42.0), ip)
+        for c, c_ip, r_j in zip(ip_radius(cos_thetas, dists, 1.0, radii_j, 1.1, 42.0), ip, radii_j):
+            self.assertAlmostEqual(c, c_ip * (1.0 + abs(r_j - 1.0) / (1.0 + r_j)))
+
+    def test_baseline_links(self):
+        for seed in xrange(3):
+            tree_root = random_tree(60, seed)
+            self.assertEqual(reconstructor.create('dist').reconstruct(tree_root), baseline_mst(tree_root))
+            for name in ('ip', 'an'):
+                for param in (1.1, 3.0):
+                    self.assertEqual(reconstructor.create(name, param, param).reconstruct(tree_root),
+                                     baseline_sekihara(tree_root, BASELINE[name](param)))
+
+    def test_ip_radius(self):
+        tree_root = random_tree(80, 4)
+        links = reconstructor.create('ip-radius').reconstruct(tree_root)
+        self.assertEqual(len(links), tree_root.node_count() - 1)
+        self.assertNotEqual(links, reconstructor.create('ip').reconstruct(tree_root))
+        # Same as ip with one radius everywhere
+        same = copy.copy(tree_root)
+        same.radii = [1.0] * tree_root.node_count()
+        self.assertEqual(reconstructor.create('ip-radius').reconstruct(same),
+                         reconstructor.create('ip').reconstruct(same))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,274 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# Hand correction of a reconstruction
+#
+# TreeEditor keeps the tree as a parent array with its aggregates, so that
+# moving a node to another parent updates the metrics of export.py and the
+# accuracy of compute_accuracy without a pass over the whole tree:
+#   path length, topological order : O(subtree) (they move with the node)
+#   subtree length, volume, size   : O(depth)   (old and new ancestors)
+#   edge accuracy counts           : O(1)
+
+import heapq
+import math
+from collections import deque
+
+from common import topology
+from treeroot import edge_set
+import reconstructor
+
+
+class TreeEditor(object):
+    """
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    truth : TreeRoot or None
+        Ground truth of the same points, for accuracy()
+    method : string
+        The kernel of the suggested parents (see reconstructor.create)
+    param : float
+
+    Attributes
+    ----------
+    parent : [int]
+        -1 for the stump and the roots of the other components
+    path_length, topological_order : [float], [int]
+        From the root of the component
+    subtree_length, subtree_volume : [float]
+        Sum over the edges below each node
+    subtree_size : [int]
+        The number of nodes in each subtree (including itself)
+    """
+    def __init__(self, tree_root, truth=None, method='ip', param=1.1):
+        self.tree = tree_root
+        n = tree_root.node_count()
+        self.n = n
+        self.method = method
+        self.param = param
+
+        # Orient every component from its first node, the stump first
+        start, neighbors = topology.adjacency(n, tree_root.links)
+        parent = [-1]*n
+        visited = [False]*n
+        order = []
+        for root in [0] + range(1, n):
+            if visited[root]: continue
+            visited[root] = True
+            que = deque([root])
+            order.append(root)
+            while len(que) > 0:
+                v = que.popleft()
+                for k in xrange(start[v], start[v + 1]):
+                    u = neighbors[k]
+                    if visited[u]: continue
+                    visited[u] = True
+                    parent[u] = v
+                    order.append(u)
+                    que.append(u)
+
+        self.parent = parent
+        self.children = [set() for _ in xrange(n)]
+        self.edge_length = [0.0]*n
+        self.edge_volume = [0.0]*n
+        self.path_length = [0.0]*n
+        self.topological_order = [0]*n
+        for v in order:
+            p = parent[v]
+            if p == -1: continue
+            self.children[p].add(v)
+            self._set_edge(v)
+            self.path_length[v] = self.path_length[p] + self.edge_length[v]
+            self.topological_order[v] = self.topological_order[p] + 1
+
+        self.subtree_length = [0.0]*n
+        self.subtree_volume = [0.0]*n
+        self.subtree_size = [1]*n
+        for v in reversed(order):
+            p = parent[v]
+            if p == -1: continue
+            self.subtree_length[p] += self.subtree_length[v] + self.edge_length[v]
+            self.subtree_volume[p] += self.subtree_volume[v] + self.edge_volume[v]
+            self.subtree_size[p] += self.subtree_size[v]
+
+        self.truth = None
+        self.link_count = sum(1 for p in parent if p != -1)
+        if truth is not None:
+            self.truth = edge_set(truth.links)
+            self.truth_volume = truth.edge_volume_sum()
+            self.correct = 0
+            self.correct_volume = 0.0
+            for v in xrange(n):
+                if parent[v] != -1:
+                    self._count(v, 1)
+
+        self._alternatives = None
+
+    def _set_edge(self, v):
+        p = self.parent[v]
+        if p == -1:
+            self.edge_length[v] = 0.0
+            self.edge_volume[v] = 0.0
+            return
+        self.edge_length[v] = self.tree.distance(v, p)
+        # As topology.edge_volumes, the edges of the stump have no volume
+        self.edge_volume[v] = self.tree.edge_volume(v, p) if v != 0 and p != 0 else 0.0
+
+    def _count(self, v, sign):
+        p = self.parent[v]
+        if (min(v, p), max(v, p)) in self.truth:
+            self.correct += sign
+            self.correct_volume += sign * self.edge_volume[v]
+
+    def _add_to_ancestors(self, v, sign):
+        length = sign * (self.subtree_length[v] + self.edge_length[v])
+        volume = sign * (self.subtree_volume[v] + self.edge_volume[v])
+        size = sign * self.subtree_size[v]
+        a = self.parent[v]
+        while a != -1:
+            self.subtree_length[a] += length
+            self.subtree_volume[a] += volume
+            self.subtree_size[a] += size
+            a = self.parent[a]
+
+    def _shift_subtree(self, v):
+        # Path length and order of v are already set
+        stack = [v]
+        while len(stack) > 0:
+            u = stack.pop()
+            for c in self.children[u]:
+                self.path_length[c] = self.path_length[u] + self.edge_length[c]
+                self.topological_order[c] = self.topological_order[u] + 1
+                stack.append(c)
+
+    def root_of(self, v):
+        while self.parent[v] != -1:
+            v = self.parent[v]
+        return v
+
+    def is_ancestor(self, u, v):
+        """
+        True if u is v or above v, in O(depth of v)
+        """
+        while v != -1:
+            if v == u:
+                return True
+            v = self.parent[v]
+        return False
+
+    def detach(self, v):
+        """
+        Remove the link from v to its parent. v becomes the root of its subtree.
+        """
+        p = self.parent[v]
+        if p == -1:
+            return
+        self._add_to_ancestors(v, -1)
+        if self.truth is not None:
+            self._count(v, -1)
+        self.children[p].discard(v)
+        self.parent[v] = -1
+        self.link_count -= 1
+        self._set_edge(v)
+        self.path_length[v] = 0.0
+        self.topological_order[v] = 0
+        self._shift_subtree(v)
+
+    def attach(self, v, p):
+        """
+        Link the root v of a subtree to p
+        """
+        if self.parent[v] != -1 or v == 0:
+            raise ValueError('{} is not the root of a detached subtree'.format(v))
+        if self.is_ancestor(v, p):
+            raise ValueError('{} is in the subtree of {}'.format(p, v))
+        self.parent[v] = p
+        self.children[p].add(v)
+        self.link_count += 1
+        self._set_edge(v)
+        if self.truth is not None:
+            self._count(v, 1)
+        self._add_to_ancestors(v, 1)
+        self.path_length[v] = self.path_length[p] + self.edge_length[v]
+        self.topological_order[v] = self.topological_order[p] + 1
+        self._shift_subtree(v)
+
+    def reparent(self, v, p):
+        """
+        Move v (with its subtree) under p
+
+        Raises
+        ------
+        ValueError
+            If p is in the subtree of v, or v is the stump
+        """
+        if v == 0:
+            raise ValueError('The stump has no parent')
+        if self.is_ancestor(v, p):
+            raise ValueError('{} is in the subtree of {}'.format(p, v))
+        self.detach(v)
+        self.attach(v, p)
+
+    @property
+    def links(self):
+        return [(v, p) for v, p in enumerate(self.parent) if p != -1]
+
+    def accuracy(self):
+        """
+        Same as compute_accuracy(edited tree, truth)
+        """
+        return {
+            "edge_count": self.correct / self.link_count,
+            "edge_volume": self.correct_volume / self.truth_volume,
+        }
+
+    def metrics(self):
+        """
+        Same keys as topology.compute_metrics for the maintained values
+        """
+        return {
+            "path_length": map(float, self.path_length),
+            "topological_order": map(float, self.topological_order),
+            "subtree_length": map(float, self.subtree_length),
+            "subtree_volume": map(float, self.subtree_volume),
+        }
+
+    def precompute_alternatives(self, k=5):
+        """
+        The k cheapest parents of every node by the cost of the Sekihara
+        method, computed once over every pair (as one reconstruction)
+        """
+        tree = self.tree
+        r = reconstructor.create(self.method, self.param, self.param)
+        max_d = reconstructor.kernel_max_distance(r.kernel, tree)
+        radii = tree.radii
+        inf = float('inf')
+        alternatives = [[] for _ in xrange(self.n)]
+        for i in xrange(1, self.n):
+            radius_i = radii[i]
+            candidates = [j for j in xrange(self.n) if j != i and (j == 0 or radius_i <= 1.3 * radii[j])]
+            if len(candidates) == 0: continue
+            costs = reconstructor.row_costs(r.kernel, tree, i, candidates, r.param, max_d)
+            # Twice as many, since some may be in the subtree at the time of the query
+            best = heapq.nsmallest(2 * k, ((c, j) for c, j in zip(costs, candidates) if c < inf))
+            alternatives[i] = [(j, c) for c, j in best]
+        self._alternatives = (k, alternatives)
+
+    def alternatives(self, v, k=5):
+        """
+        The k cheapest parents of v which would keep the tree
+
+        Returns
+        -------
+        parents : [(int, float)]
+            (node, cost), cheapest first
+        """
+        if self._alternatives is None or self._alternatives[0] < k:
+            self.precompute_alternatives(k)
+        ret = []
+        for j, cost in self._alternatives[1][v]:
+            if j == self.parent[v] or self.is_ancestor(v, j): continue
+            ret.append((j, cost))
+            if len(ret) == k: break
+        return ret
@@ -0,0 +1,46 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import copy
+import random
+import unittest
+from common import topology
+from testing import random_tree
+import treeroot
+import reconstructor
+
+class TestTreeEditor(unittest.TestCase):
+    def test_reparent(self):
+        truth = random_tree(60, 0)
+        tree_root = copy.copy(truth)
+        tree_root.links = reconstructor.create('ip').reconstruct(truth)
+        editor = tree_root.editor(truth)
+        rnd = random.Random(1)
+        for _ in xrange(40):
+            v = rnd.randrange(1, 60)
+            choices = editor.alternatives(v, 3)
+            self.assertLessEqual(len(choices), 3)
+            if len(choices) == 0: continue
+            p = rnd.choice(choices)[0]
+            editor.reparent(v, p)
+
+            edited = copy.copy(tree_root)
+            edited.links = editor.links
+            accuracy = treeroot.compute_accuracy(edited, truth)
+            for key, value in editor.accuracy().iteritems():
+                self.assertAlmostEqual(value, accuracy[key])
+            metrics = topology.compute_metrics(topology.TopologyIndex(60, edited.links),
+                                               edited.xs, edited.ys, edited.zs, edited.radii)
+            for key, values in editor.metrics().iteritems():
+                for a, b in zip(values, metrics[key]):
+                    self.assertAlmostEqual(a, b)
+
+    def test_cycle(self):
+        tree_root = random_tree(10, 2)
+        editor = tree_root.editor()
+        child = tree_root.links[-1][0]
+        self.assertRaises(ValueError, editor.reparent, editor.parent[child], child)
+        self.assertRaises(ValueError, editor.reparent, 0, 1)
+
+if __name__ == '__main__':
+    unittest.main()
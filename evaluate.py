@@ -0,0 +1,278 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import codecs
+import copy
+import glob
+import time
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from common import util, dat2vtk
+from treeroot import TreeRoot, edge_set
+import treeroot
+import reconstructor
+import cost_kernel
+from online_accuracy import OnlineAccuracy, ReconstructionAborted
+
+COLUMNS = ['plot', 'method', 'param', 'diameter_class',
+           'correct', 'missing', 'spurious', 'edge_accuracy', 'volume_accuracy', 'seconds']
+
+
+def find_plots(paths):
+    """
+    Expand the directories into their *.dat, *.csv and *.rrb files
+    (and the compressed dat and csv)
+    """
+    plots = []
+    for path in paths:
+        if os.path.isdir(path):
+            for ext in ('dat', 'csv', 'rrb', 'dat.gz', 'csv.gz', 'dat.xz', 'csv.xz'):
+                plots.extend(sorted(glob.glob(os.path.join(path, '*.' + ext))))
+        else:
+            plots.append(path)
+    return plots
+
+
+def configurations(methods, params_w, params_alpha):
+    """
+    Returns
+    -------
+    configs : [(string, float or None)]
+        (method, parameter). 'dist' has no parameter, 'an' uses alpha and
+        the other kernels use w (see reconstructor.create).
+    """
+    configs = []
+    for method in methods:
+        if method == 'dist':
+            configs.append((method, None))
+        elif method == 'an':
+            configs.extend((method, p) for p in params_alpha)
+        else:
+            configs.extend((method, p) for p in params_w)
+    return configs
+
+
+def class_labels(bounds):
+    """
+    [2, 5] -> ['<2', '2-5', '>=5']
+    """
+    if len(bounds) == 0:
+        return ['all']
+    labels = ['<{}'.format(bounds[0])]
+    labels.extend('{}-{}'.format(lo, hi) for lo, hi in zip(bounds, bounds[1:]))
+    labels.append('>={}'.format(bounds[-1]))
+    return labels
+
+
+def diameter_class(d, bounds):
+    for k, b in enumerate(bounds):
+        if d < b:
+            return k
+    return len(bounds)
+
+
+def breakdown(reconstructed_tree_root, tree_root, bounds, coef_radius):
+    """
+    Correct, missing and spurious links by the class of their diameter
+
+    The diameter of a link is the mean diameter of its ends (the values of
+    the input file, before coef_radius).
+
+    Returns
+    -------
+    counts : [[int, int, int]]
+        counts[k] is (correct, missing, spurious) of the class k
+    volumes : [[float, float]]
+        volumes[k] is (volume of the correct links, volume of the true links)
+        without the links of the stump
+    """
+    radii = tree_root.radii
+    truth = edge_set(tree_root.links)
+    found = edge_set(reconstructed_tree_root.links)
+    counts = [[0, 0, 0] for _ in xrange(len(bounds) + 1)]
+    volumes = [[0.0, 0.0] for _ in xrange(len(bounds) + 1)]
+    for edges, column in [(found & truth, 0), (truth - found, 1), (found - truth, 2)]:
+        for a, b in edges:
+            k = diameter_class((radii[a] + radii[b]) / (2.0 * coef_radius), bounds)
+            counts[k][column] += 1
+            if column == 2 or a == 0:
+                continue
+            v = tree_root.edge_volume(a, b)
+            volumes[k][1] += v
+            if column == 0:
+                volumes[k][0] += v
+    return counts, volumes
+
+
+# The last plot loaded by this worker. The tasks of a plot are sent together,
+# so it is loaded once per worker.
+_cache = {}
+
+
+def _load(fname, coef_radius):
+    key = (fname, coef_radius)
+    if key not in _cache:
+        _cache.clear()
+        _cache[key] = TreeRoot.load_dat(fname, coef_radius)
+    return _cache[key]
+
+
+def evaluate_one(task):
+    """
+    Parameters
+    ----------
+    task : (string, string, float or None, float, [float], (string, float) or None)
+        (plot, method, param, coef_radius, diameter class bounds, target).
+        The reconstruction is aborted when the accuracy (target[0]) cannot
+        be above target[1] any more.
+
+    Returns
+    -------
+    rows : [[object]]
+        Rows of COLUMNS. The first is the class 'all'. Empty when aborted.
+    error : string or None
+    """
+    fname, method, param, coef_radius, bounds, target = task
+    try:
+        tree_root = _load(fname, coef_radius)
+    except IOError:
+        return [], "No such file : {}".format(fname)
+    except dat2vtk.MissingStumpError as e:
+        return [], "{} : {}".format(e, fname)
+    except dat2vtk.FileFormatError:
+        return [], "Unexpected file format : {}".format(fname)
+    except dat2vtk.FileSyntaxError:
+        return [], "Syntax error : {}".format(fname)
+    if len(tree_root.links) == 0:
+        return [], "No ground truth : {}".format(fname)
+
+    p = 1.1 if param is None else param
+    on_link = None
+    if target is not None:
+        on_link = OnlineAccuracy(tree_root, sources=method != 'dist', target=target[1], metric=target[0])
+    start = time.time()
+    try:
+        links = reconstructor.create(method, p, p).reconstruct(tree_root, on_link)
+    except ReconstructionAborted:
+        return [], None
+    seconds = time.time() - start
+
+    # Shallow copy shares the coordinates and their cached geometry
+    reconstructed_tree_root = copy.copy(tree_root)
+    reconstructed_tree_root.links = links
+    accuracy = treeroot.compute_accuracy(reconstructed_tree_root, tree_root)
+    counts, volumes = breakdown(reconstructed_tree_root, tree_root, bounds, coef_radius)
+
+    param_str = '' if param is None else param
+    total = [sum(c[j] for c in counts) for j in xrange(3)]
+    rows = [[fname, method, param_str, 'all'] + total +
+            [accuracy["edge_count"], accuracy["edge_volume"], seconds]]
+    for label, (correct, missing, spurious), (v_correct, v_all) in zip(class_labels(bounds), counts, volumes):
+        edge_accuracy = correct / (correct + spurious) if correct + spurious > 0 else ''
+        volume_accuracy = v_correct / v_all if v_all > 0 else ''
+        rows.append([fname, method, param_str, label, correct, missing, spurious,
+                     edge_accuracy, volume_accuracy, ''])
+    return rows, None
+
+
+def evaluate(plots, configs, coef_radius=0.5, bounds=(), jobs=1, target=None):
+    """
+    Reconstruct every plot with every configuration
+
+    Parameters
+    ----------
+    plots : [string]
+    configs : [(string, float or None)]
+        See configurations
+    coef_radius : float
+    bounds : [float]
+        Bounds of the diameter classes
+    jobs : int
+        The number of processes
+    target : (string, float) or None
+        ('edge_count' or 'edge_volume', accuracy). Skip the rest of a
+        reconstruction as soon as it cannot beat this accuracy.
+
+    Yields
+    ------
+    rows, error :
+        See evaluate_one, in the order of completion
+    """
+    tasks = [(fname, method, param, coef_radius, list(bounds), target)
+             for fname in plots for method, param in configs]
+    if jobs <= 1:
+        for task in tasks:
+            yield evaluate_one(task)
+        return
+
+    from multiprocessing import Pool
+    pool = Pool(jobs)
+    try:
+        # The tasks of a plot go to the same worker
+        for result in pool.imap_unordered(evaluate_one, tasks, chunksize=max(1, len(configs))):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('inputs', type=str, nargs='+',
+            help='ground-truthed plots, or directories of them')
+    parser.add_argument('--output', type=str, default='evaluation.tsv')
+    parser.add_argument('--methods', type=str, nargs='+', choices=cost_kernel.kernel_names(),
+            default=['dist', 'an', 'ip'])
+    parser.add_argument('--param-w', dest='params_w', type=float, nargs='+', default=[1.1])
+    parser.add_argument('--param-alpha', dest='params_alpha', type=float, nargs='+', default=[1.1])
+    parser.add_argument('--coef-radius', dest='coef_radius', type=float, default=0.5)
+    parser.add_argument('--diameter-classes', dest='bounds', type=float, nargs='*', default=[2.0, 5.0, 10.0],
+            help='bounds of the diameter classes (same unit as the input)')
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--target', type=float, default=None,
+            help='abort the reconstructions which cannot beat this accuracy (0-1)')
+    parser.add_argument('--target-metric', dest='target_metric', choices=['edge_count', 'edge_volume'],
+            default='edge_count')
+    args = parser.parse_args(argv)
+
+    plots = find_plots(args.inputs)
+    configs = configurations(args.methods, args.params_w, args.params_alpha)
+    bounds = sorted(args.bounds)
+    target = (args.target_metric, args.target) if args.target is not None else None
+
+    summary = {}
+    errors = set()
+    aborted = 0
+    with codecs.open(args.output, 'w', 'utf_8') as f:
+        print('\t'.join(COLUMNS), file=f)
+        for rows, error in evaluate(plots, configs, args.coef_radius, bounds, args.jobs, target):
+            if error is not None:
+                # Once per plot, not per configuration
+                if error not in errors:
+                    print("[Error] {}".format(error))
+                    errors.add(error)
+                continue
+            if len(rows) == 0:
+                aborted += 1
+                continue
+            for row in rows:
+                print('\t'.join(map(unicode, row)), file=f)
+            key = (rows[0][1], rows[0][2])
+            summary.setdefault(key, []).append((rows[0][7], rows[0][8]))
+
+    for method, param in configs:
+        values = summary.get((method, '' if param is None else param), [])
+        if len(values) == 0: continue
+        print("{:<4} {:<6} Edge {:.3%} Volume {:.3%} ({} plots)".format(
+            method, '' if param is None else param,
+            sum(v[0] for v in values) / len(values), sum(v[1] for v in values) / len(values), len(values)))
+    if target is not None:
+        print("Aborted below the target : {}".format(aborted))
+    print("Output file is created : {}".format(args.output))
+
+
+if __name__ == "__main__":
+    util.set_terminal_encoding()
+    main()
@@ -0,0 +1,52 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import copy
+import unittest
+from testing import random_tree
+import evaluate
+import reconstructor
+import treeroot
+
+class TestEvaluate(unittest.TestCase):
+    def test_diameter_class(self):
+        bounds = [2, 5]
+        self.assertEqual([evaluate.diameter_class(d, bounds) for d in (0.0, 1.99, 2, 4.9, 5, 100.0)],
+                         [0, 0, 1, 1, 2, 2])
+        self.assertEqual(evaluate.class_labels(bounds), ['<2', '2-5', '>=5'])
+        self.assertEqual(evaluate.diameter_class(100.0, []), 0)
+        self.assertEqual(evaluate.class_labels([]), ['all'])
+
+    def test_breakdown(self):
+        coef_radius = 0.5
+        for seed, method in [(0, 'ip'), (1, 'dist'), (2, 'ip')]:
+            tree_root = random_tree(80, seed)
+            reconstructed = copy.copy(tree_root)
+            reconstructed.links = reconstructor.create(method).reconstruct(tree_root)
+            accuracy = treeroot.compute_accuracy(reconstructed, tree_root)
+            for bounds in ([], [2.0], [1.5, 3.0]):
+                counts, volumes = evaluate.breakdown(reconstructed, tree_root, bounds, coef_radius)
+                self.assertEqual(len(counts), len(bounds) + 1)
+                correct, missing, spurious = [sum(c[j] for c in counts) for j in xrange(3)]
+                # The classes add up to the accuracy of the whole tree
+                self.assertEqual(correct + spurious, len(reconstructed.links))
+                self.assertEqual(correct + missing, len(tree_root.links))
+                self.assertAlmostEqual(correct / len(reconstructed.links), accuracy["edge_count"])
+                self.assertAlmostEqual(sum(v[0] for v in volumes) / sum(v[1] for v in volumes),
+                                       accuracy["edge_volume"])
+                self.assertAlmostEqual(sum(v[1] for v in volumes), tree_root.edge_volume_sum())
+
+                # Every true link is counted in the class of its diameter
+                expected = [0] * (len(bounds) + 1)
+                for a, b in tree_root.links:
+                    d = (tree_root.radii[a] + tree_root.radii[b]) / (2.0 * coef_radius)
+                    expected[evaluate.diameter_class(d, bounds)] += 1
+                self.assertEqual([c[0] + c[1] for c in counts], expected)
+
+        # A perfect reconstruction
+        counts, volumes = evaluate.breakdown(tree_root, tree_root, [2.0], coef_radius)
+        self.assertEqual(sum(c[0] for c in counts), len(tree_root.links))
+        self.assertEqual([v[0] for v in volumes], [v[1] for v in volumes])
+
+if __name__ == '__main__':
+    unittest.main()
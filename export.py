@@ -0,0 +1,168 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from common import util, dat2vtk, topology, compressed
+from treeroot import TreeRoot
+
+FORMATS = ['dat', 'rrb', 'vtk', 'sphere', 'swc']
+
+
+class SharedData(object):
+    """
+    Derived data which is computed once and shared by every writer
+    """
+    def __init__(self, tree_root, metrics=False):
+        self.parent = tree_root.parent_indices()
+
+        # Same as dat2vtk: the distance along the links from the children of the stump
+        root_nodes = [i for i in xrange(1, tree_root.node_count()) if self.parent[i] == 0]
+        self.distance = dat2vtk.compute_distance(
+            root_nodes, tree_root.links, tree_root.xs, tree_root.ys, tree_root.zs, tree_root.radii)
+
+        self.data = {'distance': self.distance}
+        if metrics:
+            self.data.update(tree_root.metrics())
+
+
+def generate_swc(tree_root, parent):
+    """
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    parent : [int]
+        See TreeRoot.parent_indices
+
+    Returns
+    -------
+    iter : iterator of string
+        The radius column is half the diameter of the input file, as in
+        dat2swc (see TreeRoot.input_diameters)
+    """
+    labels = tree_root.labels
+    diameters = tree_root.input_diameters()
+    for i in xrange(tree_root.node_count()):
+        if i == 0 or parent[i] == -1:
+            parent_id = -1
+        else:
+            parent_id = labels[parent[i]] + 1
+        yield '{} 0 {} {} {} {} {}'.format(
+            labels[i] + 1, tree_root.xs[i], tree_root.ys[i], tree_root.zs[i], diameters[i] * 0.5, parent_id)
+
+
+def write_lines(fname, iterator):
+    with compressed.open_text(fname, 'w') as f:
+        for line in iterator:
+            print(line, file=f)
+
+
+def write(tree_root, fmt, fname, shared):
+    if fmt == 'dat':
+        tree_root.export_dat(fname, shared.parent)
+    elif fmt == 'rrb':
+        tree_root.export_rrb(fname, shared.parent)
+    elif fmt == 'vtk':
+        from common import swc2vtk
+        # One polyline cell per chain of links instead of one cell per link
+        polylines = topology.chains(tree_root.node_count(), tree_root.links, stops=[0])
+        write_lines(fname, swc2vtk.generate_vtk(
+            0, tree_root.links, tree_root.xs, tree_root.ys, tree_root.zs, tree_root.radii, shared.data, polylines))
+    elif fmt == 'sphere':
+        write_lines(fname, dat2vtk.generate_sphere(
+            tree_root.xs, tree_root.ys, tree_root.zs, tree_root.radii, shared.data))
+    elif fmt == 'swc':
+        write_lines(fname, generate_swc(tree_root, shared.parent))
+    else:
+        raise ValueError('Unknown output format : {}'.format(fmt))
+    return fname
+
+
+def export(tree_root, targets, jobs=1, metrics=False):
+    """
+    Write one tree into several files
+
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    targets : [(string, string)]
+        (format, file name). format is one of FORMATS.
+    jobs : int
+        The number of the writer threads
+    metrics : bool
+        Add topology metrics to the vtk outputs
+
+    Returns
+    -------
+    fnames : [string]
+    """
+    for fmt, _ in targets:
+        if fmt not in FORMATS:
+            raise ValueError('Unknown output format : {}'.format(fmt))
+
+    shared = SharedData(tree_root, metrics)
+    if jobs <= 1 or len(targets) <= 1:
+        return [write(tree_root, fmt, fname, shared) for fmt, fname in targets]
+
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(min(jobs, len(targets)))
+    try:
+        results = [pool.apply_async(write, (tree_root, fmt, fname, shared)) for fmt, fname in targets]
+        return [r.get() for r in results]
+    finally:
+        pool.close()
+        pool.join()
+
+
+def parse_target(s):
+    """
+    'vtk:out.vtk' -> ('vtk', 'out.vtk')
+    """
+    fmt, sep, fname = s.partition(':')
+    if sep == '' or fmt not in FORMATS or fname == '':
+        raise argparse.ArgumentTypeError(
+            "expected FORMAT:FILE with FORMAT in {} : {}".format(', '.join(FORMATS), s))
+    return fmt, fname
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_dat', type=str)
+    parser.add_argument('--to', dest='targets', type=parse_target, action='append', required=True,
+            help='FORMAT:FILE (FORMAT is one of {}). Can be repeated.'.format(', '.join(FORMATS)))
+    parser.add_argument('--coef-radius', dest='coef_radius', type=float, default=0.5)
+    parser.add_argument('--metrics', action='store_true',
+            help='add topology metrics to the vtk outputs')
+    parser.add_argument('--jobs', type=int, default=1,
+            help='the number of the parser processes and the writer threads')
+    parser.add_argument('--bbox', type=float, nargs=6, metavar=('XMIN', 'YMIN', 'ZMIN', 'XMAX', 'YMAX', 'ZMAX'),
+            help='load only the points inside this box (and the stump)')
+    parser.add_argument('--z-range', dest='z_range', type=float, nargs=2, metavar=('ZMIN', 'ZMAX'),
+            help='load only the points in this band of z (and the stump)')
+    args = parser.parse_args(argv)
+
+    try:
+        region = dat2vtk.Region.from_args(args.bbox, args.z_range)
+        tree_root = TreeRoot.load_dat(args.input_dat, args.coef_radius, region=region, jobs=args.jobs)
+    except IOError as e:
+        print("[Error] No such file : {}".format(args.input_dat))
+        sys.exit(1)
+    except dat2vtk.MissingStumpError as e:
+        print("[Error] {}".format(e))
+        sys.exit(1)
+    except dat2vtk.FileFormatError as e:
+        print("[Error] Unexpected file format.")
+        sys.exit(1)
+    except dat2vtk.FileSyntaxError as e:
+        print("[Error] Syntax error.")
+        sys.exit(1)
+
+    for fname in export(tree_root, args.targets, args.jobs, args.metrics):
+        print("Output file is created : {}".format(fname))
+
+
+if __name__ == "__main__":
+    util.set_terminal_encoding()
+    main()
@@ -0,0 +1,91 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from common import swc2vtk
+from treeroot import TreeRoot
+import export
+
+# The stump is not the first row, and point 5 is a second child of 2
+LINES = ['5.0 5.0 -1.0 12.3 4 2',
+         '0.0 0.0 0.0 40.0 0 0',
+         '6.8 -14.0 -3.7 34.8 2 0',
+         '30.7 -39.2 -14.8 29.5 3 2',
+         '31.0 -40.0 -1.0 20.1 5 2']
+DIAMETERS = {4: 12.3, 0: 40.0, 2: 34.8, 3: 29.5, 5: 20.1}
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = self.output('in.dat')
+        with io.open(self.input, 'w') as f:
+            f.write('\n'.join(LINES) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def output(self, name):
+        return os.path.join(self.directory, name)
+
+    def read(self, fname):
+        with io.open(fname, 'rb') as f:
+            return f.read()
+
+    def assertSameTree(self, tree1, tree2):
+        self.assertEqual(list(tree1.labels), list(tree2.labels))
+        for name in ('xs', 'ys', 'zs', 'radii'):
+            for a, b in zip(getattr(tree1, name), getattr(tree2, name)):
+                self.assertAlmostEqual(a, b)
+        self.assertEqual(tree1.parent_indices(), tree2.parent_indices())
+
+    def test_all_formats(self):
+        for coef_radius in (0.05, 0.5):
+            tree_root = TreeRoot.load_dat(self.input, coef_radius)
+            for diameter, label in zip(tree_root.input_diameters(), tree_root.labels):
+                self.assertAlmostEqual(diameter, DIAMETERS[label])
+
+            targets = [(fmt, self.output('out.' + fmt)) for fmt in export.FORMATS]
+            self.assertEqual(export.export(tree_root, targets), [fname for _, fname in targets])
+            # Every format keeps the diameters of the input file
+            for fmt in ('dat', 'rrb'):
+                self.assertSameTree(TreeRoot.load_dat(self.output('out.' + fmt), coef_radius), tree_root)
+            root, links, xs, ys, zs, radii = swc2vtk.parse_swc(self.output('out.swc'))
+            self.assertEqual(list(xs), list(tree_root.xs))
+            for r, d in zip(radii, tree_root.input_diameters()):
+                self.assertAlmostEqual(r, d * 0.5)
+            self.assertEqual(sorted(links), sorted((i, p) for i, p in enumerate(tree_root.parent_indices()) if i != 0))
+
+            # The writer threads give the same files
+            parallel = [(fmt, self.output('parallel.' + fmt)) for fmt in export.FORMATS]
+            export.export(tree_root, parallel, jobs=3)
+            for (_, fname1), (_, fname2) in zip(targets, parallel):
+                self.assertEqual(self.read(fname1), self.read(fname2))
+
+        self.assertRaises(ValueError, export.export, tree_root, [('obj', self.output('out.obj'))])
+
+    def test_shared_data(self):
+        tree_root = TreeRoot.load_dat(self.input, 0.5)
+        shared = export.SharedData(tree_root)
+        self.assertEqual(shared.parent, tree_root.parent_indices())
+        self.assertEqual(sorted(shared.data), ['distance'])
+        self.assertEqual(len(shared.distance), tree_root.node_count())
+        # The distance grows along the links from the children of the stump
+        for i, p in enumerate(shared.parent):
+            if p > 0:
+                self.assertTrue(shared.distance[i] > shared.distance[p])
+        metrics = export.SharedData(tree_root, metrics=True).data
+        self.assertEqual(set(metrics), set(['distance']) | set(tree_root.metrics()))
+
+    def test_parse_target(self):
+        self.assertEqual(export.parse_target('vtk:out.vtk'), ('vtk', 'out.vtk'))
+        self.assertEqual(export.parse_target('dat:C:/out.dat'), ('dat', 'C:/out.dat'))
+        for s in ('out.vtk', 'obj:out.obj', 'vtk:'):
+            self.assertRaises(argparse.ArgumentTypeError, export.parse_target, s)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# Per-link geometry of a tree in one pass
+#
+# The values are computed with the same arithmetic as TreeRoot.distance and
+# TreeRoot.edge_volume, so the sums are the same to the last bit. Use
+# TreeRoot.geometry_summary(), which keeps the summary until the
+# coordinates, the radii or the links are replaced.
+
+import math
+
+
+class GeometrySummary(object):
+    """
+    Parameters
+    ----------
+    xs, ys, zs, radii : [float]
+    links : [(int, int)]
+
+    Attributes
+    ----------
+    lengths, volumes, areas : [float]
+        Length, frustum volume and lateral surface area of every link,
+        in the order of links
+    diameters : [float]
+        Mean of the diameters (2 * radius) of the ends of every link
+    total_length, total_area : float
+    volume_sum : float
+        Sum of the volumes without the links of the stump (node 0),
+        same as TreeRoot.edge_volume_sum
+    """
+    def __init__(self, xs, ys, zs, radii, links):
+        pi = math.pi
+        sqrt = math.sqrt
+        lengths, volumes, areas, diameters = [], [], [], []
+        volume_sum = 0.0
+        for a, b in links:
+            r1, r2 = radii[a], radii[b]
+            h = sqrt((xs[a] - xs[b])**2 + (ys[a] - ys[b])**2 + (zs[a] - zs[b])**2)
+            v = pi * (r1*r1 + r1*r2 + r2*r2) * h / 3.0
+            lengths.append(h)
+            volumes.append(v)
+            areas.append(pi * (r1 + r2) * sqrt((r1 - r2)**2 + h*h))
+            diameters.append(r1 + r2)
+            if a != 0 and b != 0:
+                volume_sum += v
+        self.links = links
+        self.lengths = lengths
+        self.volumes = volumes
+        self.areas = areas
+        self.diameters = diameters
+        self.volume_sum = volume_sum
+        self.total_length = sum(lengths)
+        self.total_area = sum(areas)
+        self._histograms = {}
+
+    def histogram(self, bounds, coef_radius=1.0):
+        """
+        The links by the class of their diameter (see evaluate.diameter_class)
+
+        Parameters
+        ----------
+        bounds : [float]
+            Bounds of the classes, in the unit of the input diameters
+        coef_radius : float
+            The radii are the input diameters times coef_radius
+
+        Returns
+        -------
+        classes : [(int, float, float, float)]
+            (links, length, volume, surface area) of every class. The links
+            of the stump are counted, but not their volume.
+        """
+        key = (tuple(bounds), coef_radius)
+        if key not in self._histograms:
+            bounds = sorted(bounds)
+            classes = [[0, 0.0, 0.0, 0.0] for _ in xrange(len(bounds) + 1)]
+            for (a, b), d, h, v, s in zip(self.links, self.diameters, self.lengths, self.volumes, self.areas):
+                d = d / (2.0 * coef_radius)
+                k = len(bounds)
+                for m, bound in enumerate(bounds):
+                    if d < bound:
+                        k = m
+                        break
+                c = classes[k]
+                c[0] += 1
+                c[1] += h
+                if a != 0 and b != 0:
+                    c[2] += v
+                c[3] += s
+            self._histograms[key] = [tuple(c) for c in classes]
+        return self._histograms[key]
@@ -0,0 +1,63 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import copy
+import math
+import unittest
+from testing import random_tree
+import treeroot
+import reconstructor
+
+def volume_sum(tree_root):
+    total = 0.0
+    for a, b in tree_root.links:
+        if a != 0 and b != 0:
+            total += tree_root.edge_volume(a, b)
+    return total
+
+class TestGeometrySummary(unittest.TestCase):
+    def test_summary(self):
+        tree_root = random_tree(80, 0)
+        summary = tree_root.geometry_summary()
+        self.assertIs(tree_root.geometry_summary(), summary)
+        self.assertEqual(summary.volume_sum, volume_sum(tree_root))
+        for k, (a, b) in enumerate(tree_root.links):
+            r1, r2 = tree_root.radii[a], tree_root.radii[b]
+            h = tree_root.distance(a, b)
+            self.assertEqual(summary.lengths[k], h)
+            self.assertEqual(summary.volumes[k], tree_root.edge_volume(a, b))
+            self.assertAlmostEqual(summary.areas[k], math.pi * (r1 + r2) * math.hypot(r1 - r2, h))
+        self.assertAlmostEqual(summary.total_length, sum(summary.lengths))
+
+        classes = summary.histogram([1.5, 3.0])
+        self.assertEqual(sum(c[0] for c in classes), len(tree_root.links))
+        self.assertAlmostEqual(sum(c[1] for c in classes), summary.total_length)
+        self.assertAlmostEqual(sum(c[2] for c in classes), summary.volume_sum)
+        self.assertAlmostEqual(sum(c[3] for c in classes), summary.total_area)
+        self.assertEqual(classes[0][0], sum(1 for a, b in tree_root.links
+                                            if (tree_root.radii[a] + tree_root.radii[b]) / 2.0 < 1.5))
+
+    def test_invalidate(self):
+        truth = random_tree(60, 1)
+        tree_root = copy.copy(truth)
+        tree_root.links = reconstructor.create('ip').reconstruct(truth)
+        self.assertIsNot(tree_root.geometry_summary(), truth.geometry_summary())
+        self.assertEqual(tree_root.edge_volume_sum(), volume_sum(tree_root))
+
+        truth.radii = [r * 2.0 for r in truth.radii]
+        self.assertEqual(truth.edge_volume_sum(), volume_sum(truth))
+        # Modified in place: the summary is kept until invalidate_geometry
+        truth.zs[5] -= 1.0
+        self.assertNotEqual(truth.edge_volume_sum(), volume_sum(truth))
+        truth.invalidate_geometry()
+        tree_root.invalidate_geometry()
+        self.assertEqual(truth.edge_volume_sum(), volume_sum(truth))
+
+        accuracy = treeroot.compute_accuracy(tree_root, truth)
+        truth_links = treeroot.edge_set(truth.links)
+        correct = sum(tree_root.edge_volume(a, b) for a, b in tree_root.links
+                      if a != 0 and b != 0 and (min(a, b), max(a, b)) in truth_links)
+        self.assertAlmostEqual(accuracy["edge_volume"], correct / volume_sum(truth))
+
+if __name__ == '__main__':
+    unittest.main()
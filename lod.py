@@ -0,0 +1,166 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from common import util, dat2vtk, swc2vtk, topology
+from treeroot import TreeRoot
+from spatial_hash import segment_distance
+import export
+
+
+def importance(n, chain_list, xs, ys, zs, radii):
+    """
+    Douglas-Peucker error of every point
+
+    A chain is split at its point farthest from the segment between its
+    ends, recursively. The error of a point is its distance to that segment
+    or the difference of its radius from the interpolated one, whichever is
+    larger, but not more than the error of the split above it. So the points
+    kept with a tolerance tol are exactly those whose error is above tol, and
+    all the levels come from one pass.
+
+    Parameters
+    ----------
+    n : int
+    chain_list : [[int]]
+        See topology.chains
+
+    Returns
+    -------
+    errors : [float]
+        inf for the ends of the chains and the points in no chain
+    """
+    inf = float('inf')
+    errors = [inf]*n
+    for chain in chain_list:
+        stack = [(0, len(chain) - 1, inf)]
+        while len(stack) > 0:
+            lo, hi, bound = stack.pop()
+            if hi - lo < 2: continue
+            a, b = chain[lo], chain[hi]
+            ra, rb = radii[a], radii[b]
+            split, split_error = -1, -1.0
+            for k in xrange(lo + 1, hi):
+                v = chain[k]
+                d, t = segment_distance(xs[v], ys[v], zs[v], xs[a], ys[a], zs[a], xs[b], ys[b], zs[b])
+                e = max(d, abs(radii[v] - (ra + t * (rb - ra))))
+                if e > split_error:
+                    split, split_error = k, e
+            e = min(split_error, bound)
+            errors[chain[split]] = e
+            stack.append((lo, split, e))
+            stack.append((split, hi, e))
+    return errors
+
+
+def level(chain_list, errors, tol):
+    """
+    Parameters
+    ----------
+    chain_list : [[int]]
+    errors : [float]
+        See importance
+    tol : float
+
+    Returns
+    -------
+    kept : [int]
+        The points of the level, in their original order
+    polylines : [[int]]
+        The chains through the kept points, as indices of kept
+    """
+    kept = [v for v, e in enumerate(errors) if e > tol]
+    new_index = dict(zip(kept, xrange(len(kept))))
+    polylines = [[new_index[v] for v in chain if errors[v] > tol] for chain in chain_list]
+    return kept, polylines
+
+
+class LevelOfDetail(object):
+    """
+    Decimated polylines of a tree at any tolerance
+
+    The stump, the branch points and the leaves are always kept.
+    """
+    def __init__(self, tree_root):
+        self.tree_root = tree_root
+        n = tree_root.node_count()
+        self.chains = topology.chains(n, tree_root.links, stops=[0])
+        self.errors = importance(n, self.chains, tree_root.xs, tree_root.ys, tree_root.zs, tree_root.radii)
+
+    def generate_vtk(self, tol, data={}):
+        """
+        Returns
+        -------
+        iter : iterator of string
+        """
+        t = self.tree_root
+        kept, polylines = level(self.chains, self.errors, tol)
+        pick = lambda values: [values[v] for v in kept]
+        return swc2vtk.generate_vtk(
+            0, [], pick(t.xs), pick(t.ys), pick(t.zs), pick(t.radii),
+            dict((key, pick(values)) for key, values in data.iteritems()),
+            polylines)
+
+    def count(self, tol):
+        """
+        Returns
+        -------
+        points, cells : int
+        """
+        return sum(1 for e in self.errors if e > tol), len(self.chains)
+
+
+def parse_level(s):
+    """
+    '0.5:out.vtk' -> (0.5, 'out.vtk')
+    """
+    tol, sep, fname = s.partition(':')
+    try:
+        tol = float(tol)
+    except ValueError:
+        sep = ''
+    if sep == '' or fname == '' or tol < 0.0:
+        raise argparse.ArgumentTypeError("expected TOLERANCE:FILE : {}".format(s))
+    return tol, fname
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_dat', type=str)
+    parser.add_argument('--level', dest='levels', type=parse_level, action='append', required=True,
+            help='TOLERANCE:FILE (same unit as the coordinates). Can be repeated.')
+    parser.add_argument('--coef-radius', dest='coef_radius', type=float, default=0.5)
+    parser.add_argument('--metrics', action='store_true',
+            help='add topology metrics to the outputs')
+    args = parser.parse_args(argv)
+
+    try:
+        tree_root = TreeRoot.load_dat(args.input_dat, args.coef_radius)
+    except IOError as e:
+        print("[Error] No such file : {}".format(args.input_dat))
+        sys.exit(1)
+    except dat2vtk.MissingStumpError as e:
+        print("[Error] {}".format(e))
+        sys.exit(1)
+    except dat2vtk.FileFormatError as e:
+        print("[Error] Unexpected file format.")
+        sys.exit(1)
+    except dat2vtk.FileSyntaxError as e:
+        print("[Error] Syntax error.")
+        sys.exit(1)
+
+    lod = LevelOfDetail(tree_root)
+    data = export.SharedData(tree_root, args.metrics).data
+    print("Full                      : {} points, {} cells".format(tree_root.node_count(), len(tree_root.links)))
+    for tol, fname in args.levels:
+        export.write_lines(fname, lod.generate_vtk(tol, data))
+        points, cells = lod.count(tol)
+        print("Tolerance {:<16}: {} points, {} cells -> {}".format(tol, points, cells, fname))
+
+
+if __name__ == "__main__":
+    util.set_terminal_encoding()
+    main()
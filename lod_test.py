@@ -0,0 +1,66 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+from testing import grown_tree
+from common import topology
+from spatial_hash import segment_distance
+import lod
+
+class TestLevelOfDetail(unittest.TestCase):
+    def test_importance(self):
+        # A straight chain with a bump at 2: only the bump survives tol 0.5
+        xs = [0.0, 1.0, 2.0, 3.0, 4.0]
+        ys = [0.0, 0.0, 1.0, 0.0, 0.0]
+        zs = [0.0] * 5
+        radii = [1.0] * 5
+        chain_list = [[0, 1, 2, 3, 4]]
+        errors = lod.importance(5, chain_list, xs, ys, zs, radii)
+        inf = float('inf')
+        self.assertEqual(errors[0], inf)
+        self.assertEqual(errors[4], inf)
+        self.assertAlmostEqual(errors[2], 1.0)
+        self.assertTrue(errors[1] < 1.0 and errors[3] < 1.0)
+        kept, polylines = lod.level(chain_list, errors, 0.9)
+        self.assertEqual(kept, [0, 2, 4])
+        self.assertEqual(polylines, [[0, 1, 2]])
+
+        # The radius counts as much as the position
+        errors = lod.importance(5, chain_list, xs, [0.0] * 5, zs, [1.0, 1.0, 3.0, 1.0, 1.0])
+        self.assertAlmostEqual(errors[2], 2.0)
+
+    def test_tolerance(self):
+        tree_root = grown_tree(300, 4)
+        t = tree_root
+        levels = lod.LevelOfDetail(tree_root)
+        self.assertEqual(len(levels.chains), len(topology.chains(t.node_count(), t.links, stops=[0])))
+        previous = t.node_count() + 1
+        for tol in (0.0, 0.5, 2.0, 8.0, 1e9):
+            kept, polylines = lod.level(levels.chains, levels.errors, tol)
+            self.assertEqual(levels.count(tol), (len(kept), len(levels.chains)))
+            self.assertTrue(len(kept) <= previous)
+            previous = len(kept)
+            kept_set = set(kept)
+            for chain, polyline in zip(levels.chains, polylines):
+                self.assertIn(chain[0], kept_set)
+                self.assertIn(chain[-1], kept_set)
+                self.assertEqual([kept[i] for i in polyline], [v for v in chain if v in kept_set])
+                # Every dropped point is within tol of the segment between
+                # the kept points around it
+                lo = 0
+                for k in xrange(1, len(chain)):
+                    if chain[k] not in kept_set:
+                        continue
+                    a, b = chain[lo], chain[k]
+                    for v in chain[lo + 1:k]:
+                        d, s = segment_distance(t.xs[v], t.ys[v], t.zs[v],
+                                                t.xs[a], t.ys[a], t.zs[a], t.xs[b], t.ys[b], t.zs[b])
+                        self.assertTrue(d <= tol + 1e-9)
+                        r = t.radii[a] + s * (t.radii[b] - t.radii[a])
+                        self.assertTrue(abs(t.radii[v] - r) <= tol + 1e-9)
+                    lo = k
+        # Only the ends of the chains are left
+        self.assertEqual(previous, len(set(v for chain in levels.chains for v in (chain[0], chain[-1]))))
+
+if __name__ == '__main__':
+    unittest.main()
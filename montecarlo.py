@@ -0,0 +1,269 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import codecs
+import copy
+import heapq
+import math
+import random
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from common import util, dat2vtk
+from treeroot import TreeRoot
+import treeroot
+import reconstructor
+import cost_kernel
+
+
+def perturb(tree_root, rnd, sigma_xyz, sigma_diameter, far_pairs=None):
+    """
+    Jitter the coordinates and the diameters of all the points but the stump
+
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    rnd : random.Random
+    sigma_xyz : float
+        Standard deviation of the coordinates (same unit as the data)
+    sigma_diameter : float
+        Relative standard deviation of the diameters
+    far_pairs : FarPairs or None
+        The farthest pairs of tree_root, to get max_distance of the copy
+        without measuring all the pairs
+
+    Returns
+    -------
+    perturbed : TreeRoot
+        Shares links, labels and label_to_index with tree_root
+    """
+    gauss = rnd.gauss
+    n = tree_root.node_count()
+    xs = [tree_root.xs[0]] + [x + gauss(0.0, sigma_xyz) for x in tree_root.xs[1:n]]
+    ys = [tree_root.ys[0]] + [y + gauss(0.0, sigma_xyz) for y in tree_root.ys[1:n]]
+    zs = [tree_root.zs[0]] + [z + gauss(0.0, sigma_xyz) for z in tree_root.zs[1:n]]
+    radii = [tree_root.radii[0]] + [max(0.0, r * (1.0 + gauss(0.0, sigma_diameter))) for r in tree_root.radii[1:n]]
+    max_distance = None
+    if far_pairs is not None:
+        max_distance = far_pairs.max_distance(tree_root, xs, ys, zs)
+    return TreeRoot(
+        links=tree_root.links,
+        xs=xs,
+        ys=ys,
+        zs=zs,
+        radii=radii,
+        labels=tree_root.labels,
+        label_to_index=tree_root.label_to_index,
+        coef_radius=tree_root.coef_radius,
+        max_distance=max_distance
+    )
+
+
+class FarPairs(object):
+    """
+    The farthest pairs of points of a tree
+
+    Moving every point by at most delta changes the distance of a pair by at
+    most 2 delta. So the farthest pair of a jittered copy is one of the pairs
+    which were not shorter than the longest one minus 4 delta. When they are
+    all kept here, max_distance of the copy is measured over them only, with
+    the same arithmetic as TreeRoot.max_distance.
+
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    size : int
+        The number of the pairs kept (default: 4 times the points)
+    """
+    def __init__(self, tree_root, size=None):
+        n = tree_root.node_count()
+        if size is None:
+            size = 4 * n
+        xs, ys, zs = tree_root.xs, tree_root.ys, tree_root.zs
+        sqrt = math.sqrt
+        pairs = ((sqrt((xs[i] - xs[j])**2 + (ys[i] - ys[j])**2 + (zs[i] - zs[j])**2), i, j)
+                 for i in xrange(n) for j in xrange(i + 1, n))
+        self.pairs = heapq.nlargest(size, pairs)
+        self.longest = self.pairs[0][0] if len(self.pairs) > 0 else 0.0
+        if len(self.pairs) < n * (n - 1) // 2:
+            self.margin = self.longest - self.pairs[-1][0]
+        else:
+            self.margin = float('inf')
+
+    def max_distance(self, tree_root, xs, ys, zs):
+        """
+        TreeRoot.max_distance of tree_root with the coordinates moved to xs,
+        ys, zs, or None if the points moved too far for the kept pairs
+        """
+        sqrt = math.sqrt
+        delta = max([sqrt((x1 - x0)**2 + (y1 - y0)**2 + (z1 - z0)**2)
+                     for x0, y0, z0, x1, y1, z1 in zip(tree_root.xs, tree_root.ys, tree_root.zs, xs, ys, zs)] or [0.0])
+        if 4.0 * delta + 1e-9 * self.longest >= self.margin:
+            return None
+        max_sq = 0.0
+        for _, i, j in self.pairs:
+            sq = (xs[i] - xs[j])**2 + (ys[i] - ys[j])**2 + (zs[i] - zs[j])**2
+            if sq > max_sq: max_sq = sq
+        return math.sqrt(math.sqrt(max_sq))
+
+
+# Set once per worker process by _init_worker, so that the tree, its far
+# pairs and the reconstructor are not sent with every replicate
+_state = {}
+
+
+def _init_worker(tree_root, far_pairs, method, param_w, param_alpha, sigma_xyz, sigma_diameter):
+    _state["tree_root"] = tree_root
+    _state["far_pairs"] = far_pairs
+    _state["reconstructor"] = reconstructor.create(method, param_w, param_alpha)
+    _state["sigma"] = (sigma_xyz, sigma_diameter)
+
+
+def _replicate(seed):
+    """
+    Returns
+    -------
+    edges : [(int, int)]
+    accuracy : {"edge_count": float, "edge_volume": float} or None
+    """
+    tree_root = _state["tree_root"]
+    sigma_xyz, sigma_diameter = _state["sigma"]
+    perturbed = perturb(tree_root, random.Random(seed), sigma_xyz, sigma_diameter, _state["far_pairs"])
+    reconstructed = copy.copy(perturbed)
+    reconstructed.links = _state["reconstructor"].reconstruct(perturbed)
+
+    accuracy = None
+    if len(tree_root.links) > 0:
+        accuracy = treeroot.compute_accuracy(reconstructed, perturbed)
+    return sorted(treeroot.edge_set(reconstructed.links)), accuracy
+
+
+def run(tree_root, replicates, sigma_xyz, sigma_diameter,
+        method='ip', param_w=1.1, param_alpha=1.1, jobs=1, seed=0):
+    """
+    Reconstruct perturbed copies of tree_root
+
+    Returns
+    -------
+    result : {"baseline": [(int, int)],
+              "edge_frequency": {(int, int): float},
+              "stability": [float],
+              "accuracy": [{"edge_count": float, "edge_volume": float}]}
+        stability[i] is the frequency of the edge from i to its parent in the
+        unperturbed reconstruction (1.0 for the stump).
+    """
+    # Measured once for all the replicates
+    far_pairs = FarPairs(tree_root)
+    init_args = (tree_root, far_pairs, method, param_w, param_alpha, sigma_xyz, sigma_diameter)
+    seeds = [seed + k for k in xrange(replicates)]
+    if jobs <= 1:
+        _init_worker(*init_args)
+        results = map(_replicate, seeds)
+    else:
+        from multiprocessing import Pool
+        pool = Pool(jobs, _init_worker, init_args)
+        try:
+            results = pool.map(_replicate, seeds, chunksize=max(1, replicates // (4 * jobs)))
+        finally:
+            pool.close()
+            pool.join()
+
+    counts = {}
+    accuracy = []
+    for edges, acc in results:
+        for e in edges:
+            counts[e] = counts.get(e, 0) + 1
+        if acc is not None:
+            accuracy.append(acc)
+    frequency = dict((e, c / replicates) for e, c in counts.iteritems())
+
+    baseline = copy.copy(tree_root)
+    baseline.links = reconstructor.create(method, param_w, param_alpha).reconstruct(tree_root)
+    parent = baseline.parent_indices()
+    stability = [1.0]*tree_root.node_count()
+    for i in xrange(1, tree_root.node_count()):
+        p = parent[i]
+        stability[i] = frequency.get((min(i, p), max(i, p)), 0.0) if p != -1 else 0.0
+
+    return {"baseline": baseline.links, "edge_frequency": frequency,
+            "stability": stability, "accuracy": accuracy}
+
+
+def summarize(values):
+    """
+    Returns
+    -------
+    mean, std, min, median, max : float
+    """
+    values = sorted(values)
+    n = len(values)
+    mean = sum(values) / n
+    std = math.sqrt(sum((v - mean)**2 for v in values) / n)
+    median = values[n // 2] if n % 2 == 1 else (values[n // 2 - 1] + values[n // 2]) / 2
+    return mean, std, values[0], median, values[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_dat', type=str)
+    parser.add_argument('--replicates', type=int, default=100)
+    parser.add_argument('--sigma-xyz', dest='sigma_xyz', type=float, default=1.0,
+            help='standard deviation of the coordinate error')
+    parser.add_argument('--sigma-diameter', dest='sigma_diameter', type=float, default=0.05,
+            help='relative standard deviation of the diameter error')
+    parser.add_argument('--method', type=str, choices=cost_kernel.kernel_names(), default='ip')
+    parser.add_argument('--param-alpha', dest='param_alpha', type=float, default=1.1)
+    parser.add_argument('--param-w', dest='param_w', type=float, default=1.1)
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-vtk', dest='output_vtk', type=str,
+            help='unperturbed reconstruction with the stability of each edge as a scalar')
+    parser.add_argument('--output-edges', dest='output_edges', type=str,
+            help='tab separated frequency of every reconstructed edge')
+    args = parser.parse_args(argv)
+
+    try:
+        tree_root = TreeRoot.load_dat(args.input_dat)
+    except IOError as e:
+        print("[Error] No such file : {}".format(args.input_dat))
+        sys.exit(1)
+    except dat2vtk.MissingStumpError as e:
+        print("[Error] {}".format(e))
+        sys.exit(1)
+    except dat2vtk.FileFormatError as e:
+        print("[Error] Unexpected file format.")
+        sys.exit(1)
+    except dat2vtk.FileSyntaxError as e:
+        print("[Error] Syntax error.")
+        sys.exit(1)
+
+    result = run(tree_root, args.replicates, args.sigma_xyz, args.sigma_diameter,
+                 args.method, args.param_w, args.param_alpha, args.jobs, args.seed)
+
+    stability = result["stability"][1:]
+    print("Replicates                : {}".format(args.replicates))
+    print("Stable edges (>= 90%)     : {} / {}".format(sum(1 for s in stability if s >= 0.9), len(stability)))
+    print("Stability (mean)          : {:.3%}".format(sum(stability) / max(1, len(stability))))
+    if len(result["accuracy"]) > 0:
+        for key, title in [("edge_count", "Accuracy (Edge)           "), ("edge_volume", "Accuracy (Volume)         ")]:
+            mean, std, lo, median, hi = summarize([a[key] for a in result["accuracy"]])
+            print("{}: mean {:.3%} std {:.3%} min {:.3%} median {:.3%} max {:.3%}".format(
+                title, mean, std, lo, median, hi))
+
+    if args.output_vtk is not None:
+        baseline = copy.copy(tree_root)
+        baseline.links = result["baseline"]
+        baseline.export_vtk(args.output_vtk, {"stability": result["stability"]})
+
+    if args.output_edges is not None:
+        labels = tree_root.labels
+        with codecs.open(args.output_edges, 'w', 'utf_8') as f:
+            print("label_a\tlabel_b\tfrequency", file=f)
+            for (a, b), freq in sorted(result["edge_frequency"].iteritems(), key=lambda x: -x[1]):
+                print("{}\t{}\t{}".format(labels[a], labels[b], freq), file=f)
+
+
+if __name__ == "__main__":
+    util.set_terminal_encoding()
+    main()
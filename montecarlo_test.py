@@ -0,0 +1,57 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import copy
+import random
+import unittest
+from testing import grown_tree
+import montecarlo
+import reconstructor
+import treeroot
+
+class TestMonteCarlo(unittest.TestCase):
+    def test_far_pairs(self):
+        tree_root = grown_tree(120, 0)
+        far_pairs = montecarlo.FarPairs(tree_root, 200)
+        self.assertEqual(far_pairs.pairs[0][0] ** 0.5, tree_root.max_distance())
+        measured = 0
+        for seed in xrange(20):
+            for sigma in (0.01, 0.3, 5.0):
+                shared = montecarlo.perturb(tree_root, random.Random(seed), sigma, 0.05, far_pairs)
+                alone = montecarlo.perturb(tree_root, random.Random(seed), sigma, 0.05)
+                self.assertEqual(shared.radii, alone.radii)
+                self.assertEqual(shared.max_distance(), alone.max_distance())
+                if far_pairs.max_distance(tree_root, shared.xs, shared.ys, shared.zs) is not None:
+                    measured += 1
+        # The small jitters are measured over the kept pairs, the large ones in full
+        self.assertTrue(20 <= measured < 60)
+
+        # All the pairs are kept: any jitter
+        small = grown_tree(10, 1)
+        far_pairs = montecarlo.FarPairs(small, 100)
+        self.assertEqual(len(far_pairs.pairs), 45)
+        shared = montecarlo.perturb(small, random.Random(0), 100.0, 0.0, far_pairs)
+        self.assertEqual(shared.max_distance(), montecarlo.perturb(small, random.Random(0), 100.0, 0.0).max_distance())
+
+    def test_run(self):
+        tree_root = grown_tree(60, 2)
+        result = montecarlo.run(tree_root, 4, 0.2, 0.05, seed=3)
+        ip = reconstructor.create('ip')
+        counts = {}
+        for seed in xrange(3, 7):
+            perturbed = montecarlo.perturb(tree_root, random.Random(seed), 0.2, 0.05)
+            reconstructed = copy.copy(perturbed)
+            reconstructed.links = ip.reconstruct(perturbed)
+            for e in treeroot.edge_set(reconstructed.links):
+                counts[e] = counts.get(e, 0) + 1
+            self.assertIn(treeroot.compute_accuracy(reconstructed, perturbed), result["accuracy"])
+        self.assertEqual(result["edge_frequency"], dict((e, c / 4) for e, c in counts.iteritems()))
+        self.assertEqual(montecarlo.run(tree_root, 4, 0.2, 0.05, jobs=2, seed=3), result)
+
+        # Without noise every replicate is the baseline
+        result = montecarlo.run(tree_root, 3, 0.0, 0.0)
+        self.assertEqual(result["stability"], [1.0] * tree_root.node_count())
+        self.assertEqual(set(result["edge_frequency"].values()), set([1.0]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import math
+
+from common import topology
+from treeroot import TreeRoot
+import reconstructor
+
+
+def partition(tree_root, stumps, overlap=0.0):
+    """
+    Assign every point to the stump nearest in the horizontal plane
+
+    A point is also given to every other stump which is at most overlap
+    farther than the nearest one, so that the trees can use it as a
+    candidate near their boundary.
+
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    stumps : [int]
+        Indices of the stumps
+    overlap : float
+
+    Returns
+    -------
+    primary : [int]
+        primary[i] is the position in stumps of the tree which owns point i
+    members : [[int]]
+        members[k] is the points used to reconstruct the tree k (its stump first)
+    """
+    xs, ys = tree_root.xs, tree_root.ys
+    stump_pos = [(xs[s], ys[s]) for s in stumps]
+    is_stump = dict((s, k) for k, s in enumerate(stumps))
+
+    primary = [None]*tree_root.node_count()
+    members = [[s] for s in stumps]
+    for i in xrange(tree_root.node_count()):
+        if i in is_stump:
+            primary[i] = is_stump[i]
+            continue
+        x, y = xs[i], ys[i]
+        ds = [math.sqrt((x - sx)**2 + (y - sy)**2) for sx, sy in stump_pos]
+        nearest = min(xrange(len(ds)), key=ds.__getitem__)
+        primary[i] = nearest
+        for k, d in enumerate(ds):
+            if k == nearest or d <= ds[nearest] + overlap:
+                members[k].append(i)
+    return primary, members
+
+
+def subtree(tree_root, members):
+    """
+    Build the tree of the given points. members[0] becomes the index 0 (center).
+    """
+    local = dict((v, k) for k, v in enumerate(members))
+    links = [(local[a], local[b]) for a, b in tree_root.links if a in local and b in local]
+    labels = [tree_root.labels[v] for v in members]
+    return TreeRoot(
+        links=links,
+        xs=[tree_root.xs[v] for v in members],
+        ys=[tree_root.ys[v] for v in members],
+        zs=[tree_root.zs[v] for v in members],
+        radii=[tree_root.radii[v] for v in members],
+        labels=labels,
+        label_to_index=dict((label, k) for k, label in enumerate(labels)),
+        coef_radius=tree_root.coef_radius
+    )
+
+
+def _reconstruct_one(args):
+    tree_root, method, param_w, param_alpha = args
+    return reconstructor.create(method, param_w, param_alpha).reconstruct(tree_root)
+
+
+def merge(tree_root, primary, members, local_links):
+    """
+    Merge the links of every tree into the indices of tree_root
+
+    Each point keeps only the tree which owns it. If its parent there belongs
+    to another tree (overlap zone), it is linked to the nearest ancestor owned
+    by the same tree instead, so the result is a forest without cycles.
+
+    Returns
+    -------
+    links : [(int, int)]
+        (child, parent)
+    """
+    links = []
+    for k, (vs, ls) in enumerate(zip(members, local_links)):
+        parent = topology.TopologyIndex(len(vs), ls).parent
+        for local_v, v in enumerate(vs):
+            if local_v == 0 or primary[v] != k: continue
+            p = parent[local_v]
+            while p > 0 and primary[vs[p]] != k:
+                p = parent[p]
+            if p != -1:
+                links.append((v, vs[p]))
+    return links
+
+
+def reconstruct(tree_root, stumps, method='ip', param_w=1.1, param_alpha=1.1, overlap=0.0, jobs=1):
+    """
+    Reconstruct every tree independently (in parallel) and merge them
+
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    stumps : [int]
+        Indices of the stumps
+    method, param_w, param_alpha :
+        See reconstructor.create
+    overlap : float
+        See partition
+    jobs : int
+        The number of processes
+
+    Returns
+    -------
+    links : [(int, int)]
+    """
+    primary, members = partition(tree_root, stumps, overlap)
+    tasks = [(subtree(tree_root, vs), method, param_w, param_alpha) for vs in members]
+    if jobs <= 1 or len(tasks) <= 1:
+        local_links = map(_reconstruct_one, tasks)
+    else:
+        from multiprocessing import Pool
+        pool = Pool(min(jobs, len(tasks)))
+        try:
+            local_links = pool.map(_reconstruct_one, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    return merge(tree_root, primary, members, local_links)
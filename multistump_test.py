@@ -0,0 +1,69 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+from testing import grown_tree
+from treeroot import TreeRoot
+import multistump
+
+def two_trees(n, gap):
+    """
+    Two grown trees side by side, the stumps at 0 and n
+    """
+    a, b = grown_tree(n, 5), grown_tree(n, 6, shift=gap)
+    links = a.links + [(u + n, v + n) for u, v in b.links]
+    return TreeRoot(links=links, xs=a.xs + b.xs, ys=a.ys + b.ys, zs=a.zs + b.zs, radii=a.radii + b.radii,
+                    labels=range(2 * n), label_to_index=dict((i, i) for i in xrange(2 * n)))
+
+class TestMultiStump(unittest.TestCase):
+    def assertForest(self, tree_root, stumps, primary, links):
+        parent = dict(links)
+        self.assertEqual(len(parent), len(links))
+        self.assertEqual(set(parent), set(xrange(tree_root.node_count())) - set(stumps))
+        for v in xrange(tree_root.node_count()):
+            seen = set()
+            while v in parent:
+                seen.add(v)
+                self.assertEqual(primary[parent[v]], primary[v])
+                v = parent[v]
+                self.assertNotIn(v, seen)
+            self.assertIn(v, stumps)
+
+    def test_partition(self):
+        tree_root = two_trees(40, 30.0)
+        stumps = [0, 40]
+        primary, members = multistump.partition(tree_root, stumps)
+        self.assertEqual([vs[0] for vs in members], stumps)
+        self.assertEqual(sorted(members[0] + members[1]), range(80))
+        for k, vs in enumerate(members):
+            self.assertTrue(all(primary[v] == k for v in vs))
+
+        # The overlap zone is in both trees but owned by one
+        primary2, members2 = multistump.partition(tree_root, stumps, overlap=5.0)
+        self.assertEqual(primary2, primary)
+        self.assertTrue(len(members2[0]) + len(members2[1]) > 80)
+        self.assertTrue(set(members[0]) <= set(members2[0]))
+
+    def test_merge(self):
+        # 2 is owned by the first tree, 3 by the second one
+        xs = [0.0, 10.0, 4.0, 6.0]
+        tree_root = TreeRoot(links=[], xs=xs, ys=[0.0] * 4, zs=[0.0, 0.0, -1.0, -1.0], radii=[1.0] * 4,
+                             labels=range(4), label_to_index=dict((i, i) for i in xrange(4)))
+        primary, members = multistump.partition(tree_root, [0, 1], overlap=10.0)
+        self.assertEqual((primary, members), ([0, 1, 0, 1], [[0, 2, 3], [1, 2, 3]]))
+        # The parent of 3 in the second tree is 2: it goes up to the stump 1
+        local_links = [[(1, 0), (2, 1)], [(2, 1), (1, 0)]]
+        self.assertEqual(multistump.merge(tree_root, primary, members, local_links), [(2, 0), (3, 1)])
+
+    def test_reconstruct(self):
+        tree_root = two_trees(40, 25.0)
+        stumps = [0, 40]
+        for overlap in (0.0, 4.0):
+            primary, members = multistump.partition(tree_root, stumps, overlap)
+            links = multistump.reconstruct(tree_root, stumps, overlap=overlap)
+            self.assertForest(tree_root, stumps, primary, links)
+            self.assertEqual(sorted(multistump.reconstruct(tree_root, stumps, overlap=overlap, jobs=2)),
+                             sorted(links))
+
+if __name__ == '__main__':
+    unittest.main()
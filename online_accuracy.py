@@ -0,0 +1,124 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+from treeroot import edge_set
+
+
+class ReconstructionAborted(Exception):
+    """
+    Raised by OnlineAccuracy when the target cannot be beaten any more
+    """
+    def __init__(self, bounds):
+        Exception.__init__(self, 'Reconstruction aborted : {}'.format(bounds))
+        self.bounds = bounds
+
+
+class OnlineAccuracy(object):
+    """
+    Running bounds of the accuracy (see treeroot.compute_accuracy) while the
+    links are made
+
+    Pass it as on_link to the reconstruct method of a reconstructor. Every
+    link is looked up in a hashed index of the ground truth when it is made.
+
+    Parameters
+    ----------
+    truth_tree : TreeRoot
+        The ground truth (same points as the reconstruction)
+    link_limit : int
+        The largest possible number of links (n - 1 by default)
+    sources : bool
+        The first node of every link is the node which chose it, and it
+        chooses only once (SekiharaMethod). A true link whose both ends have
+        chosen another link can no longer be made.
+    target : float or None
+        Raise ReconstructionAborted as soon as the upper bound of metric
+        is not above this
+    metric : string
+        'edge_count' or 'edge_volume'
+    """
+    def __init__(self, truth_tree, link_limit=None, sources=True, target=None, metric='edge_count'):
+        self.tree = truth_tree
+        self.link_limit = truth_tree.node_count() - 1 if link_limit is None else link_limit
+        self.sources = sources
+        self.target = target
+        self.metric = metric
+
+        self.truth = edge_set(truth_tree.links)
+        self.volume_all = truth_tree.edge_volume_sum()
+        self.partners = {}
+        self.volume_open = 0.0
+        for a, b in self.truth:
+            self.partners.setdefault(a, []).append(b)
+            self.partners.setdefault(b, []).append(a)
+            if a != 0:
+                self.volume_open += truth_tree.edge_volume(a, b)
+
+        self.made = 0
+        self.correct = 0
+        self.volume_correct = 0.0
+        # True links which are neither made nor impossible yet
+        self.open = len(self.truth)
+        self.matched = set()
+        self.dead = set()
+        self.chosen = set()
+
+    def __call__(self, a, b):
+        self.made += 1
+        e = (min(a, b), max(a, b))
+        if e in self.truth and e not in self.matched:
+            self.matched.add(e)
+            self.correct += 1
+            self.open -= 1
+            if e[0] != 0:
+                v = self.tree.edge_volume(a, b)
+                self.volume_correct += v
+                self.volume_open -= v
+        if self.sources:
+            self.chosen.add(a)
+            for p in self.partners.get(a, ()):
+                f = (min(a, p), max(a, p))
+                if p in self.chosen and f not in self.matched and f not in self.dead:
+                    self._close(f)
+
+        if self.target is not None and self.bounds()[self.metric][1] <= self.target:
+            raise ReconstructionAborted(self.bounds())
+
+    def _close(self, e):
+        self.dead.add(e)
+        self.open -= 1
+        if e[0] != 0:
+            self.volume_open -= self.tree.edge_volume(e[0], e[1])
+
+    def bounds(self):
+        """
+        Returns
+        -------
+        bounds : {"edge_count": (float, float), "edge_volume": (float, float)}
+            (lower, upper) of the final accuracy
+        """
+        rest = max(0, self.link_limit - self.made)
+        if self.link_limit > 0:
+            edge_lo = self.correct / max(self.link_limit, self.made)
+        else:
+            edge_lo = 0.0
+        # (correct + r) / (made + r) grows with r while the new links can be correct
+        r = min(rest, self.open)
+        edge_hi = (self.correct + r) / (self.made + r) if self.made + r > 0 else 1.0
+
+        if self.volume_all > 0.0:
+            volume_lo = self.volume_correct / self.volume_all
+            volume_hi = min(1.0, (self.volume_correct + max(0.0, self.volume_open)) / self.volume_all)
+        else:
+            volume_lo, volume_hi = 0.0, 1.0
+        return {"edge_count": (edge_lo, edge_hi), "edge_volume": (volume_lo, volume_hi)}
+
+    def accuracy(self):
+        """
+        The accuracy of the links made so far, same as compute_accuracy
+        once the reconstruction is finished
+        """
+        return {
+            "edge_count": self.correct / self.made,
+            "edge_volume": self.volume_correct / self.volume_all,
+        }
@@ -0,0 +1,39 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import copy
+import unittest
+from online_accuracy import OnlineAccuracy, ReconstructionAborted
+from testing import random_tree
+import treeroot
+import reconstructor
+
+class TestOnlineAccuracy(unittest.TestCase):
+    def test_bounds(self):
+        tree_root = random_tree(80, 0)
+        for method in ['dist', 'ip', 'an']:
+            tracker = OnlineAccuracy(tree_root, sources=method != 'dist')
+            history = []
+            def on_link(a, b):
+                tracker(a, b)
+                history.append(tracker.bounds())
+            reconstructed_tree_root = copy.copy(tree_root)
+            reconstructed_tree_root.links = reconstructor.create(method).reconstruct(tree_root, on_link)
+
+            accuracy = treeroot.compute_accuracy(reconstructed_tree_root, tree_root)
+            self.assertEqual(tracker.accuracy(), accuracy)
+            for bounds in history:
+                for metric in ['edge_count', 'edge_volume']:
+                    lo, hi = bounds[metric]
+                    self.assertLessEqual(lo, accuracy[metric] + 1e-12)
+                    self.assertGreaterEqual(hi, accuracy[metric] - 1e-12)
+
+    def test_abort(self):
+        tree_root = random_tree(80, 1)
+        links = reconstructor.create('ip').reconstruct(tree_root)
+        tracker = OnlineAccuracy(tree_root, target=0.9)
+        self.assertRaises(ReconstructionAborted, reconstructor.create('ip').reconstruct, tree_root, tracker)
+        self.assertLess(tracker.made, len(links))
+
+if __name__ == '__main__':
+    unittest.main()
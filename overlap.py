@@ -0,0 +1,381 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# Overlap and proximity of the root systems of two trees
+#
+# A link is a truncated cone as in TreeSpatialIndex: its surface is at the
+# radius interpolated along the centerline. The links of each tree are put
+# in a bounding volume hierarchy (boxes grown by the larger radius), and the
+# pairs of links are found by descending both hierarchies together, so only
+# the pairs whose boxes are close are measured.
+
+import argparse
+import math
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from common import util, dat2vtk, compressed
+from treeroot import TreeRoot
+from spatial_hash import segment_distance
+
+
+def segment_pair_distance(p1, q1, p2, q2):
+    """
+    Closest points of the segments p1q1 and p2q2
+
+    Returns
+    -------
+    distance : float
+    s, t : float
+        Position of the closest points (0 at p, 1 at q)
+    """
+    d1 = [q1[k] - p1[k] for k in xrange(3)]
+    d2 = [q2[k] - p2[k] for k in xrange(3)]
+    r = [p1[k] - p2[k] for k in xrange(3)]
+    a = d1[0]*d1[0] + d1[1]*d1[1] + d1[2]*d1[2]
+    e = d2[0]*d2[0] + d2[1]*d2[1] + d2[2]*d2[2]
+    f = d2[0]*r[0] + d2[1]*r[1] + d2[2]*r[2]
+
+    if a == 0.0 and e == 0.0:
+        s, t = 0.0, 0.0
+    elif a == 0.0:
+        s, t = 0.0, min(1.0, max(0.0, f / e))
+    else:
+        c = d1[0]*r[0] + d1[1]*r[1] + d1[2]*r[2]
+        if e == 0.0:
+            s, t = min(1.0, max(0.0, -c / a)), 0.0
+        else:
+            b = d1[0]*d2[0] + d1[1]*d2[1] + d1[2]*d2[2]
+            denom = a*e - b*b
+            # Parallel segments: any s, take 0
+            s = min(1.0, max(0.0, (b*f - c*e) / denom)) if denom > 0.0 else 0.0
+            t = (b*s + f) / e
+            if t < 0.0:
+                s, t = min(1.0, max(0.0, -c / a)), 0.0
+            elif t > 1.0:
+                s, t = min(1.0, max(0.0, (b - c) / a)), 1.0
+
+    c1 = [p1[k] + d1[k]*s for k in xrange(3)]
+    c2 = [p2[k] + d2[k]*t for k in xrange(3)]
+    return math.sqrt(sum((c1[k] - c2[k])**2 for k in xrange(3))), s, t
+
+
+def _box_distance(lo1, hi1, lo2, hi2):
+    sq = 0.0
+    for k in xrange(3):
+        gap = max(lo2[k] - hi1[k], lo1[k] - hi2[k], 0.0)
+        sq += gap * gap
+    return math.sqrt(sq)
+
+
+class SegmentBVH(object):
+    """
+    Bounding volume hierarchy over the links of a tree
+
+    The nodes are stored in arrays. A leaf holds the segments
+    order[start[k]:end[k]], an inner node has the children left[k] and
+    right[k] (-1 for a leaf).
+
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    include_stump : bool
+        Keep the links of the stump, which are left out of the volumes as in
+        TreeRoot.edge_volume_sum
+    leaf_size : int
+    """
+    def __init__(self, tree_root, include_stump=False, leaf_size=4):
+        self.tree = tree_root
+        xs, ys, zs, radii = tree_root.xs, tree_root.ys, tree_root.zs, tree_root.radii
+        self.links = [(a, b) for a, b in tree_root.links
+                      if a != b and (include_stump or (a != 0 and b != 0))]
+        self.seg_lo, self.seg_hi = [], []
+        for a, b in self.links:
+            r = max(radii[a], radii[b])
+            self.seg_lo.append((min(xs[a], xs[b]) - r, min(ys[a], ys[b]) - r, min(zs[a], zs[b]) - r))
+            self.seg_hi.append((max(xs[a], xs[b]) + r, max(ys[a], ys[b]) + r, max(zs[a], zs[b]) + r))
+
+        self.order = range(len(self.links))
+        self.lo, self.hi, self.left, self.right, self.start, self.end = [], [], [], [], [], []
+        if len(self.links) > 0:
+            self._build(leaf_size)
+
+    def _new_node(self, start, end):
+        order, seg_lo, seg_hi = self.order, self.seg_lo, self.seg_hi
+        lo = tuple(min(seg_lo[i][k] for i in order[start:end]) for k in xrange(3))
+        hi = tuple(max(seg_hi[i][k] for i in order[start:end]) for k in xrange(3))
+        self.lo.append(lo)
+        self.hi.append(hi)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.start.append(start)
+        self.end.append(end)
+        return len(self.lo) - 1
+
+    def _build(self, leaf_size):
+        # Split at the median of the box centers on the longest axis
+        stack = [self._new_node(0, len(self.order))]
+        while len(stack) > 0:
+            k = stack.pop()
+            start, end = self.start[k], self.end[k]
+            if end - start <= leaf_size:
+                continue
+            lo, hi = self.lo[k], self.hi[k]
+            axis = max(xrange(3), key=lambda d: hi[d] - lo[d])
+            seg_lo, seg_hi = self.seg_lo, self.seg_hi
+            self.order[start:end] = sorted(self.order[start:end],
+                                           key=lambda i: seg_lo[i][axis] + seg_hi[i][axis])
+            mid = (start + end) // 2
+            self.left[k] = self._new_node(start, mid)
+            self.right[k] = self._new_node(mid, end)
+            stack.append(self.left[k])
+            stack.append(self.right[k])
+
+    def is_leaf(self, k):
+        return self.left[k] == -1
+
+    def segment(self, i):
+        """
+        Returns
+        -------
+        a, b : (float, float, float)
+            The ends of the link i
+        ra, rb : float
+        """
+        t = self.tree
+        a, b = self.links[i]
+        return ((t.xs[a], t.ys[a], t.zs[a]), (t.xs[b], t.ys[b], t.zs[b]), t.radii[a], t.radii[b])
+
+
+def surface_distance(bvh1, i, bvh2, j):
+    """
+    Distance between the surfaces of two links (0 if they intersect)
+
+    Returns
+    -------
+    distance : float
+    point : (float, float, float)
+        Midpoint of the closest points of the centerlines
+    """
+    a1, b1, ra1, rb1 = bvh1.segment(i)
+    a2, b2, ra2, rb2 = bvh2.segment(j)
+    d, s, t = segment_pair_distance(a1, b1, a2, b2)
+    r1 = ra1 + (rb1 - ra1) * s
+    r2 = ra2 + (rb2 - ra2) * t
+    point = tuple(0.5 * (a1[k] + (b1[k] - a1[k]) * s + a2[k] + (b2[k] - a2[k]) * t) for k in xrange(3))
+    return max(0.0, d - r1 - r2), point
+
+
+def close_pairs(bvh1, bvh2, buffer):
+    """
+    Iterate over the pairs of links whose boxes are within buffer
+
+    Yields
+    ------
+    i, j : int
+        Links of bvh1 and bvh2
+    """
+    if len(bvh1.links) == 0 or len(bvh2.links) == 0:
+        return
+    stack = [(0, 0)]
+    while len(stack) > 0:
+        n1, n2 = stack.pop()
+        if _box_distance(bvh1.lo[n1], bvh1.hi[n1], bvh2.lo[n2], bvh2.hi[n2]) > buffer:
+            continue
+        leaf1, leaf2 = bvh1.is_leaf(n1), bvh2.is_leaf(n2)
+        if leaf1 and leaf2:
+            for i in bvh1.order[bvh1.start[n1]:bvh1.end[n1]]:
+                for j in bvh2.order[bvh2.start[n2]:bvh2.end[n2]]:
+                    if _box_distance(bvh1.seg_lo[i], bvh1.seg_hi[i], bvh2.seg_lo[j], bvh2.seg_hi[j]) <= buffer:
+                        yield i, j
+        elif leaf2 or (not leaf1 and bvh1.end[n1] - bvh1.start[n1] >= bvh2.end[n2] - bvh2.start[n2]):
+            stack.append((bvh1.left[n1], n2))
+            stack.append((bvh1.right[n1], n2))
+        else:
+            stack.append((n1, bvh2.left[n2]))
+            stack.append((n1, bvh2.right[n2]))
+
+
+def min_distance(bvh1, bvh2):
+    """
+    The smallest distance between the surfaces of the two trees
+
+    Returns
+    -------
+    distance : float
+        inf if a tree has no link
+    pair : (int, int) or None
+        Links of bvh1 and bvh2
+    point : (float, float, float) or None
+    """
+    best, best_pair, best_point = float('inf'), None, None
+    if len(bvh1.links) == 0 or len(bvh2.links) == 0:
+        return best, best_pair, best_point
+    stack = [(0.0, 0, 0)]
+    while len(stack) > 0:
+        bound, n1, n2 = stack.pop()
+        if bound >= best and best_pair is not None:
+            continue
+        leaf1, leaf2 = bvh1.is_leaf(n1), bvh2.is_leaf(n2)
+        if leaf1 and leaf2:
+            for i in bvh1.order[bvh1.start[n1]:bvh1.end[n1]]:
+                for j in bvh2.order[bvh2.start[n2]:bvh2.end[n2]]:
+                    d, point = surface_distance(bvh1, i, bvh2, j)
+                    if d < best or (d == best and (i, j) < best_pair):
+                        best, best_pair, best_point = d, (i, j), point
+            continue
+        if leaf2 or (not leaf1 and bvh1.end[n1] - bvh1.start[n1] >= bvh2.end[n2] - bvh2.start[n2]):
+            children = [(c, n2) for c in (bvh1.left[n1], bvh1.right[n1])]
+        else:
+            children = [(n1, c) for c in (bvh2.left[n2], bvh2.right[n2])]
+        # The nearer child is popped first
+        bounds = [(_box_distance(bvh1.lo[c1], bvh1.hi[c1], bvh2.lo[c2], bvh2.hi[c2]), c1, c2)
+                  for c1, c2 in children]
+        bounds.sort(reverse=True)
+        stack.extend(b for b in bounds if best_pair is None or b[0] < best)
+    return best, best_pair, best_point
+
+
+def contacts(bvh1, bvh2, buffer):
+    """
+    The pairs of links closer than buffer
+
+    Returns
+    -------
+    contacts : [(int, int, float, (float, float, float))]
+        (link of bvh1, link of bvh2, surface distance, point)
+    """
+    ret = []
+    for i, j in close_pairs(bvh1, bvh2, buffer):
+        d, point = surface_distance(bvh1, i, bvh2, j)
+        if d <= buffer:
+            ret.append((i, j, d, point))
+    ret.sort()
+    return ret
+
+
+def overlap_volume(bvh1, bvh2, buffer, samples=8):
+    """
+    Volume of the links of bvh1 within buffer of the surface of bvh2
+
+    Every link is cut into samples pieces along its centerline, and a piece
+    is counted when its surface at the middle is within buffer of a link of
+    bvh2 (see TreeRoot.edge_volume).
+    """
+    near = {}
+    for i, j in close_pairs(bvh1, bvh2, buffer):
+        near.setdefault(i, []).append(j)
+
+    tree = bvh1.tree
+    volume = 0.0
+    for i, js in near.iteritems():
+        a, b, ra, rb = bvh1.segment(i)
+        others = [bvh2.segment(j) for j in js]
+        inside = 0
+        for k in xrange(samples):
+            s = (k + 0.5) / samples
+            p = [a[d] + (b[d] - a[d]) * s for d in xrange(3)]
+            r = ra + (rb - ra) * s
+            for a2, b2, ra2, rb2 in others:
+                dist, t = segment_distance(p[0], p[1], p[2], a2[0], a2[1], a2[2], b2[0], b2[1], b2[2])
+                if dist - r - (ra2 + (rb2 - ra2) * t) <= buffer:
+                    inside += 1
+                    break
+        volume += tree.edge_volume(*bvh1.links[i]) * inside / samples
+    return volume
+
+
+def contacts_by_depth(contact_list, top, step):
+    """
+    Histogram of the contacts by depth below top
+
+    Returns
+    -------
+    counts : [(float, int)]
+        (depth where the class starts, contacts), from the top
+    """
+    counts = {}
+    for _, _, _, point in contact_list:
+        k = int(math.floor((top - point[2]) / step))
+        counts[k] = counts.get(k, 0) + 1
+    return [(k * step, counts[k]) for k in sorted(counts)]
+
+
+def generate_contacts_vtk(contact_list, bvh1, bvh2, top):
+    """
+    The contacts as a point set (see dat2vtk.generate_sphere)
+    """
+    xs = [c[3][0] for c in contact_list]
+    ys = [c[3][1] for c in contact_list]
+    zs = [c[3][2] for c in contact_list]
+    radii = []
+    for i, j, _, _ in contact_list:
+        _, _, ra1, rb1 = bvh1.segment(i)
+        _, _, ra2, rb2 = bvh2.segment(j)
+        radii.append(min(0.5 * (ra1 + rb1), 0.5 * (ra2 + rb2)))
+    data = {"distance": [c[2] for c in contact_list],
+            "depth": [top - z for z in zs]}
+    return dat2vtk.generate_sphere(xs, ys, zs, radii, data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_a', type=str)
+    parser.add_argument('input_b', type=str)
+    parser.add_argument('--coef-radius', dest='coef_radius', type=float, default=0.5)
+    parser.add_argument('--buffer', type=float, default=0.0,
+            help='links whose surfaces are closer than this are in contact')
+    parser.add_argument('--depth-step', dest='depth_step', type=float, default=10.0,
+            help='class width of the contacts by depth (below the stump of input_a)')
+    parser.add_argument('--samples', type=int, default=8,
+            help='pieces of a link for the overlap volume')
+    parser.add_argument('--include-stump', dest='include_stump', action='store_true',
+            help='include the links of the stumps')
+    parser.add_argument('--contacts', type=str, default=None,
+            help='write the contact points to this VTK file')
+    args = parser.parse_args(argv)
+
+    trees = []
+    for fname in (args.input_a, args.input_b):
+        try:
+            trees.append(TreeRoot.load_dat(fname, args.coef_radius))
+        except IOError as e:
+            print("[Error] No such file : {}".format(fname))
+            sys.exit(1)
+        except dat2vtk.MissingStumpError as e:
+            print("[Error] {}".format(e))
+            sys.exit(1)
+        except dat2vtk.FileFormatError as e:
+            print("[Error] Unexpected file format.")
+            sys.exit(1)
+        except dat2vtk.FileSyntaxError as e:
+            print("[Error] Syntax error.")
+            sys.exit(1)
+
+    bvh_a, bvh_b = [SegmentBVH(t, args.include_stump) for t in trees]
+    top = trees[0].zs[0]
+    distance, pair, _ = min_distance(bvh_a, bvh_b)
+    contact_list = contacts(bvh_a, bvh_b, args.buffer)
+
+    print("Links                     : {} / {}".format(len(bvh_a.links), len(bvh_b.links)))
+    if pair is not None:
+        print("Minimum distance          : {:.4} (labels {} - {})".format(
+            distance, ' '.join(str(trees[0].labels[v]) for v in bvh_a.links[pair[0]]),
+            ' '.join(str(trees[1].labels[v]) for v in bvh_b.links[pair[1]])))
+    print("Contacts (buffer {:<8}): {}".format(args.buffer, len(contact_list)))
+    print("Overlap volume            : {:.6} / {:.6}".format(
+        overlap_volume(bvh_a, bvh_b, args.buffer, args.samples),
+        overlap_volume(bvh_b, bvh_a, args.buffer, args.samples)))
+    for depth, count in contacts_by_depth(contact_list, top, args.depth_step):
+        print("    depth {:>8.4} - {:<8.4}: {}".format(depth, depth + args.depth_step, count))
+
+    if args.contacts is not None:
+        with compressed.open_text(args.contacts, 'w') as f:
+            for line in generate_contacts_vtk(contact_list, bvh_a, bvh_b, top):
+                print(line, file=f)
+        print("Output file is created : {}".format(args.contacts))
+
+
+if __name__ == "__main__":
+    util.set_terminal_encoding()
+    main()
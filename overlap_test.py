@@ -0,0 +1,36 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+from testing import grown_tree
+import overlap
+
+class TestOverlap(unittest.TestCase):
+    def test_segment_pair_distance(self):
+        d, s, t = overlap.segment_pair_distance((0, 0, 0), (2, 0, 0), (1, -1, 1), (1, 1, 1))
+        self.assertAlmostEqual(d, 1.0)
+        self.assertAlmostEqual(s, 0.5)
+        self.assertAlmostEqual(t, 0.5)
+        # Parallel
+        d, _, _ = overlap.segment_pair_distance((0, 0, 0), (1, 0, 0), (3, 2, 0), (5, 2, 0))
+        self.assertAlmostEqual(d, 8 ** 0.5)
+
+    def test_same_as_brute_force(self):
+        a = overlap.SegmentBVH(grown_tree(150, 0))
+        b = overlap.SegmentBVH(grown_tree(150, 1, 25.0))
+        pairs = [(i, j) for i in xrange(len(a.links)) for j in xrange(len(b.links))]
+        distances = dict(((i, j), overlap.surface_distance(a, i, b, j)[0]) for i, j in pairs)
+
+        distance, pair, _ = overlap.min_distance(a, b)
+        self.assertEqual(distance, min(distances.itervalues()))
+        self.assertEqual(distances[pair], distance)
+
+        buffer = distance + 3.0
+        expected = sorted(p for p in pairs if distances[p] <= buffer)
+        found = [(i, j) for i, j, _, _ in overlap.contacts(a, b, buffer)]
+        self.assertEqual(found, expected)
+        self.assertTrue(len(found) > 0)
+        self.assertTrue(0.0 < overlap.overlap_volume(a, b, buffer) <= a.tree.edge_volume_sum())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+from spatial_hash import SpatialHash
+from treeroot import TreeRoot
+
+
+def merge_duplicates(tree_root, tol, keep=()):
+    """
+    Merge the points closer than tol into the first of them (in index order)
+
+    The stump (index 0) and the points of keep are always kept.
+
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    tol : float
+    keep : [int]
+        Indices which are never merged into another point (e.g. the stumps
+        of the other trees)
+
+    Returns
+    -------
+    reduced : TreeRoot
+    groups : [[int]]
+        groups[k] is the original indices merged into the point k of reduced.
+        groups[k][0] is the representative whose coordinates are kept.
+    """
+    xs, ys, zs = tree_root.xs, tree_root.ys, tree_root.zs
+    n = tree_root.node_count()
+    tol2 = tol * tol
+
+    grid = SpatialHash(tol)
+    rep = _kept(grid, tree_root, keep)
+    for i in xrange(n):
+        if rep[i] is not None: continue
+        x, y, z = xs[i], ys[i], zs[i]
+        for j in grid.candidates(x, y, z, tol):
+            if (xs[j] - x)**2 + (ys[j] - y)**2 + (zs[j] - z)**2 <= tol2:
+                rep[i] = j
+                break
+        if rep[i] is None:
+            rep[i] = i
+            grid.insert(i, x, y, z)
+
+    return collapse(tree_root, rep)
+
+
+def voxel_downsample(tree_root, voxel_size, keep=()):
+    """
+    Keep one point (the first one in index order) per voxel of side voxel_size
+
+    The stump (index 0) and the points of keep are always kept. See
+    merge_duplicates for the return values.
+    """
+    xs, ys, zs = tree_root.xs, tree_root.ys, tree_root.zs
+    n = tree_root.node_count()
+
+    grid = SpatialHash(voxel_size)
+    rep = _kept(grid, tree_root, keep)
+    for i in xrange(n):
+        if rep[i] is not None: continue
+        cell = grid.cell(xs[i], ys[i], zs[i])
+        if len(cell) > 0:
+            rep[i] = cell[0]
+        else:
+            rep[i] = i
+            grid.insert(i, xs[i], ys[i], zs[i])
+
+    return collapse(tree_root, rep)
+
+
+def _kept(grid, tree_root, keep):
+    """
+    Make the stump and the points of keep representatives before the others
+    """
+    rep = [None]*tree_root.node_count()
+    for i in [0] + sorted(set(keep) - set([0])):
+        rep[i] = i
+        grid.insert(i, tree_root.xs[i], tree_root.ys[i], tree_root.zs[i])
+    return rep
+
+
+def collapse(tree_root, rep):
+    """
+    Build the tree which consists only of the representative points
+
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    rep : [int]
+        rep[i] is the original index of the point which i is merged into,
+        and rep[rep[i]] == rep[i]. rep[0] must be 0.
+
+    Returns
+    -------
+    reduced : TreeRoot
+    groups : [[int]]
+    """
+    assert rep[0] == 0, 'The stump must not be merged into another point'
+    n = tree_root.node_count()
+
+    new_index = [None]*n
+    groups = []
+    for i in xrange(n):
+        if rep[i] == i:
+            new_index[i] = len(groups)
+            groups.append([i])
+    for i in xrange(n):
+        if rep[i] != i:
+            new_index[i] = new_index[rep[i]]
+            groups[new_index[i]].append(i)
+
+    # Links inside a group vanish, except the self loop of the stump
+    links = []
+    seen = set()
+    for a, b in tree_root.links:
+        na, nb = new_index[a], new_index[b]
+        if na == nb and a != b: continue
+        if (na, nb) in seen: continue
+        seen.add((na, nb))
+        links.append((na, nb))
+
+    keep = [g[0] for g in groups]
+    label_to_index = {}
+    for label, index in tree_root.label_to_index.iteritems():
+        label_to_index[label] = new_index[index]
+
+    reduced = TreeRoot(
+        links=links,
+        xs=[tree_root.xs[i] for i in keep],
+        ys=[tree_root.ys[i] for i in keep],
+        zs=[tree_root.zs[i] for i in keep],
+        radii=[tree_root.radii[i] for i in keep],
+        labels=[tree_root.labels[i] for i in keep],
+        label_to_index=label_to_index,
+        coef_radius=tree_root.coef_radius
+    )
+    return reduced, groups
+
+
+def merged_labels(tree_root, groups):
+    """
+    Returns
+    -------
+    retval : {int: [int]}
+        Label of a kept point -> labels of the original points merged into it
+    """
+    labels = tree_root.labels
+    return dict((labels[g[0]], [labels[i] for i in g]) for g in groups)
+
+
+def expand_links(links, groups):
+    """
+    Translate the links of a reduced tree into the original indices
+
+    Every merged point is linked to its representative, so that the result
+    can be compared with the original tree by treeroot.compute_accuracy.
+    """
+    expanded = [(groups[a][0], groups[b][0]) for a, b in links]
+    for g in groups:
+        for i in g[1:]:
+            expanded.append((i, g[0]))
+    return expanded
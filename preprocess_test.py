@@ -0,0 +1,52 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+from treeroot import TreeRoot
+import preprocess
+
+def make_tree(points, links, labels):
+    n = len(points)
+    return TreeRoot(links=links, xs=[p[0] for p in points], ys=[p[1] for p in points],
+                    zs=[p[2] for p in points], radii=[1.0] * n, labels=labels,
+                    label_to_index=dict((label, i) for i, label in enumerate(labels)))
+
+class TestPreprocess(unittest.TestCase):
+    def setUp(self):
+        # 1 and 2 are duplicates, 4 is the stump of a second tree next to 3
+        points = [(0.0, 0.0, 0.0), (1.0, 0.0, -1.0), (1.05, 0.0, -1.0), (5.0, 5.0, 0.0), (5.0, 5.05, 0.0),
+                  (2.0, 0.0, -2.0)]
+        links = [(0, 0), (1, 0), (2, 1), (5, 2), (3, 3), (4, 3)]
+        self.tree_root = make_tree(points, links, [10, 11, 12, 13, 14, 15])
+
+    def test_merge_duplicates(self):
+        reduced, groups = preprocess.merge_duplicates(self.tree_root, 0.1)
+        self.assertEqual(groups, [[0], [1, 2], [3, 4], [5]])
+        self.assertEqual(list(reduced.labels), [10, 11, 13, 15])
+        self.assertEqual(reduced.label_to_index, {10: 0, 11: 1, 12: 1, 13: 2, 14: 2, 15: 3})
+        self.assertEqual(reduced.links, [(0, 0), (1, 0), (3, 1), (2, 2)])
+        self.assertEqual(preprocess.merged_labels(self.tree_root, groups), {10: [10], 11: [11, 12], 13: [13, 14], 15: [15]})
+
+        # The stump is kept even though an earlier point is closer than tol
+        reduced, groups = preprocess.merge_duplicates(self.tree_root, 0.1, keep=[4])
+        self.assertEqual(groups, [[0], [1, 2], [4, 3], [5]])
+        self.assertEqual(list(reduced.labels), [10, 11, 14, 15])
+        self.assertEqual(reduced.label_to_index[13], 2)
+        self.assertEqual(reduced.links, [(0, 0), (1, 0), (3, 1), (2, 2)])
+
+    def test_voxel_downsample(self):
+        reduced, groups = preprocess.voxel_downsample(self.tree_root, 2.0)
+        self.assertEqual(groups, [[0], [1, 2], [3, 4], [5]])
+        self.assertEqual(reduced.label_to_index[12], 1)
+        reduced, groups = preprocess.voxel_downsample(self.tree_root, 2.0, keep=[4])
+        self.assertEqual(groups, [[0], [1, 2], [4, 3], [5]])
+        self.assertEqual(reduced.labels[reduced.label_to_index[14]], 14)
+
+    def test_expand_links(self):
+        reduced, groups = preprocess.merge_duplicates(self.tree_root, 0.1)
+        self.assertEqual(sorted(preprocess.expand_links([(1, 0), (3, 1), (2, 0)], groups)),
+                         [(1, 0), (2, 1), (3, 0), (4, 3), (5, 1)])
+        self.assertRaises(AssertionError, preprocess.collapse, self.tree_root, [1, 1, 1, 3, 3, 5])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,68 +3,196 @@ from __future__ import division, print_function, unicode_literals
 
 import codecs
 import math
+import time
 from collections import deque
 import copy
 from reconstructor import *
 
 import sys, os
-sys.path.append(os.pardir)
-from common import util, dat2vtk, swc2vtk
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from common import util, dat2vtk
 from treeroot import TreeRoot
 import treeroot
+import cost_kernel
+import export
 
+# preprocess, multistump and result_cache are imported by main only for the
+# options which need them
 
-def get_args():
+
+def get_args(argv=None):
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('input_dat', type=str)
     parser.add_argument('output', type=str)
     parser.add_argument('--coef-radius', dest='coef_radius', type=float, default=0.05)
-    parser.add_argument('--method', type=str, choices=['an', 'ip', 'dist'], default='ip', help='reconstruct method')
-    parser.add_argument('--output-format', dest='output_format', type=str, choices=['dat', 'vtk'], default='vtk', help='output file format')
+    parser.add_argument('--method', type=str, choices=cost_kernel.kernel_names(), default='ip',
+            help="reconstruct method ('dist' is the minimum spanning tree, others are cost kernels of the Sekihara method)")
+    parser.add_argument('--output-format', dest='output_format', type=str, choices=export.FORMATS, default='vtk', help='output file format')
+    parser.add_argument('--export', dest='exports', type=export.parse_target, action='append', default=[],
+            help='additional output as FORMAT:FILE (FORMAT is one of {}). Can be repeated.'.format(', '.join(export.FORMATS)))
+    parser.add_argument('--jobs', type=int, default=1, help='the number of the parser processes, the writer threads (and the processes with --stumps)')
     parser.add_argument('--param-alpha', dest='param_alpha', type=float, default=1.1)
     parser.add_argument('--param-w', dest='param_w', type=float, default=1.1)
-    return parser.parse_args()
+    parser.add_argument('--metrics', action='store_true',
+            help='add topology metrics (path length, Strahler order, ...) to the vtk output')
+    parser.add_argument('--stumps', type=int, nargs='+',
+            help='labels of the stumps of the trees in the plot (default: only 0)')
+    parser.add_argument('--overlap', type=float, default=0.0,
+            help='with --stumps, share the points up to this much farther than the nearest stump')
+    parser.add_argument('--merge-tol', dest='merge_tol', type=float,
+            help='merge the points closer than this before reconstruction')
+    parser.add_argument('--voxel-size', dest='voxel_size', type=float,
+            help='keep only one point per voxel of this size before reconstruction')
+    parser.add_argument('--bbox', type=float, nargs=6, metavar=('XMIN', 'YMIN', 'ZMIN', 'XMAX', 'YMAX', 'ZMAX'),
+            help='load only the points inside this box (and the stump)')
+    parser.add_argument('--z-range', dest='z_range', type=float, nargs=2, metavar=('ZMIN', 'ZMAX'),
+            help='load only the points in this band of z (and the stump)')
+    parser.add_argument('--compact', action='store_true',
+            help='keep the coordinates and the radii in float32 (same result, less memory)')
+    parser.add_argument('--cache', action='store_true',
+            help='reuse the result of the same input, options and code')
+    parser.add_argument('--cache-dir', dest='cache_dir', type=str, default=None,
+            help='directory of the cache (default: $RR_CACHE_DIR or ~/.cache/rootreconstruct)')
+    parser.add_argument('--cache-size', dest='cache_size', type=float, default=256,
+            help='size cap of the cache in MB')
+    parser.add_argument('--timing', action='store_true',
+            help='print the time of every stage (and the cache hit rate)')
+    return parser.parse_args(argv)
+
 
+def cache_options(args):
+    """
+    The options which change the links or the accuracy
+    """
+    return {"method": args.method, "param_w": args.param_w, "param_alpha": args.param_alpha,
+            "stumps": args.stumps, "overlap": args.overlap,
+            "merge_tol": args.merge_tol, "voxel_size": args.voxel_size,
+            "bbox": args.bbox, "z_range": args.z_range}
 
-def main():
-    args = get_args()
+
+def main(argv=None):
+    args = get_args(argv)
+    timing = []
+    start = time.time()
 
     try:
-        tree_root = TreeRoot.load_dat(args.input_dat)
+        stump_label = args.stumps[0] if args.stumps else 0
+        region = dat2vtk.Region.from_args(args.bbox, args.z_range)
+        tree_root = TreeRoot.load_dat(args.input_dat, stump_label=stump_label, region=region, jobs=args.jobs)
     except IOError as e:
         print("[Error] No such file : {}".format(args.input_dat))
         sys.exit(1)
+    except dat2vtk.MissingStumpError as e:
+        print("[Error] {}".format(e))
+        sys.exit(1)
     except dat2vtk.FileFormatError as e:
         print("[Error] Unexpected file format.")
         sys.exit(1)
     except dat2vtk.FileSyntaxError as e:
         print("[Error] Syntax error.")
         sys.exit(1)
-    
-    if args.method == 'dist':
-        reconstructor = MinimumSpanningTree()
-    elif args.method == 'an':
-        reconstructor = SekiharaMethod(args.param_alpha, inner_product=False)
-    elif args.method == 'ip':
-        reconstructor = SekiharaMethod(args.param_w, inner_product=True)
-
-    reconstructed_tree_root = copy.deepcopy(tree_root)
-    reconstructed_tree_root.links = reconstructor.reconstruct(tree_root)
-
-    if args.output_format == 'dat':
-        reconstructed_tree_root.export_dat(args.output)
-    elif args.output_format == 'vtk':
-        reconstructed_tree_root.export_vtk(args.output)
+    timing.append(("Load", time.time() - start))
+
+    reconstructor = create(args.method, args.param_w, args.param_alpha)
+
+    # Shrink the input before the quadratic reconstruction
+    original_tree_root = tree_root
+    groups = None
+    if args.merge_tol is not None or args.voxel_size is not None:
+        import preprocess
+        # The stumps of --stumps are never merged into another point
+        keep_labels = [label for label in args.stumps or [] if label in tree_root.label_to_index]
+    if args.merge_tol is not None:
+        keep = [tree_root.label_to_index[label] for label in keep_labels]
+        tree_root, groups = preprocess.merge_duplicates(tree_root, args.merge_tol, keep)
+    if args.voxel_size is not None:
+        keep = [tree_root.label_to_index[label] for label in keep_labels]
+        tree_root, voxel_groups = preprocess.voxel_downsample(tree_root, args.voxel_size, keep)
+        if groups is None:
+            groups = voxel_groups
+        else:
+            groups = [sum((groups[i] for i in g), []) for g in voxel_groups]
+    if groups is not None:
+        print("Points : {} -> {}".format(original_tree_root.node_count(), tree_root.node_count()))
+
+    if args.compact:
+        tree_root = tree_root.to_compact()
+
+    cache, cached = None, None
+    if args.cache:
+        import result_cache
+        start = time.time()
+        cache = result_cache.ResultCache(args.cache_dir, int(args.cache_size * (1 << 20)))
+        cache_key = result_cache.make_key(args.input_dat, cache_options(args))
+        cached = cache.get(cache_key)
+        timing.append(("Cache lookup", time.time() - start))
+
+    # Shallow copy shares the coordinates and their cached geometry
+    reconstructed_tree_root = copy.copy(tree_root)
+    start = time.time()
+    if cached is not None:
+        reconstructed_tree_root.links = cached[0]
+        print("Result is taken from the cache.")
+    elif args.stumps:
+        # One reconstruction per tree
+        for label in args.stumps:
+            if label not in tree_root.label_to_index:
+                print("[Error] No such label : {}".format(label))
+                sys.exit(1)
+        stumps = [tree_root.label_to_index[label] for label in args.stumps]
+        import multistump
+        reconstructed_tree_root.links = multistump.reconstruct(
+            tree_root, stumps, args.method, args.param_w, args.param_alpha, args.overlap, args.jobs)
+    else:
+        reconstructed_tree_root.links = reconstructor.reconstruct(tree_root)
+        if args.compact:
+            stats = reconstructor.guard_stats
+            print("Recomputed in float64     : {} / {}".format(stats["recomputed"], stats["decisions"]))
+    timing.append(("Reconstruct", time.time() - start))
+
+    # Every output is written from the same tree in one stage
+    start = time.time()
+    targets = [(args.output_format, args.output)] + args.exports
+    export.export(reconstructed_tree_root, targets, args.jobs, args.metrics)
     print("Output file is created.\n");
+    timing.append(("Export", time.time() - start))
 
-    if len(tree_root.links) > 0:
-        accuracy = treeroot.compute_accuracy(
-            reconstructed_tree_root,
-            tree_root
-        )
+    start = time.time()
+    if cached is not None:
+        accuracy = cached[1]
+    else:
+        reconstructed_links = reconstructed_tree_root.links
+        if groups is not None:
+            # Evaluate with the merged points attached to their representatives
+            links = reconstructed_tree_root.links
+            reconstructed_tree_root = copy.copy(original_tree_root)
+            reconstructed_tree_root.links = preprocess.expand_links(links, groups)
+            tree_root = original_tree_root
+
+        accuracy = None
+        if len(tree_root.links) > 0:
+            accuracy = treeroot.compute_accuracy(
+                reconstructed_tree_root,
+                tree_root
+            )
+        if cache is not None:
+            cache.put(cache_key, reconstructed_links, accuracy)
+
+    if accuracy is not None:
         print("Accuracy (Edge)           : {:.3%}".format(accuracy["edge_count"]))
         print("Accuracy (Volume)         : {:.3%}".format(accuracy["edge_volume"]))
+    timing.append(("Accuracy", time.time() - start))
+
+    if args.timing:
+        print("")
+        for name, seconds in timing:
+            print("{:<26}: {:.3f} s".format(name, seconds))
+        if cache is not None:
+            stats = cache.stats()
+            print("Cache                     : {} (hit rate {:.1%} of {} lookups)".format(
+                "hit" if cached is not None else "miss", result_cache.hit_rate(stats),
+                stats["hits"] + stats["misses"]))
 
 
 if __name__ == "__main__":
@@ -3,10 +3,11 @@ from __future__ import division, print_function, unicode_literals
 import math
 
 import sys, os
-sys.path.append(os.pardir)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from common import util
 from treeroot import TreeRoot
 from disjoint_set import DisjointSet
+import cost_kernel
 
 def inner_product(a, b):
     util.assert_same_size(a=a, b=b)
@@ -17,30 +18,103 @@ def inner_product(a, b):
     return dot
 
 
+def row_geometry(tree_root, i, candidates):
+    """
+    Compute cos(theta) and the distance from point i to every candidate at once
+
+    Parameters
+    ----------
+    tree_root : TreeRoot
+    i : int
+    candidates : [int]
+
+    Returns
+    -------
+    cos_thetas : [float]
+    dists : [float]
+    """
+    xs, ys, zs = tree_root.xs, tree_root.ys, tree_root.zs
+    sx, sy, sz = xs[i], ys[i], zs[i]
+    # The vector to the center depends only on i, so it is cached in tree_root
+    center_dx, center_dy, center_dz = tree_root.center_vectors()
+    vcx, vcy, vcz = center_dx[i], center_dy[i], center_dz[i]
+    abs_center = tree_root.center_distances()[i]
+
+    sqrt = math.sqrt
+    vecs = [(xs[j] - sx, ys[j] - sy, zs[j] - sz) for j in candidates]
+    dists = [sqrt(vx*vx + vy*vy + vz*vz) for vx, vy, vz in vecs]
+
+    if abs_center == 0.0:
+        return [1.0]*len(candidates), dists
+
+    dots = [vx*vcx + vy*vcy + vz*vcz for vx, vy, vz in vecs]
+    cos_thetas = [max(-1.0, min(dot / (abs_dst * abs_center), 1.0)) if abs_dst != 0.0 else 1.0
+                  for dot, abs_dst in zip(dots, dists)]
+    return cos_thetas, dists
+
+
+def row_distances(tree_root, i, candidates):
+    """
+    Same dists as row_geometry, without the angles
+    """
+    xs, ys, zs = tree_root.xs, tree_root.ys, tree_root.zs
+    sx, sy, sz = xs[i], ys[i], zs[i]
+    sqrt = math.sqrt
+    dists = []
+    for j in candidates:
+        vx, vy, vz = xs[j] - sx, ys[j] - sy, zs[j] - sz
+        dists.append(sqrt(vx*vx + vy*vy + vz*vz))
+    return dists
+
+
+def kernel_max_distance(kernel, tree_root):
+    """
+    max_d given to the kernel (None if it uses only the distance)
+    """
+    return None if kernel.distance_only else tree_root.max_distance()
+
+
+def row_costs(kernel, tree_root, i, candidates, param, max_d):
+    """
+    Cost from point i to every candidate (see cost_kernel.register_kernel)
+    """
+    radii = tree_root.radii
+    if kernel.distance_only:
+        cos_thetas, dists = None, row_distances(tree_root, i, candidates)
+    else:
+        cos_thetas, dists = row_geometry(tree_root, i, candidates)
+    return kernel(cos_thetas, dists, radii[i], [radii[j] for j in candidates], param, max_d)
+
+
 class MinimumSpanningTree:
-    def __init__(self):
-        pass
+    def __init__(self, kernel='dist', param=0.0):
+        self.param = param
+        self.kernel = cost_kernel.get_kernel(kernel)
 
-    def reconstruct(self, tree_root):
+    def reconstruct(self, tree_root, on_link=None):
         """
         Parameters
         ----------
-        xs : [float]
-        ys : [float]
-        zs : [float]
+        tree_root : TreeRoot
+        on_link : callable or None
+            Called with (src, dst) when a link is made (see online_accuracy)
 
         Returns
         -------
         links : [(int, int)]
-        biggest_root : int
         """
         util.assert_same_size(xs=tree_root.xs, ys=tree_root.ys, zs=tree_root.zs)
+        import compact
+        if compact.is_compact(tree_root):
+            self.guard_stats = {}
+            return compact.minimum_spanning_tree(tree_root, self.kernel, self.param, self.guard_stats, on_link)
         n = tree_root.node_count()
+        max_d = kernel_max_distance(self.kernel, tree_root)
         es = []
         for i in xrange(n):
-            for j in xrange(i + 1, n):
-                l2norm = tree_root.distance(i, j)
-                es.append((math.sqrt(l2norm), i, j))
+            candidates = range(i + 1, n)
+            costs = row_costs(self.kernel, tree_root, i, candidates, self.param, max_d)
+            es.extend(zip(costs, [i]*len(candidates), candidates))
 
         es.sort(key=lambda tup: tup[0])
         disjoint_set = DisjointSet(n)
@@ -49,66 +123,90 @@ class MinimumSpanningTree:
             if not disjoint_set.same(src, dst):
                 disjoint_set.merge(src, dst)
                 links.append((src, dst))
+                if on_link is not None: on_link(src, dst)
         return links
 
 
 class SekiharaMethod:
-    def __init__(self, param, inner_product=True):
+    def __init__(self, param, inner_product=True, kernel=None):
+        """
+        Parameters
+        ----------
+        param : float
+        inner_product : bool
+            Use 'ip' kernel if True, otherwise 'an' kernel.
+            Ignored when kernel is given.
+        kernel : string
+            Name of a kernel registered in cost_kernel
+        """
         self.param = param
-        if inner_product:
-            self.cost_func = lambda cos_theta, abs_dst, max_d : param * (1.0 - cos_theta) + abs_dst / max_d
-        else:
-            self.cost_func = lambda cos_theta, abs_dst, max_d : math.acos(cos_theta) + param * abs_dst / max_d
+        if kernel is None:
+            kernel = 'ip' if inner_product else 'an'
+        self.kernel = cost_kernel.get_kernel(kernel)
+
+    def reconstruct(self, tree_root, on_link=None):
+        """
+        Parameters
+        ----------
+        tree_root : TreeRoot
+        on_link : callable or None
+            Called with (i, next) when point i is linked to next
+            (see online_accuracy)
+
+        Returns
+        -------
+        links : [(int, int)]
+        """
+        import compact
+        if compact.is_compact(tree_root):
+            self.guard_stats = {}
+            return compact.sekihara(tree_root, self.kernel, self.param, self.guard_stats, on_link)
 
-    def reconstruct(self, tree_root):
         links = []
 
         n = tree_root.node_count()
-        max_d = tree_root.max_distance()
+        max_d = kernel_max_distance(self.kernel, tree_root)
         UF = DisjointSet(n)
         order_by_dist = tree_root.order_by_dist(reverse=True)
+        radii = tree_root.radii
 
-        center = tree_root.vectorized_center_pos()
         for t in xrange(0, n-1):
             i = order_by_dist[t][0]
-            cost = float('inf')
-            next_index = -1
-            src = tree_root.vectorized_node_pos(i)
+            radius_i = radii[i]
 
-            for j in xrange(0, n):
-                if i == j: continue
-                if j != 0 and tree_root.radii[i] > 1.3 * tree_root.radii[j]: continue
+            # Avoid making a cycle
+            candidates = [j for j in xrange(0, n)
+                          if j != i and (j == 0 or radius_i <= 1.3 * radii[j]) and not UF.same(i, j)]
+            if len(candidates) == 0: continue
 
-                # Avoid making a cycle
-                if UF.same(i, j): continue
+            costs = row_costs(self.kernel, tree_root, i, candidates, self.param, max_d)
 
-                dst = tree_root.vectorized_node_pos(j)
-                c = self._sekihara_method(src, dst, center, self.cost_func, max_d)
-
-                if cost > c:
-                    cost = c
-                    next_index = j
-
-            if next_index != -1:
+            # The first one wins a tie
+            k = min(xrange(len(costs)), key=costs.__getitem__)
+            if costs[k] < float('inf'):
+                next_index = candidates[k]
                 links.append((i, next_index))
                 UF.merge(i, next_index)
+                if on_link is not None: on_link(i, next_index)
 
         return links
 
-    def _sekihara_method(self, src, dst, center, cost_func, max_d):
-        vec_dst = [dst[0] - src[0], dst[1] - src[1], dst[2] - src[2]]
-        abs_dst = math.sqrt(inner_product(vec_dst, vec_dst))
-
-        vec_center = [center[0] - src[0], center[1] - src[1], center[2] - src[2]]
-        abs_center = math.sqrt(inner_product(vec_center, vec_center))
-
-        dot = inner_product(vec_dst, vec_center)
-
-        if abs_dst == 0.0 or abs_center == 0.0:
-            cos_theta = 1.0
-        else:
-            cos_theta = dot / (abs_dst * abs_center)
-            if cos_theta > 0.0: cos_theta = min(cos_theta, 1.0)
-            else:               cos_theta = max(cos_theta, -1.0)
 
-        return cost_func(cos_theta, abs_dst, max_d)
+def create(method, param_w=1.1, param_alpha=1.1):
+    """
+    Create the reconstructor selected by --method of reconstruct.py
+
+    Parameters
+    ----------
+    method : string
+        'dist' for the minimum spanning tree, otherwise a name of cost kernel
+    param_w : float
+    param_alpha : float
+        The parameter of 'an'
+    """
+    if method == 'dist':
+        return MinimumSpanningTree()
+    elif method == 'an':
+        return SekiharaMethod(param_alpha, kernel=method)
+    else:
+        return SekiharaMethod(param_w, kernel=method)
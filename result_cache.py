@@ -0,0 +1,293 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# On-disk cache of reconstruction results
+#
+# An entry is keyed by the SHA-1 of the input file, the options of the
+# reconstruction and the source of the engine, so editing the code drops the
+# old results. Entries are evicted in least recently used order (file mtime)
+# when the cache grows over its size cap.
+#
+# Entry layout (*.rrc, little endian)
+#   header   : magic (4 bytes) version (uint16) has_accuracy (uint16) links (uint64)
+#   accuracy : edge_count, edge_volume (float64)
+#   links    : (int64, int64) * links
+
+import argparse
+import array
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from common import util
+
+MAGIC = b'RRC\x00'
+VERSION = 1
+HEADER = struct.Struct(str('<4sHHQdd'))
+SUFFIX = '.rrc'
+
+# The source files which decide the result of a reconstruction (the links
+# and the accuracy): the engines, the preprocessing and the loaders
+ENGINE_SOURCES = ['reconstructor.py', 'cost_kernel.py', 'disjoint_set.py', 'treeroot.py',
+                  'compact.py', 'preprocess.py', 'multistump.py', 'spatial_hash.py',
+                  'geometry_summary.py',
+                  os.path.join('common', 'dat2vtk.py'), os.path.join('common', 'rrb.py'),
+                  os.path.join('common', 'chunked.py'), os.path.join('common', 'compressed.py'),
+                  os.path.join('common', 'topology.py')]
+
+
+def default_directory():
+    return os.environ.get('RR_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'rootreconstruct'))
+
+
+def file_digest(fname, block=1 << 20):
+    h = hashlib.sha1()
+    with open(fname, 'rb') as f:
+        while True:
+            data = f.read(block)
+            if len(data) == 0: break
+            h.update(data)
+    return h.hexdigest()
+
+
+def source_digest(base, sources):
+    """
+    SHA-1 of the names and the contents of the source files under base
+    """
+    h = hashlib.sha1()
+    for name in sources:
+        h.update(name.encode('utf_8'))
+        h.update(file_digest(os.path.join(base, name)).encode('ascii'))
+    return h.hexdigest()
+
+
+_engine_digest = []
+
+
+def engine_digest():
+    """
+    SHA-1 of ENGINE_SOURCES (computed once)
+    """
+    if len(_engine_digest) == 0:
+        _engine_digest.append(source_digest(os.path.dirname(os.path.abspath(__file__)), ENGINE_SOURCES))
+    return _engine_digest[0]
+
+
+def make_key(fname, options, engine=None):
+    """
+    Parameters
+    ----------
+    fname : string
+        The input file
+    options : {string: object}
+        Everything which changes the result (method, parameters, ...).
+        Must be serializable as JSON.
+    engine : string
+        Digest of the engine (default: engine_digest())
+
+    Returns
+    -------
+    key : string
+    """
+    if engine is None:
+        engine = engine_digest()
+    h = hashlib.sha1()
+    h.update(file_digest(fname).encode('ascii'))
+    h.update(json.dumps(options, sort_keys=True).encode('utf_8'))
+    h.update(engine.encode('ascii'))
+    return h.hexdigest()
+
+
+def _links_array(links):
+    a = array.array(str('l'))
+    assert a.itemsize == 8, 'rrc needs 8 byte C long'
+    for l in links:
+        a.extend(l)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a
+
+
+def encode(links, accuracy=None):
+    if accuracy is None:
+        header = HEADER.pack(MAGIC, VERSION, 0, len(links), 0.0, 0.0)
+    else:
+        header = HEADER.pack(MAGIC, VERSION, 1, len(links), accuracy["edge_count"], accuracy["edge_volume"])
+    return header + _links_array(links).tostring()
+
+
+def decode(data):
+    """
+    Returns
+    -------
+    links : [(int, int)]
+    accuracy : {"edge_count": float, "edge_volume": float} or None
+    """
+    if len(data) < HEADER.size:
+        raise ValueError('Broken cache entry')
+    magic, version, has_accuracy, n, edge_count, edge_volume = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or len(data) != HEADER.size + 16 * n:
+        raise ValueError('Broken cache entry')
+    a = array.array(str('l'))
+    a.fromstring(data[HEADER.size:])
+    if sys.byteorder != 'little':
+        a.byteswap()
+    links = zip(a[0::2], a[1::2])
+    accuracy = {"edge_count": edge_count, "edge_volume": edge_volume} if has_accuracy else None
+    return links, accuracy
+
+
+class ResultCache(object):
+    def __init__(self, directory=None, max_bytes=256 << 20):
+        self.directory = directory or default_directory()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        """
+        Returns
+        -------
+        entry : (links, accuracy) or None
+            See decode
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = decode(f.read())
+        except (IOError, ValueError):
+            self.misses += 1
+            self._count('misses')
+            return None
+        # The mtime is the time of the last use
+        os.utime(path, None)
+        self.hits += 1
+        self._count('hits')
+        return entry
+
+    def put(self, key, links, accuracy=None):
+        # Write then rename, so that a reader never sees a partial entry
+        path = self._path(key)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(encode(links, accuracy))
+        os.rename(tmp, path)
+        self.evict()
+
+    def entries(self):
+        """
+        Returns
+        -------
+        entries : [(string, int, float)]
+            (key, size in bytes, time of the last use), most recently used first
+        """
+        ret = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX): continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            ret.append((name[:-len(SUFFIX)], st.st_size, st.st_mtime))
+        ret.sort(key=lambda e: -e[2])
+        return ret
+
+    def evict(self):
+        """
+        Remove the least recently used entries over max_bytes
+
+        Returns
+        -------
+        removed : int
+        """
+        total = 0
+        removed = 0
+        for key, size, _ in self.entries():
+            total += size
+            if total > self.max_bytes:
+                removed += self.remove(key)
+        return removed
+
+    def remove(self, key):
+        try:
+            os.remove(self._path(key))
+            return 1
+        except OSError:
+            return 0
+
+    def purge(self, older_than=None):
+        """
+        Remove every entry, or the entries not used for older_than seconds
+        """
+        now = time.time()
+        return sum(self.remove(key) for key, _, used in self.entries()
+                   if older_than is None or now - used > older_than)
+
+    def _stats_path(self):
+        return os.path.join(self.directory, 'stats.json')
+
+    def _count(self, name):
+        # Cumulative counters for the hit rate (best effort)
+        stats = self.stats()
+        stats[name] += 1
+        try:
+            with open(self._stats_path(), 'w') as f:
+                json.dump(stats, f)
+        except IOError:
+            pass
+
+    def stats(self):
+        """
+        Returns
+        -------
+        stats : {"hits": int, "misses": int}
+            Counted over every run using this directory
+        """
+        try:
+            with open(self._stats_path()) as f:
+                stats = json.load(f)
+            return {"hits": int(stats["hits"]), "misses": int(stats["misses"])}
+        except (IOError, ValueError, KeyError):
+            return {"hits": 0, "misses": 0}
+
+
+def hit_rate(stats):
+    total = stats["hits"] + stats["misses"]
+    return stats["hits"] / total if total > 0 else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['list', 'purge', 'stats'])
+    parser.add_argument('--dir', dest='directory', type=str, default=None,
+            help='cache directory (default: $RR_CACHE_DIR or ~/.cache/rootreconstruct)')
+    parser.add_argument('--older-than', dest='older_than', type=float,
+            help='with purge, remove only the entries not used for this many days')
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.directory)
+    if args.command == 'list':
+        entries = cache.entries()
+        for key, size, used in entries:
+            print("{}  {:>10}  {}".format(key, size, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(used))))
+        print("{} entries, {} bytes in {}".format(len(entries), sum(e[1] for e in entries), cache.directory))
+    elif args.command == 'purge':
+        older_than = args.older_than * 86400 if args.older_than is not None else None
+        print("Removed {} entries".format(cache.purge(older_than)))
+    else:
+        stats = cache.stats()
+        print("Hits {} Misses {} (hit rate {:.1%})".format(stats["hits"], stats["misses"], hit_rate(stats)))
+
+
+if __name__ == "__main__":
+    util.set_terminal_encoding()
+    main()
@@ -0,0 +1,64 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+import result_cache
+from result_cache import ResultCache
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_encode(self):
+        links = [(1, 0), (2, 1), (3, 1)]
+        accuracy = {"edge_count": 0.5, "edge_volume": 0.25}
+        self.assertEqual(result_cache.decode(result_cache.encode(links, accuracy)), (links, accuracy))
+        self.assertEqual(result_cache.decode(result_cache.encode([], None)), ([], None))
+        self.assertRaises(ValueError, result_cache.decode, b'RRC')
+
+    def test_lru(self):
+        links = [(i, i - 1) for i in xrange(1, 100)]
+        size = len(result_cache.encode(links))
+        cache = ResultCache(self.directory, max_bytes=2 * size)
+        cache.put('a', links)
+        cache.put('b', links)
+        # Make 'a' the most recently used
+        os.utime(os.path.join(self.directory, 'b' + result_cache.SUFFIX), (0, 0))
+        self.assertEqual(cache.get('a'), (links, None))
+        cache.put('c', links)
+        self.assertEqual(sorted(key for key, _, _ in cache.entries()), ['a', 'c'])
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.purge(), 2)
+
+    def test_engine_sources(self):
+        base = os.path.dirname(os.path.abspath(result_cache.__file__))
+        for name in result_cache.ENGINE_SOURCES:
+            self.assertTrue(os.path.exists(os.path.join(base, name)), name)
+
+        # A copy of the sources, one of which is edited
+        os.mkdir(os.path.join(self.directory, 'common'))
+        for name in result_cache.ENGINE_SOURCES:
+            shutil.copy(os.path.join(base, name), os.path.join(self.directory, name))
+        engine = result_cache.source_digest(self.directory, result_cache.ENGINE_SOURCES)
+        self.assertEqual(engine, result_cache.engine_digest())
+
+        fname = os.path.join(self.directory, 'a.dat')
+        with open(fname, 'w') as f:
+            f.write('0 0 0 1.0 0 0\n')
+        key = result_cache.make_key(fname, {"method": "ip"})
+        self.assertEqual(result_cache.make_key(fname, {"method": "ip"}, engine), key)
+        for name in ['spatial_hash.py', os.path.join('common', 'chunked.py')]:
+            with open(os.path.join(self.directory, name), 'a') as f:
+                f.write('\n')
+            edited = result_cache.source_digest(self.directory, result_cache.ENGINE_SOURCES)
+            self.assertNotEqual(result_cache.make_key(fname, {"method": "ip"}, edited), key)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,253 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import copy
+import json
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+import Queue
+
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from common import util, dat2vtk
+from treeroot import TreeRoot
+import treeroot
+import reconstructor
+import export
+
+
+class TreeCache(object):
+    """
+    LRU cache of loaded TreeRoot objects
+
+    A tree is keyed by its file (path, size and modification time) and the
+    radius coefficient, so an updated file is loaded again. The cached tree
+    keeps its geometry (center vectors, max_distance, ...) between requests.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._trees = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, fname, coef_radius=0.5):
+        path = os.path.abspath(fname)
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime, coef_radius)
+        with self._lock:
+            if key in self._trees:
+                self.hits += 1
+                tree_root = self._trees.pop(key)
+                self._trees[key] = tree_root
+                return tree_root
+            self.misses += 1
+
+        tree_root = TreeRoot.load_dat(path, coef_radius)
+        with self._lock:
+            self._trees[key] = tree_root
+            while len(self._trees) > self.capacity:
+                self._trees.popitem(last=False)
+        return tree_root
+
+    def status(self):
+        with self._lock:
+            return {"size": len(self._trees), "capacity": self.capacity,
+                    "hits": self.hits, "misses": self.misses,
+                    "files": [key[0] for key in self._trees]}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job(object):
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args)
+        except Exception as e:
+            self.error = e
+            traceback.print_exc()
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class WorkerPool(object):
+    """
+    A fixed number of worker threads fed by a bounded request queue
+    """
+    def __init__(self, workers, max_pending):
+        self._queue = Queue.Queue(max_pending)
+        for _ in xrange(workers):
+            t = threading.Thread(target=self._work)
+            t.daemon = True
+            t.start()
+        self.workers = workers
+
+    def _work(self):
+        while True:
+            self._queue.get().run()
+            self._queue.task_done()
+
+    def submit(self, func, *args):
+        job = Job(func, args)
+        try:
+            self._queue.put_nowait(job)
+        except Queue.Full:
+            raise QueueFull
+        return job
+
+    def pending(self):
+        return self._queue.qsize()
+
+
+def accuracy_dict(reconstructed_tree_root, tree_root):
+    if len(tree_root.links) == 0:
+        return None
+    return treeroot.compute_accuracy(reconstructed_tree_root, tree_root)
+
+
+class Service(object):
+    """
+    Jobs of the server. Every request is a dict decoded from JSON.
+    """
+    def __init__(self, cache):
+        self.cache = cache
+
+    def reconstruct(self, req):
+        """
+        {"input": path, "method": "ip", "param_w": 1.1, "param_alpha": 1.1,
+         "coef_radius": 0.5, "outputs": [[format, path], ...]}
+        """
+        tree_root = self.cache.get(req["input"], req.get("coef_radius", 0.5))
+        r = reconstructor.create(req.get("method", "ip"), req.get("param_w", 1.1), req.get("param_alpha", 1.1))
+
+        # Shallow copy shares the coordinates and their cached geometry
+        reconstructed_tree_root = copy.copy(tree_root)
+        reconstructed_tree_root.links = r.reconstruct(tree_root)
+
+        outputs = [tuple(t) for t in req.get("outputs", [])]
+        if len(outputs) > 0:
+            export.export(reconstructed_tree_root, outputs, metrics=req.get("metrics", False))
+        return {"links": reconstructed_tree_root.links,
+                "accuracy": accuracy_dict(reconstructed_tree_root, tree_root)}
+
+    def accuracy(self, req):
+        """
+        {"input": path of the ground truth, "reconstructed": path}
+        """
+        tree_root = self.cache.get(req["input"], req.get("coef_radius", 0.5))
+        reconstructed_tree_root = self.cache.get(req["reconstructed"], req.get("coef_radius", 0.5))
+        return {"accuracy": accuracy_dict(reconstructed_tree_root, tree_root)}
+
+    def export(self, req):
+        """
+        {"input": path, "outputs": [[format, path], ...]}
+        """
+        tree_root = self.cache.get(req["input"], req.get("coef_radius", 0.5))
+        outputs = [tuple(t) for t in req["outputs"]]
+        return {"outputs": export.export(tree_root, outputs, metrics=req.get("metrics", False))}
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Set by serve()
+    service = None
+    pool = None
+
+    def _reply(self, code, obj):
+        body = json.dumps(obj)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/status':
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, {"cache": self.service.cache.status(),
+                          "workers": self.pool.workers,
+                          "pending": self.pool.pending()})
+
+    def do_POST(self):
+        name = self.path.strip('/')
+        if name not in ('reconstruct', 'accuracy', 'export'):
+            return self._reply(404, {"error": "not found"})
+        try:
+            length = int(self.headers.getheader('Content-Length', 0))
+            req = json.loads(self.rfile.read(length))
+        except ValueError:
+            return self._reply(400, {"error": "invalid JSON"})
+        if not isinstance(req, dict):
+            return self._reply(400, {"error": "expected a JSON object"})
+
+        try:
+            job = self.pool.submit(getattr(self.service, name), req)
+        except QueueFull:
+            return self._reply(503, {"error": "too many requests"})
+
+        try:
+            self._reply(200, job.wait())
+        except (IOError, OSError) as e:
+            self._reply(404, {"error": "No such file : {}".format(getattr(e, 'filename', e))})
+        except (KeyError, ValueError, dat2vtk.FileFormatError, dat2vtk.FileSyntaxError) as e:
+            self._reply(400, {"error": "{}: {}".format(type(e).__name__, e)})
+        except Exception as e:
+            self._reply(500, {"error": "{}: {}".format(type(e).__name__, e)})
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def make_server(host='127.0.0.1', port=8765, workers=2, max_pending=16, cache_size=8):
+    Handler.service = Service(TreeCache(cache_size))
+    Handler.pool = WorkerPool(workers, max_pending)
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def serve(host='127.0.0.1', port=8765, workers=2, max_pending=16, cache_size=8):
+    server = make_server(host, port, workers, max_pending, cache_size)
+    print("Listening on http://{}:{}".format(host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+            help='address to listen on (localhost only by default)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2,
+            help='the number of jobs run at the same time')
+    parser.add_argument('--queue', type=int, default=16,
+            help='the number of jobs waiting before the server answers 503')
+    parser.add_argument('--cache', type=int, default=8,
+            help='the number of trees kept in memory')
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.queue, args.cache)
+
+
+if __name__ == "__main__":
+    util.set_terminal_encoding()
+    main()
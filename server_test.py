@@ -0,0 +1,110 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib2
+import server
+
+LINES = ['0.0 0.0 0.0 4.0 0 0', '1.0 0.0 -1.0 2.0 1 0', '1.0 1.0 -2.0 1.0 2 1']
+
+class TestTreeCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name):
+        fname = os.path.join(self.directory, name)
+        with io.open(fname, 'w') as f:
+            f.write('\n'.join(LINES) + '\n')
+        return fname
+
+    def test_lru(self):
+        a, b, c = self.write('a.dat'), self.write('b.dat'), self.write('c.dat')
+        cache = server.TreeCache(2)
+        tree_a = cache.get(a)
+        cache.get(b)
+        self.assertIs(cache.get(a), tree_a)
+        # b is the least recently used
+        cache.get(c)
+        status = cache.status()
+        self.assertEqual(status["files"], [a, c])
+        self.assertEqual((status["hits"], status["misses"]), (1, 3))
+        # Another radius coefficient is another tree
+        self.assertIsNot(cache.get(a, 0.25), tree_a)
+        self.assertEqual(cache.status()["size"], 2)
+
+        # An updated file is loaded again
+        st = os.stat(a)
+        os.utime(a, (st.st_atime, st.st_mtime + 10))
+        self.assertIsNot(cache.get(a), tree_a)
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, 'a.dat')
+        with io.open(self.input, 'w') as f:
+            f.write('\n'.join(LINES) + '\n')
+        # The request log and the tracebacks of the failed jobs
+        self.stderr = sys.stderr
+        sys.stderr = io.BytesIO()
+        self.server = server.make_server('127.0.0.1', 0, workers=1, max_pending=4)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        sys.stderr = self.stderr
+        shutil.rmtree(self.directory)
+
+    def post(self, name, body):
+        try:
+            response = urllib2.urlopen(self.url + '/' + name, body)
+        except urllib2.HTTPError as e:
+            response = e
+        return response.getcode(), json.loads(response.read())
+
+    def test_requests(self):
+        code, result = self.post('reconstruct', json.dumps({"input": self.input}))
+        self.assertEqual(code, 200)
+        self.assertEqual(sorted(map(tuple, result["links"])), [(1, 0), (2, 1)])
+        self.assertEqual(self.post('export', json.dumps({"input": self.input}))[0], 400)
+        self.assertEqual(self.post('accuracy', json.dumps({"input": "missing.dat"}))[0], 404)
+        self.assertEqual(self.post('unknown', '{}')[0], 404)
+        status = json.loads(urllib2.urlopen(self.url + '/status').read())
+        self.assertEqual(status["cache"]["misses"], 1)
+
+    def test_bad_body(self):
+        self.assertEqual(self.post('reconstruct', '{"input": '), (400, {"error": "invalid JSON"}))
+        for body in ('[]', '"a.dat"', '1', 'null'):
+            self.assertEqual(self.post('reconstruct', body), (400, {"error": "expected a JSON object"}))
+
+    def test_queue_full(self):
+        # The only worker waits, so the queue fills up
+        event = threading.Event()
+        pool = server.Handler.pool
+        pool.submit(event.wait)
+        while pool.pending() > 0:
+            time.sleep(0.01)
+        for _ in xrange(4):
+            pool.submit(lambda: None)
+        self.assertRaises(server.QueueFull, pool.submit, lambda: None)
+        code, result = self.post('reconstruct', json.dumps({"input": self.input}))
+        self.assertEqual((code, result), (503, {"error": "too many requests"}))
+        event.set()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,337 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import math
+
+
+class SpatialHash(object):
+    """
+    Uniform grid of cubic cells which maps a cell to the points inside it
+    """
+    def __init__(self, cell_size):
+        if not cell_size > 0.0:
+            raise ValueError('cell_size should be positive : {}'.format(cell_size))
+        self.cell_size = cell_size
+        self._cells = {}
+
+    def key(self, x, y, z):
+        s = self.cell_size
+        return (int(math.floor(x / s)), int(math.floor(y / s)), int(math.floor(z / s)))
+
+    def insert(self, index, x, y, z):
+        k = self.key(x, y, z)
+        if k in self._cells:
+            self._cells[k].append(index)
+        else:
+            self._cells[k] = [index]
+
+    def cell(self, x, y, z):
+        return self._cells.get(self.key(x, y, z), [])
+
+    def candidates(self, x, y, z, radius):
+        """
+        Iterate over the points in the cells overlapping the cube [p - radius, p + radius]
+
+        The caller has to check the exact distance.
+        """
+        x0, y0, z0 = self.key(x - radius, y - radius, z - radius)
+        x1, y1, z1 = self.key(x + radius, y + radius, z + radius)
+        cells = self._cells
+        for kx in xrange(x0, x1 + 1):
+            for ky in xrange(y0, y1 + 1):
+                for kz in xrange(z0, z1 + 1):
+                    k = (kx, ky, kz)
+                    if k in cells:
+                        for index in cells[k]:
+                            yield index
+
+    def __len__(self):
+        return sum(len(v) for v in self._cells.itervalues())
+
+
+def segment_distance(px, py, pz, ax, ay, az, bx, by, bz):
+    """
+    Returns
+    -------
+    distance : float
+        From p to the segment ab
+    t : float
+        Position of the closest point (0 at a, 1 at b)
+    """
+    dx, dy, dz = bx - ax, by - ay, bz - az
+    sq = dx*dx + dy*dy + dz*dz
+    t = 0.0
+    if sq > 0.0:
+        t = ((px - ax)*dx + (py - ay)*dy + (pz - az)*dz) / sq
+        t = min(1.0, max(0.0, t))
+    cx, cy, cz = ax + t*dx, ay + t*dy, az + t*dz
+    return math.sqrt((px - cx)**2 + (py - cy)**2 + (pz - cz)**2), t
+
+
+def _segment_hits_box(a, b, lo, hi):
+    """
+    Slab test of the segment ab against the box [lo, hi]
+    """
+    t0, t1 = 0.0, 1.0
+    for k in xrange(3):
+        d = b[k] - a[k]
+        if d == 0.0:
+            if a[k] < lo[k] or a[k] > hi[k]:
+                return False
+            continue
+        u0, u1 = (lo[k] - a[k]) / d, (hi[k] - a[k]) / d
+        if u0 > u1:
+            u0, u1 = u1, u0
+        t0, t1 = max(t0, u0), min(t1, u1)
+        if t0 > t1:
+            return False
+    return True
+
+
+class TreeSpatialIndex(object):
+    """
+    Box, radius and nearest queries over the nodes and the links of a tree
+
+    The nodes are hashed when the index is built. The links are hashed on the
+    first link query, into every cell overlapped by their bounding box grown
+    by the larger radius of their ends. A link is treated as a truncated cone:
+    its distance to a point is the distance to the centerline minus the radius
+    interpolated at the closest point (at least 0).
+
+    Use TreeRoot.spatial_index() which keeps the index until the coordinates
+    or the links are replaced.
+    """
+    def __init__(self, xs, ys, zs, radii, links, cell_size=None):
+        n = len(xs)
+        if cell_size is None:
+            cell_size = self.default_cell_size(xs, ys, zs)
+        self.xs, self.ys, self.zs, self.radii = xs, ys, zs, radii
+        self.links = [(a, b) for a, b in links if a != b]
+        self.nodes = SpatialHash(cell_size)
+        for i in xrange(n):
+            self.nodes.insert(i, xs[i], ys[i], zs[i])
+        self._node_bounds = self._key_bounds(self.nodes)
+        self._segments = None
+        self._segment_bounds = None
+        self._max_radius = max(radii) if n > 0 else 0.0
+
+    @staticmethod
+    def default_cell_size(xs, ys, zs):
+        """
+        About two points per cell when they fill their bounding box
+        """
+        n = len(xs)
+        if n == 0:
+            return 1.0
+        extents = [max(v) - min(v) for v in (xs, ys, zs)]
+        positive = [e for e in extents if e > 0.0]
+        if len(positive) == 0:
+            return 1.0
+        volume = 1.0
+        for e in positive:
+            volume *= e
+        return (2.0 * volume / n) ** (1.0 / len(positive))
+
+    def _segment_hash(self):
+        if self._segments is not None:
+            return self._segments
+        s = self.nodes.cell_size
+        segments = SpatialHash(s)
+        cells = segments._cells
+        xs, ys, zs, radii = self.xs, self.ys, self.zs, self.radii
+        for k, (a, b) in enumerate(self.links):
+            r = max(radii[a], radii[b])
+            x0, y0, z0 = segments.key(min(xs[a], xs[b]) - r, min(ys[a], ys[b]) - r, min(zs[a], zs[b]) - r)
+            x1, y1, z1 = segments.key(max(xs[a], xs[b]) + r, max(ys[a], ys[b]) + r, max(zs[a], zs[b]) + r)
+            for kx in xrange(x0, x1 + 1):
+                for ky in xrange(y0, y1 + 1):
+                    for kz in xrange(z0, z1 + 1):
+                        cells.setdefault((kx, ky, kz), []).append(k)
+        self._segments = segments
+        self._segment_bounds = self._key_bounds(segments)
+        return segments
+
+    @staticmethod
+    def _cells_in_box(grid, lo, hi):
+        """
+        Iterate over the (non-empty) cells of grid overlapping the box [lo, hi]
+        """
+        x0, y0, z0 = grid.key(*lo)
+        x1, y1, z1 = grid.key(*hi)
+        cells = grid._cells
+        if (x1 - x0 + 1) * (y1 - y0 + 1) * (z1 - z0 + 1) > len(cells):
+            # Fewer occupied cells than cells in the box
+            for (kx, ky, kz), values in cells.iteritems():
+                if x0 <= kx <= x1 and y0 <= ky <= y1 and z0 <= kz <= z1:
+                    yield values
+            return
+        for kx in xrange(x0, x1 + 1):
+            for ky in xrange(y0, y1 + 1):
+                for kz in xrange(z0, z1 + 1):
+                    k = (kx, ky, kz)
+                    if k in cells:
+                        yield cells[k]
+
+    @staticmethod
+    def _key_bounds(grid):
+        keys = grid._cells.keys()
+        if len(keys) == 0:
+            return None
+        return ([min(k[d] for k in keys) for d in xrange(3)],
+                [max(k[d] for k in keys) for d in xrange(3)])
+
+    @staticmethod
+    def _rings(grid, bounds, x, y, z):
+        """
+        Iterate over the cells by their Chebyshev distance from the cell of
+        the point until no occupied cell is left
+
+        Yields
+        ------
+        k : int
+            The ring. The points after the ring k are at least
+            k * cell_size away.
+        values : [int]
+            The points in the ring
+        """
+        if bounds is None:
+            return
+        cells = grid._cells
+        c = grid.key(x, y, z)
+        lo, hi = bounds
+        last = max(max(abs(c[d] - lo[d]), abs(c[d] - hi[d])) for d in xrange(3))
+        cx, cy, cz = c
+        for k in xrange(last + 1):
+            values = []
+            for kx in xrange(cx - k, cx + k + 1):
+                for ky in xrange(cy - k, cy + k + 1):
+                    # Only the faces of the cube of the ring k
+                    if abs(kx - cx) == k or abs(ky - cy) == k:
+                        kzs = xrange(cz - k, cz + k + 1)
+                    else:
+                        kzs = (cz - k, cz + k)
+                    for kz in kzs:
+                        key = (kx, ky, kz)
+                        if key in cells:
+                            values.extend(cells[key])
+            yield k, values
+
+    def nodes_in_box(self, lo, hi):
+        """
+        Parameters
+        ----------
+        lo, hi : (float, float, float)
+            Corners of the box
+
+        Returns
+        -------
+        indices : [int]
+            Sorted
+        """
+        xs, ys, zs = self.xs, self.ys, self.zs
+        ret = []
+        for values in self._cells_in_box(self.nodes, lo, hi):
+            ret.extend(i for i in values
+                       if lo[0] <= xs[i] <= hi[0] and lo[1] <= ys[i] <= hi[1] and lo[2] <= zs[i] <= hi[2])
+        ret.sort()
+        return ret
+
+    def nodes_in_radius(self, x, y, z, radius):
+        """
+        Returns
+        -------
+        indices : [int]
+            Sorted
+        """
+        xs, ys, zs = self.xs, self.ys, self.zs
+        sq = radius * radius
+        ret = [i for i in self.nodes.candidates(x, y, z, radius)
+               if (xs[i] - x)**2 + (ys[i] - y)**2 + (zs[i] - z)**2 <= sq]
+        ret.sort()
+        return ret
+
+    def nearest_node(self, x, y, z):
+        """
+        Returns
+        -------
+        index : int
+            -1 if the tree has no node
+        distance : float
+        """
+        xs, ys, zs = self.xs, self.ys, self.zs
+        s = self.nodes.cell_size
+        best, best_sq = -1, float('inf')
+        for k, values in self._rings(self.nodes, self._node_bounds, x, y, z):
+            for i in values:
+                d = (xs[i] - x)**2 + (ys[i] - y)**2 + (zs[i] - z)**2
+                if d < best_sq or (d == best_sq and i < best):
+                    best, best_sq = i, d
+            if best != -1 and best_sq < (k * s)**2:
+                break
+        return best, math.sqrt(best_sq)
+
+    def link_distance(self, k, x, y, z):
+        """
+        Distance from the point to the surface of the link k (0 inside)
+        """
+        a, b = self.links[k]
+        xs, ys, zs, radii = self.xs, self.ys, self.zs, self.radii
+        d, t = segment_distance(x, y, z, xs[a], ys[a], zs[a], xs[b], ys[b], zs[b])
+        return max(0.0, d - (radii[a] + t * (radii[b] - radii[a])))
+
+    def links_in_box(self, lo, hi):
+        """
+        Links whose centerline crosses the box grown by their larger radius
+
+        Returns
+        -------
+        links : [(int, int)]
+        """
+        xs, ys, zs, radii = self.xs, self.ys, self.zs, self.radii
+        found = set()
+        for values in self._cells_in_box(self._segment_hash(), lo, hi):
+            found.update(values)
+        ret = []
+        for k in sorted(found):
+            a, b = self.links[k]
+            r = max(radii[a], radii[b])
+            if _segment_hits_box((xs[a], ys[a], zs[a]), (xs[b], ys[b], zs[b]),
+                                 (lo[0] - r, lo[1] - r, lo[2] - r), (hi[0] + r, hi[1] + r, hi[2] + r)):
+                ret.append(self.links[k])
+        return ret
+
+    def links_in_radius(self, x, y, z, radius):
+        """
+        Returns
+        -------
+        links : [(int, int)]
+            The links at most radius away from the point
+        """
+        found = set(self._segment_hash().candidates(x, y, z, radius))
+        return [self.links[k] for k in sorted(found) if self.link_distance(k, x, y, z) <= radius]
+
+    def nearest_link(self, x, y, z):
+        """
+        Returns
+        -------
+        link : (int, int) or None
+            None if the tree has no link
+        distance : float
+        """
+        s = self._segment_hash().cell_size
+        best, best_d = -1, float('inf')
+        seen = set()
+        for k, values in self._rings(self._segments, self._segment_bounds, x, y, z):
+            # A link is in every cell along it
+            for j in set(values) - seen:
+                seen.add(j)
+                d = self.link_distance(j, x, y, z)
+                if d < best_d or (d == best_d and j < best):
+                    best, best_d = j, d
+            # The closest point of an unvisited link is at least k * s away
+            # from the centerline
+            if best != -1 and best_d < k * s - self._max_radius:
+                break
+        if best == -1:
+            return None, best_d
+        return self.links[best], best_d
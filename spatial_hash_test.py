@@ -0,0 +1,83 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import math
+import random
+import unittest
+from spatial_hash import SpatialHash, TreeSpatialIndex
+
+class TestSpatialHash(unittest.TestCase):
+    def test_key(self):
+        s = SpatialHash(2.0)
+        self.assertEqual(s.key(0.0, 1.9, 2.0), (0, 0, 1))
+        self.assertEqual(s.key(-0.1, -2.0, -2.1), (-1, -1, -2))
+
+    def test_candidates(self):
+        s = SpatialHash(1.0)
+        s.insert(0, 0.0, 0.0, 0.0)
+        s.insert(1, 0.9, 0.0, 0.0)
+        s.insert(2, 5.0, 5.0, 5.0)
+        self.assertEqual(len(s), 3)
+        self.assertEqual(sorted(s.cell(0.5, 0.5, 0.5)), [0, 1])
+        self.assertEqual(sorted(s.candidates(1.5, 0.0, 0.0, 0.6)), [0, 1])
+        self.assertEqual(sorted(s.candidates(5.0, 5.0, 5.0, 0.1)), [2])
+        self.assertEqual(list(s.candidates(3.0, 3.0, 3.0, 0.5)), [])
+
+    def test_invalid_cell_size(self):
+        self.assertRaises(ValueError, SpatialHash, 0.0)
+
+class TestTreeSpatialIndex(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(1)
+        n = 300
+        self.xs = [rnd.uniform(-50, 50) for _ in xrange(n)]
+        self.ys = [rnd.uniform(-50, 50) for _ in xrange(n)]
+        self.zs = [rnd.uniform(-30, 0) for _ in xrange(n)]
+        self.radii = [rnd.uniform(0.1, 2.0) for _ in xrange(n)]
+        self.links = [(i, rnd.randrange(i)) for i in xrange(1, n)] + [(0, 0)]
+        self.index = TreeSpatialIndex(self.xs, self.ys, self.zs, self.radii, self.links, 7.0)
+        self.queries = [(rnd.uniform(-70, 70), rnd.uniform(-70, 70), rnd.uniform(-40, 10)) for _ in xrange(20)]
+
+    def dist(self, i, x, y, z):
+        return math.sqrt((self.xs[i] - x)**2 + (self.ys[i] - y)**2 + (self.zs[i] - z)**2)
+
+    def test_nodes(self):
+        index = self.index
+        n = len(self.xs)
+        for x, y, z in self.queries:
+            expected = [i for i in xrange(n) if self.dist(i, x, y, z) <= 12.0]
+            self.assertEqual(index.nodes_in_radius(x, y, z, 12.0), expected)
+
+            lo, hi = (x - 10, y - 20, z - 5), (x + 10, y + 20, z + 5)
+            expected = [i for i in xrange(n) if all(lo[k] <= p <= hi[k] for k, p in
+                        enumerate((self.xs[i], self.ys[i], self.zs[i])))]
+            self.assertEqual(index.nodes_in_box(lo, hi), expected)
+
+            nearest = min(xrange(n), key=lambda i: self.dist(i, x, y, z))
+            self.assertEqual(index.nearest_node(x, y, z)[0], nearest)
+
+    def test_links(self):
+        index = self.index
+        links = index.links
+        self.assertNotIn((0, 0), links)
+        for x, y, z in self.queries:
+            ds = [index.link_distance(k, x, y, z) for k in xrange(len(links))]
+            expected = [links[k] for k in xrange(len(links)) if ds[k] <= 5.0]
+            self.assertEqual(index.links_in_radius(x, y, z, 5.0), expected)
+
+            link, d = index.nearest_link(x, y, z)
+            self.assertAlmostEqual(d, min(ds))
+
+        # A link crossing a box without an end inside
+        index = TreeSpatialIndex([-10.0, 10.0], [0.0, 0.0], [0.0, 0.0], [0.0, 0.0], [(1, 0)], 1.0)
+        self.assertEqual(index.nodes_in_box((-1, -1, -1), (1, 1, 1)), [])
+        self.assertEqual(index.links_in_box((-1, -1, -1), (1, 1, 1)), [(1, 0)])
+        self.assertEqual(index.links_in_box((-1, 2, -1), (1, 3, 1)), [])
+
+    def test_empty(self):
+        index = TreeSpatialIndex([], [], [], [], [])
+        self.assertEqual(index.nearest_node(0.0, 0.0, 0.0)[0], -1)
+        self.assertEqual(index.nearest_link(0.0, 0.0, 0.0)[0], None)
+
+if __name__ == '__main__':
+    unittest.main()
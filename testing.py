@@ -0,0 +1,41 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# Random trees shared by the tests (*_test.py)
+
+import random
+from treeroot import TreeRoot
+
+
+def random_tree(n, seed):
+    """
+    n points scattered under the stump, each linked to a random earlier point
+    """
+    rnd = random.Random(seed)
+    xs = [0.0] + [rnd.uniform(-20, 20) for _ in xrange(n - 1)]
+    ys = [0.0] + [rnd.uniform(-20, 20) for _ in xrange(n - 1)]
+    zs = [0.0] + [rnd.uniform(-30, -1) for _ in xrange(n - 1)]
+    radii = [rnd.choice([0.5, 1.0, 2.0]) for _ in xrange(n)]
+    links = [(i, rnd.randrange(i)) for i in xrange(1, n)]
+    return TreeRoot(links=links, xs=xs, ys=ys, zs=zs, radii=radii,
+                    labels=range(n), label_to_index=dict((i, i) for i in xrange(n)))
+
+
+def grown_tree(n, seed, shift=0.0):
+    """
+    n points, each placed a short step below a random earlier point (its
+    parent), so that the links are short like those of a real root. The
+    stump is at (shift, 0, 0).
+    """
+    rnd = random.Random(seed)
+    xs, ys, zs = [shift], [0.0], [0.0]
+    links = []
+    for i in xrange(1, n):
+        p = rnd.randrange(i)
+        xs.append(xs[p] + rnd.uniform(-6, 6))
+        ys.append(ys[p] + rnd.uniform(-6, 6))
+        zs.append(zs[p] - rnd.uniform(0, 4))
+        links.append((i, p))
+    radii = [3.0] + [rnd.uniform(0.2, 1.0) for _ in xrange(n - 1)]
+    return TreeRoot(links=links, xs=xs, ys=ys, zs=zs, radii=radii,
+                    labels=range(n), label_to_index=dict((i, i) for i in xrange(n)))
@@ -1,27 +1,165 @@
 # coding: utf-8
 from __future__ import division, print_function, unicode_literals
 
-from common import util, dat2vtk, swc2vtk
+from common import util, topology, compressed
+from spatial_hash import TreeSpatialIndex
+from geometry_summary import GeometrySummary
+import array
+import logging
 import math
-import codecs
+
+# The loaders and writers (common.dat2vtk, rrb, chunked, swc2vtk) and compact
+# are imported by the methods which use them, so that the tools start fast.
 
 class DisconnectedException(Exception):
     pass
 
 
-class TreeRoot:
+class TreeRoot(object):
     def __init__(self, **keywords):
         util.assert_same_size(xs=keywords['xs'], ys=keywords['ys'], zs=keywords['zs'])
 
-        self.xs             = keywords["xs"]
-        self.ys             = keywords["ys"]
-        self.zs             = keywords["zs"]
-        self.links          = keywords["links"]
-        self.radii          = keywords["radii"]
+        self._xs            = keywords["xs"]
+        self._ys            = keywords["ys"]
+        self._zs            = keywords["zs"]
+        self._links         = keywords["links"]
+        self._radii         = keywords["radii"]
         self.labels         = keywords["labels"]
         self.label_to_index = keywords["label_to_index"]
+        # The radii are the input diameters times this (None if unknown)
+        self.coef_radius    = keywords.get("coef_radius")
 
         self._n             = len(self.xs)
+        self._geometry      = None
+        self._topology      = None
+        self._spatial       = None
+        # Known value of max_distance() (e.g. see montecarlo.FarPairs)
+        self._max_distance  = keywords.get("max_distance")
+        self._summary       = None
+
+    # Replacing a coordinate list drops the cached geometry.
+    # Call invalidate_geometry() after modifying the lists in place.
+    @property
+    def xs(self):
+        return self._xs
+
+    @xs.setter
+    def xs(self, value):
+        self._xs = value
+        self.invalidate_geometry()
+
+    @property
+    def ys(self):
+        return self._ys
+
+    @ys.setter
+    def ys(self, value):
+        self._ys = value
+        self.invalidate_geometry()
+
+    @property
+    def zs(self):
+        return self._zs
+
+    @zs.setter
+    def zs(self, value):
+        self._zs = value
+        self.invalidate_geometry()
+
+    @property
+    def radii(self):
+        return self._radii
+
+    @radii.setter
+    def radii(self, value):
+        self._radii = value
+        self._spatial = None
+        self._summary = None
+
+    # Replacing the links drops the cached topology
+    @property
+    def links(self):
+        return self._links
+
+    @links.setter
+    def links(self, value):
+        self._links = value
+        self._topology = None
+        self._spatial = None
+        self._summary = None
+
+    def invalidate_geometry(self):
+        self._n = len(self._xs)
+        self._geometry = None
+        self._topology = None
+        self._spatial = None
+        self._max_distance = None
+        self._summary = None
+
+    def _cached_geometry(self):
+        """
+        Compute the per-point values which depend only on the coordinates (once)
+
+        Returns
+        -------
+        geometry : {"center_dx": [float], "center_dy": [float], "center_dz": [float],
+                    "center_sq_distances": [float], "center_distances": [float],
+                    "center_directions": ([float], [float], [float]),
+                    "depths": [float]}
+        """
+        if self._geometry is not None:
+            return self._geometry
+
+        xs, ys, zs = self._xs, self._ys, self._zs
+        cx, cy, cz = xs[0], ys[0], zs[0]
+        dxs = [cx - x for x in xs]
+        dys = [cy - y for y in ys]
+        dzs = [cz - z for z in zs]
+        sq = [dx**2 + dy**2 + dz**2 for dx, dy, dz in zip(dxs, dys, dzs)]
+        dist = map(math.sqrt, sq)
+        uxs = [dx / d if d > 0.0 else 0.0 for dx, d in zip(dxs, dist)]
+        uys = [dy / d if d > 0.0 else 0.0 for dy, d in zip(dys, dist)]
+        uzs = [dz / d if d > 0.0 else 0.0 for dz, d in zip(dzs, dist)]
+
+        self._geometry = {
+            "center_dx": dxs,
+            "center_dy": dys,
+            "center_dz": dzs,
+            "center_sq_distances": sq,
+            "center_distances": dist,
+            "center_directions": (uxs, uys, uzs),
+            # Positive below the stump
+            "depths": dzs,
+        }
+        return self._geometry
+
+    def center_vectors(self):
+        """
+        Vectors from each point to the center of the stump
+        """
+        g = self._cached_geometry()
+        return g["center_dx"], g["center_dy"], g["center_dz"]
+
+    def center_distances(self):
+        return self._cached_geometry()["center_distances"]
+
+    def center_directions(self):
+        """
+        Unit vectors from each point to the center (zero vector for the center itself)
+        """
+        return self._cached_geometry()["center_directions"]
+
+    def depths(self):
+        return self._cached_geometry()["depths"]
+
+    def geometry_data(self):
+        """
+        Cached geometry as scalars for export_vtk(data=...)
+        """
+        return {
+            "center_distance": self.center_distances(),
+            "depth": self.depths(),
+        }
 
     def node_count(self):
         return self._n
@@ -36,16 +174,31 @@ class TreeRoot:
         return math.sqrt((self.xs[i] - self.xs[j])**2 + (self.ys[i] - self.ys[j])**2 + (self.zs[i] - self.zs[j])**2)
 
     def max_distance(self):
-        max_d = 0.0
+        if self._max_distance is not None:
+            return self._max_distance
+        import compact
+        if compact.is_compact(self):
+            self._max_distance = compact.max_distance(self)
+            return self._max_distance
+
+        xs, ys, zs = self.xs, self.ys, self.zs
+        max_sq = 0.0
         for i in xrange(self._n):
-            for j in xrange(i+1, self._n):
-                l2norm = self.distance(i, j)
-                dis = math.sqrt(l2norm)
-                if dis > max_d: max_d = dis
-        return max_d
+            xi, yi, zi = xs[i], ys[i], zs[i]
+            row = [(xi - xs[j])**2 + (yi - ys[j])**2 + (zi - zs[j])**2 for j in xrange(i+1, self._n)]
+            if len(row) > 0 and max(row) > max_sq: max_sq = max(row)
+        # Keep the normalization factor used so far: sqrt of the distance
+        self._max_distance = math.sqrt(math.sqrt(max_sq))
+        return self._max_distance
 
     def order_by_dist(self, reverse=False):
-        order = [[i, (self.xs[i]-self.xs[0])**2 + (self.ys[i]-self.ys[0])**2 + (self.zs[i]-self.zs[0])**2] for i in xrange(1, self.node_count())]
+        import compact
+        if compact.is_compact(self):
+            # Without building the whole geometry cache
+            sq = compact.center_sq_distances(self)
+        else:
+            sq = self._cached_geometry()["center_sq_distances"]
+        order = [[i, sq[i]] for i in xrange(1, self.node_count())]
         order.sort(key=lambda x:x[1], reverse=reverse)
         return order
 
@@ -55,26 +208,170 @@ class TreeRoot:
         return math.pi * (r1*r1 + r1*r2 + r2*r2) * h / 3.0
 
     def edge_volume_sum(self):
-        volume_sum = 0.0
-        for l in self.links:
-            if l[0] != 0 and l[1] != 0:
-                volume_sum += self.edge_volume(l[0], l[1])
-        return volume_sum
+        return self.geometry_summary().volume_sum
+
+    def geometry_summary(self):
+        """
+        Lengths, volumes and surface areas of all the links (see
+        GeometrySummary), kept until the coordinates, the radii or the links
+        are replaced
+
+        Like the other cached geometry, the summary does not see the lists
+        modified in place (tree_root.zs[i] = z, tree_root.links.append(...)).
+        Call invalidate_geometry() after such a change.
+        """
+        if self._summary is None:
+            self._summary = GeometrySummary(self.xs, self.ys, self.zs, self.radii, self.links)
+        return self._summary
 
     def to_adjacency_list(self, reverse=False):
-        adj_list = [[] for _ in xrange(n)]
+        adj_list = [[] for _ in xrange(self._n)]
         for l in self.links:
             frm, to = l[0], l[1]
             if reverse:
                 frm, to = to, frm
             if to not in adj_list[frm] and not frm == to:
-                adj_list.append(to)
+                adj_list[frm].append(to)
         return adj_list
 
+    def topology(self):
+        """
+        Index of the tree oriented from the stump (built once)
+
+        Returns
+        -------
+        index : topology.TopologyIndex
+        """
+        if self._topology is None:
+            self._topology = topology.TopologyIndex(self._n, self.links)
+        return self._topology
+
+    def to_compact(self, decimals=1, coef_radius=None):
+        """
+        Copy with the coordinates and the radii in float32 columns
+        (see compact.py). They read back the same float64 values and the
+        reconstruction gives the same links.
+
+        Parameters
+        ----------
+        decimals : int
+            The number of decimal places of the data
+        coef_radius : float
+            The coefficient the radii were loaded with (default: the one of
+            load_dat). The radii are stored as the diameters of the input,
+            which have the decimal places. Without it, the radii are kept in
+            a float64 array.
+        """
+        import compact
+        if coef_radius is None:
+            coef_radius = self.coef_radius
+        if coef_radius:
+            radii = compact.CompactColumn(self.radii, decimals, coef_radius)
+        else:
+            radii = array.array(str('d'), self.radii)
+        return TreeRoot(
+            links=self.links,
+            xs=compact.CompactColumn(self.xs, decimals),
+            ys=compact.CompactColumn(self.ys, decimals),
+            zs=compact.CompactColumn(self.zs, decimals),
+            radii=radii,
+            labels=self.labels,
+            label_to_index=self.label_to_index,
+            coef_radius=self.coef_radius
+        )
+
+    def spatial_index(self, cell_size=None):
+        """
+        Index for box, radius and nearest queries over the nodes and the links
+        (built once, or again if another cell_size is given)
+
+        Returns
+        -------
+        index : TreeSpatialIndex
+        """
+        if self._spatial is None or (cell_size is not None and cell_size != self._spatial.nodes.cell_size):
+            self._spatial = TreeSpatialIndex(self.xs, self.ys, self.zs, self.radii, self.links, cell_size)
+        return self._spatial
+
+    def input_diameters(self):
+        """
+        The diameters of the input file (the radii divided by coef_radius, or
+        the radii as is if it is unknown). Every writer stores these, so that
+        loading the output with the same coef_radius gives the radii back.
+
+        Returns
+        -------
+        diameters : [float]
+        """
+        if not self.coef_radius:
+            return list(self.radii)
+        coef_radius = self.coef_radius
+        return [r / coef_radius for r in self.radii]
+
+    def parent_indices(self):
+        """
+        Parent of every node, oriented from the stump
+
+        The stump is its own parent as in the dat file. The nodes which cannot
+        reach the stump keep the direction of their links (-1 if none).
+
+        Returns
+        -------
+        parent : [int]
+        """
+        index = self.topology()
+        parent = index.parent[:]
+        parent[0] = 0
+        for a, b in self.links:
+            if parent[a] == -1 and not index.is_reachable(a):
+                parent[a] = b
+        return parent
+
+    def metrics(self):
+        """
+        Path length, Strahler and topological order, subtree volume,
+        subtree length and branch count of every node
+
+        Returns
+        -------
+        metrics : {string: [float]}
+            Can be passed to export_vtk as data.
+        """
+        return topology.compute_metrics(self.topology(), self.xs, self.ys, self.zs, self.radii)
+
+    def editor(self, truth=None, method='ip', param=1.1):
+        """
+        Editing API with incremental metrics and accuracy (see editing.py)
+
+        Returns
+        -------
+        editor : editing.TreeEditor
+        """
+        # editing imports reconstructor, which imports this module
+        import editing
+        return editing.TreeEditor(self, truth, method, param)
+
     @classmethod
-    def load_dat(cls, fname, coef_radius=0.5):
-        tree_data = dat2vtk.Parser.load(fname)
-        links, xs, ys, zs, radii_in, labels, label_to_index = dat2vtk.convert_to_simple_format_graph(tree_data)
+    def load_dat(cls, fname, coef_radius=0.5, stump_label=0, region=None, jobs=1):
+        """
+        Parameters
+        ----------
+        region : dat2vtk.Region or None
+            Load only the points inside (and the stump). The links to the
+            points outside are dropped.
+        jobs : int
+            Parse the file in this many processes (see common/chunked.py)
+        """
+        if fname[-3:] == "rrb":
+            return cls.load_rrb(fname, coef_radius, region, stump_label)
+        if jobs > 1:
+            from common import chunked
+            columns = chunked.load_columns(fname, jobs, region, (stump_label,))
+            links, xs, ys, zs, radii_in, labels, label_to_index = chunked.convert_columns(columns, stump_label)
+        else:
+            from common import dat2vtk
+            tree_data = dat2vtk.Parser.load(fname, region, (stump_label,))
+            links, xs, ys, zs, radii_in, labels, label_to_index = dat2vtk.convert_to_simple_format_graph(tree_data, stump_label)
         radii = map(lambda r: r * coef_radius, radii_in)
         return cls(
             links=links,
@@ -83,23 +380,84 @@ class TreeRoot:
             zs=zs,
             radii=radii,
             labels=labels,
-            label_to_index=label_to_index
+            label_to_index=label_to_index,
+            coef_radius=coef_radius
         )
 
-    def export_vtk(self, fname):
-        with codecs.open(fname, mode='w', encoding='utf_8') as f:
-            for line in swc2vtk.generate_vtk(0, self.links, self.xs, self.ys, self.zs, self.radii):
+    @classmethod
+    def load_rrb(cls, fname, coef_radius=0.5, region=None, stump_label=0):
+        """
+        Load the binary format (see common/rrb.py). The coordinates and the
+        labels are kept as the arrays read from the file.
+
+        Like load_dat, the stump becomes the index 0 and the links to the
+        points outside region are dropped (with a warning).
+        """
+        from common import dat2vtk, rrb
+        try:
+            xs, ys, zs, diameters, labels, parents = rrb.load_columns(fname)
+        except rrb.FileFormatError:
+            raise dat2vtk.FileFormatError
+        if stump_label not in labels:
+            raise dat2vtk.MissingStumpError("Point {} must exists.".format(stump_label))
+        stump_row = labels.index(stump_label)
+        if region is not None or stump_row != 0:
+            # The stump is always kept
+            contains = region.contains if region is not None else lambda x, y, z: True
+            keep = [stump_row] + [i for i in xrange(len(xs))
+                                  if i != stump_row and contains(xs[i], ys[i], zs[i])]
+            new_index = dict(zip(keep, xrange(len(keep))))
+            dropped = sum(1 for i in keep if parents[i] != -1 and parents[i] not in new_index)
+            if dropped > 0:
+                logging.warning("{} links to the points outside the region are dropped".format(dropped))
+            xs, ys, zs, diameters, labels = [array.array(a.typecode, [a[i] for i in keep])
+                                             for a in (xs, ys, zs, diameters, labels)]
+            parents = [new_index.get(parents[i], -1) for i in keep]
+        links = [(i, p) for i, p in enumerate(parents) if p != -1]
+        label_to_index = dict(zip(labels, xrange(len(labels))))
+        radii = map(lambda r: r * coef_radius, diameters)
+        return cls(
+            links=links,
+            xs=xs,
+            ys=ys,
+            zs=zs,
+            radii=radii,
+            labels=labels,
+            label_to_index=label_to_index,
+            coef_radius=coef_radius
+        )
+
+    def export_rrb(self, fname, parent=None):
+        from common import rrb
+        rrb.write_tree(fname, self, parent)
+
+    def export_vtk(self, fname, data={}):
+        from common import swc2vtk
+        polylines = topology.chains(self._n, self.links, stops=[0])
+        with compressed.open_text(fname, 'w') as f:
+            for line in swc2vtk.generate_vtk(0, self.links, self.xs, self.ys, self.zs, self.radii, data, polylines):
                 print(line, file=f)
 
-    def export_dat(self, fname):
-        with codecs.open(fname, mode='w', encoding='utf_8') as f:
+    def export_dat(self, fname, parent=None):
+        if parent is None:
+            parent = self.parent_indices()
+        diameters = self.input_diameters()
+        with compressed.open_text(fname, 'w') as f:
             for label in self.labels:
                 idx_from = self.label_to_index[label]
-                idx_to   = [x[1] for x in self.links if x[0] == idx_from][0]
-                row_data = [self.xs[idx_from], self.ys[idx_from], self.zs[idx_from], self.radii[idx_from], label, self.labels[idx_to]]
+                idx_to   = parent[idx_from]
+                parent_label = self.labels[idx_to] if idx_to != -1 else -1
+                row_data = [self.xs[idx_from], self.ys[idx_from], self.zs[idx_from], diameters[idx_from], label, parent_label]
                 print(" ".join(map(str, row_data)), file=f)
 
 
+def edge_set(links):
+    """
+    Undirected links as (smaller index, larger index), without self-loops
+    """
+    return set((min(a, b), max(a, b)) for a, b in links if a != b)
+
+
 def compute_accuracy(tree1, tree2):
     edge_count_all = len(tree1.links)
     edge_volume_all = tree2.edge_volume_sum()
@@ -107,13 +465,14 @@ def compute_accuracy(tree1, tree2):
     edge_count_correct = 0
     edge_volume_correct = 0.0
 
-    for l1 in tree1.links:
-        for l2 in tree2.links:
-            if min(l1) == min(l2) and max(l1) == max(l2):
-                edge_count_correct += 1
-                if l1[0] != 0 and l1[1] != 0:
-                    edge_volume_correct += tree1.edge_volume(l1[0], l1[1])
-                break
+    # Match the links through a set instead of comparing every pair
+    truth = set((min(l), max(l)) for l in tree2.links)
+    volumes = tree1.geometry_summary().volumes
+    for k, l1 in enumerate(tree1.links):
+        if (min(l1), max(l1)) in truth:
+            edge_count_correct += 1
+            if l1[0] != 0 and l1[1] != 0:
+                edge_volume_correct += volumes[k]
     return {
         "edge_count":  edge_count_correct / edge_count_all,
         "edge_volume": edge_volume_correct / edge_volume_all,
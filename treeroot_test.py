@@ -0,0 +1,62 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+from common import dat2vtk, rrb
+from treeroot import TreeRoot
+
+LINES = ['5.0 5.0 -1.0 12.3 4 2',
+         '0.0 0.0 0.0 40.0 0 0',
+         '6.8 -14.0 -3.7 34.8 2 0',
+         '30.7 -39.2 -14.8 29.5 3 2',
+         '31.0 -40.0 -1.0 20.1 5 3']
+
+class TestTreeRootRRB(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dat = os.path.join(self.directory, 'a.dat')
+        with open(self.dat, 'w') as f:
+            f.write('\n'.join(LINES) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertSameTree(self, tree1, tree2):
+        self.assertEqual(list(tree1.labels), list(tree2.labels))
+        self.assertEqual(list(tree1.xs), list(tree2.xs))
+        self.assertEqual(sorted(tree1.links), sorted(tree2.links))
+        for r1, r2 in zip(tree1.radii, tree2.radii):
+            self.assertAlmostEqual(r1, r2)
+
+    def test_round_trip(self):
+        fname = os.path.join(self.directory, 'a.rrb')
+        for coef_radius in (0.05, 0.5):
+            tree_root = TreeRoot.load_dat(self.dat, coef_radius)
+            tree_root.export_rrb(fname)
+            self.assertEqual(list(rrb.load_columns(fname)[3]), [40.0, 12.3, 34.8, 29.5, 20.1])
+            self.assertSameTree(TreeRoot.load_dat(fname, coef_radius), tree_root)
+
+    def test_stump(self):
+        # The stump is not the first row of the file
+        fname = os.path.join(self.directory, 'a.rrb')
+        rrb.write(fname, [1.0, 0.0, 2.0], [0.0] * 3, [-1.0, 0.0, -2.0], [2.0, 4.0, 1.0], [1, 0, 2], [1, -1, 0])
+        tree_root = TreeRoot.load_rrb(fname)
+        self.assertEqual(list(tree_root.labels), [0, 1, 2])
+        self.assertEqual(list(tree_root.xs), [0.0, 1.0, 2.0])
+        self.assertEqual(sorted(tree_root.links), [(1, 0), (2, 1)])
+        self.assertRaises(dat2vtk.MissingStumpError, TreeRoot.load_dat, fname, 0.5, 7)
+
+    def test_region(self):
+        fname = os.path.join(self.directory, 'a.rrb')
+        TreeRoot.load_dat(self.dat, 0.5).export_rrb(fname)
+        # Point 3 is outside: the link of point 5 to it is dropped
+        region = dat2vtk.Region.z_band(-14.0, 1.0)
+        expected = TreeRoot.load_dat(self.dat, 0.5, region=region)
+        self.assertSameTree(TreeRoot.load_dat(fname, 0.5, region=region), expected)
+        self.assertEqual(sorted(expected.links), [(0, 0), (1, 2), (2, 0)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+# Validation of the input graph
+#
+# convert_to_simple_format_graph drops the links to missing parents and lets
+# a duplicated label overwrite the coordinates without a word. This module
+# finds every such problem in one pass over the rows with a union-find, and
+# can repair the graph so that it becomes a tree from the stump.
+
+import argparse
+import math
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from common import util, dat2vtk, chunked, compressed
+from disjoint_set import DisjointSet
+from spatial_hash import TreeSpatialIndex
+
+CATEGORIES = [
+    ('duplicate', 'Duplicated labels (later rows overwrite the coordinates)'),
+    ('multiple_parents', 'Labels with more than one parent'),
+    ('missing_parent', 'Parent label does not exist (link dropped)'),
+    ('cycle', 'Links closing a cycle'),
+    ('extra_root', 'Roots other than the stump (parent is itself)'),
+    ('disconnected', 'Points not connected to the stump'),
+    ('zero_length', 'Links of length 0'),
+    ('long_link', 'Links longer than the threshold'),
+]
+
+
+class ValidationReport(object):
+    """
+    Counts of the problems and their first labels
+
+    Attributes
+    ----------
+    counts : {string: int}
+        By the names of CATEGORIES
+    examples : {string: [int]}
+        At most limit labels of each category
+    components : int
+        The number of connected components
+    heads : [int]
+        Index of the first row of every component but the stump's,
+        the point which has no valid parent in it
+    """
+    def __init__(self, limit=10):
+        self.limit = limit
+        self.counts = dict((name, 0) for name, _ in CATEGORIES)
+        self.examples = dict((name, []) for name, _ in CATEGORIES)
+        self.components = 0
+        self.heads = []
+
+    def add(self, category, label):
+        self.counts[category] += 1
+        if len(self.examples[category]) < self.limit:
+            self.examples[category].append(label)
+
+    def ok(self):
+        return all(c == 0 for c in self.counts.itervalues())
+
+    def to_dict(self):
+        return {"counts": self.counts, "examples": self.examples, "components": self.components}
+
+    def lines(self):
+        yield "Components                : {}".format(self.components)
+        for name, description in CATEGORIES:
+            if self.counts[name] == 0: continue
+            more = ' ...' if self.counts[name] > len(self.examples[name]) else ''
+            yield "{:<26}: {} ({})".format(name, self.counts[name], description)
+            yield "    {}{}".format(' '.join(map(unicode, self.examples[name])), more)
+
+
+def columns_from_rows(rows):
+    """
+    [{"x": ...}] of dat2vtk.Parser.load -> the columns of chunked.load_columns
+    """
+    return [[row[name] for row in rows] for name, _ in chunked.COLUMN_CODES]
+
+
+def validate(columns, stump_label=0, limit=10, thresh=None):
+    """
+    Parameters
+    ----------
+    columns : [[float], [float], [float], [float], [int], [int]]
+        x, y, z, diameter, label, parent_label (see chunked.load_columns)
+    stump_label : int
+    limit : int
+        The number of labels kept for each category
+    thresh : float or None
+        Report the links longer than this
+
+    Returns
+    -------
+    report : ValidationReport
+    """
+    xs, ys, zs, _, labels, parents = columns
+    n = len(labels)
+    report = ValidationReport(limit)
+
+    # The first row of a label is its node
+    first = {}
+    parent_of = {}
+    for row in xrange(n):
+        label = labels[row]
+        if label in first:
+            report.add('duplicate', label)
+            if parents[row] != parent_of[label]:
+                report.add('multiple_parents', label)
+            continue
+        first[label] = row
+        parent_of[label] = parents[row]
+
+    if stump_label not in first:
+        raise dat2vtk.MissingStumpError("Point {} must exists.".format(stump_label))
+
+    rows = sorted(first.itervalues())
+    node = dict((row, k) for k, row in enumerate(rows))
+    UF = DisjointSet(len(rows))
+    heads = []
+    for row in rows:
+        label, parent = labels[row], parents[row]
+        if label == stump_label:
+            continue
+        if parent == label:
+            report.add('extra_root', label)
+            heads.append(row)
+            continue
+        if parent not in first:
+            report.add('missing_parent', label)
+            heads.append(row)
+            continue
+        a, b = node[row], node[first[parent]]
+        if UF.same(a, b):
+            report.add('cycle', label)
+            heads.append(row)
+            continue
+        UF.merge(a, b)
+
+        q = first[parent]
+        d = math.sqrt((xs[row] - xs[q])**2 + (ys[row] - ys[q])**2 + (zs[row] - zs[q])**2)
+        if d == 0.0:
+            report.add('zero_length', label)
+        if thresh is not None and d > thresh:
+            report.add('long_link', label)
+
+    # A component of k nodes has k - 1 accepted links, so exactly one head
+    stump = node[first[stump_label]]
+    report.components = 1 + len(heads)
+    report.heads = heads
+    for row in rows:
+        if not UF.same(node[row], stump):
+            report.add('disconnected', labels[row])
+    return report
+
+
+def repair(columns, report, stump_label=0):
+    """
+    Make the rows a tree from the stump
+
+    The later rows of a duplicated label are dropped, and the head of every
+    component not connected to the stump is linked to the nearest point
+    connected to the stump.
+
+    Returns
+    -------
+    columns : [[float], [float], [float], [float], [int], [int]]
+    relinked : [(int, int)]
+        (label, new parent label)
+    """
+    xs, ys, zs, ds, labels, parents = columns
+    seen = set()
+    keep = []
+    for row in xrange(len(labels)):
+        if labels[row] in seen: continue
+        seen.add(labels[row])
+        keep.append(row)
+    new_parents = dict((row, parents[row]) for row in keep)
+
+    # Follow the valid parents up to the stump or to a head
+    heads = set(report.heads)
+    row_of = dict((labels[row], row) for row in keep)
+    connected = {row_of[stump_label]: True}
+    for row in heads:
+        connected[row] = False
+    for row in keep:
+        path = []
+        r = row
+        while r not in connected:
+            path.append(r)
+            r = row_of[parents[r]]
+        for p in path:
+            connected[p] = connected[r]
+
+    main_rows = [row for row in keep if connected[row]]
+    index = TreeSpatialIndex([xs[r] for r in main_rows], [ys[r] for r in main_rows],
+                             [zs[r] for r in main_rows], [ds[r] for r in main_rows], [])
+    relinked = []
+    for row in report.heads:
+        k, _ = index.nearest_node(xs[row], ys[row], zs[row])
+        new_parents[row] = labels[main_rows[k]]
+        relinked.append((labels[row], new_parents[row]))
+
+    repaired = [[c[row] for row in keep] for c in (xs, ys, zs, ds, labels)]
+    repaired.append([new_parents[row] for row in keep])
+    return repaired, relinked
+
+
+def write_columns(fname, columns):
+    delim = chunked.delimiter(fname)
+    with compressed.open_text(fname, 'w') as f:
+        for x, y, z, d, label, parent in zip(*columns):
+            print(delim.join(['{!r}'.format(x), '{!r}'.format(y), '{!r}'.format(z), '{!r}'.format(d),
+                              unicode(label), unicode(parent)]), file=f)
+
+
+def load_columns(fname, jobs=1):
+    if fname[-3:] == 'rrb':
+        return columns_from_rows(dat2vtk.Parser.load_rrb(fname))
+    return chunked.load_columns(fname, jobs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_dat', type=str)
+    parser.add_argument('--stump-label', dest='stump_label', type=int, default=0)
+    parser.add_argument('--limit', type=int, default=10,
+            help='the number of labels shown for each problem')
+    parser.add_argument('--thresh', type=float,
+            help='report the links longer than this')
+    parser.add_argument('--json', action='store_true',
+            help='print the report as JSON')
+    parser.add_argument('--repair', type=str, default=None,
+            help='write the repaired graph to this dat/csv file')
+    parser.add_argument('--jobs', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    try:
+        columns = load_columns(args.input_dat, args.jobs)
+        report = validate(columns, args.stump_label, args.limit, args.thresh)
+    except IOError as e:
+        print("[Error] No such file : {}".format(args.input_dat))
+        sys.exit(1)
+    except dat2vtk.MissingStumpError as e:
+        print("[Error] {}".format(e))
+        sys.exit(1)
+    except dat2vtk.FileFormatError as e:
+        print("[Error] Unexpected file format.")
+        sys.exit(1)
+    except dat2vtk.FileSyntaxError as e:
+        print("[Error] Syntax error.")
+        sys.exit(1)
+
+    if args.json:
+        import json
+        print(json.dumps(report.to_dict(), sort_keys=True))
+    else:
+        for line in report.lines():
+            print(line)
+
+    if args.repair is not None:
+        repaired, relinked = repair(columns, report, args.stump_label)
+        try:
+            write_columns(args.repair, repaired)
+        except dat2vtk.FileFormatError:
+            print("[Error] Unexpected file format.")
+            sys.exit(1)
+        print("Relinked {} points, output file is created : {}".format(len(relinked), args.repair))
+
+    sys.exit(0 if report.ok() else 2)
+
+
+if __name__ == "__main__":
+    util.set_terminal_encoding()
+    main()
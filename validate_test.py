@@ -0,0 +1,52 @@
+# coding: utf-8
+from __future__ import division, print_function, unicode_literals
+
+import unittest
+from validate import validate, repair
+
+def make_columns(rows):
+    # rows : [(x, y, z, label, parent_label)]
+    return [[r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows],
+            [1.0]*len(rows), [r[3] for r in rows], [r[4] for r in rows]]
+
+class TestValidate(unittest.TestCase):
+    def test_clean(self):
+        columns = make_columns([(0, 0, 0, 0, 0), (1, 0, 0, 5, 0), (2, 0, 0, 7, 5)])
+        report = validate(columns)
+        self.assertTrue(report.ok())
+        self.assertEqual(report.components, 1)
+
+    def test_problems(self):
+        columns = make_columns([
+            (0, 0, 0, 0, 0),
+            (1, 0, 0, 1, 0),
+            (1, 0, 0, 2, 1),    # zero length
+            (5, 0, 0, 3, 99),   # missing parent
+            (6, 0, 0, 4, 3),
+            (9, 9, 0, 10, 11),  # cycle 10 - 11 - 12
+            (9, 8, 0, 11, 12),
+            (9, 7, 0, 12, 10),
+            (0, 5, 0, 20, 20),  # extra root
+            (2, 0, 0, 4, 1),    # duplicate with another parent
+        ])
+        report = validate(columns, limit=2, thresh=50.0)
+        self.assertEqual(report.counts["duplicate"], 1)
+        self.assertEqual(report.counts["multiple_parents"], 1)
+        self.assertEqual(report.examples["missing_parent"], [3])
+        self.assertEqual(report.counts["cycle"], 1)
+        self.assertEqual(report.examples["extra_root"], [20])
+        self.assertEqual(report.examples["zero_length"], [2])
+        self.assertEqual(report.counts["long_link"], 0)
+        self.assertEqual(report.components, 4)
+        self.assertEqual(report.counts["disconnected"], 6)
+        self.assertEqual(len(report.examples["disconnected"]), 2)
+
+        repaired, relinked = repair(columns, report)
+        self.assertEqual(dict(relinked), {3: 1, 12: 1, 20: 0})
+        self.assertEqual(len(repaired[4]), 9)
+        report = validate(repaired)
+        self.assertEqual(report.components, 1)
+        self.assertEqual([name for name, c in report.counts.iteritems() if c > 0], ["zero_length"])
+
+if __name__ == '__main__':
+    unittest.main()